@@ -0,0 +1,46 @@
+"""add partial indexes for open alert_events
+
+Revision ID: 20250327120000
+Revises: 20250326120000
+Create Date: 2025-03-27 12:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "20250327120000"
+down_revision = "20250326120000"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Sessões abertas são poucas perto do histórico: índices parciais
+    # (WHERE is_open) ficam pequenos e cobrem as consultas do alert_engine.
+    op.create_index(
+        "ix_alert_events_open_type_tag",
+        "alert_events",
+        ["event_type", "tag_id", "last_seen_at"],
+        postgresql_where=sa.text("is_open"),
+    )
+    op.create_index(
+        "ix_alert_events_open_rule_device_tag",
+        "alert_events",
+        ["rule_id", "device_id", "tag_id"],
+        postgresql_where=sa.text("is_open"),
+    )
+    op.create_index(
+        "ix_alert_events_open_rtls_last_seen",
+        "alert_events",
+        ["last_seen_at"],
+        postgresql_where=sa.text(
+            "is_open AND event_type IN ('FORBIDDEN_SECTOR', 'DWELL_TIME')"
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_alert_events_open_rtls_last_seen", table_name="alert_events")
+    op.drop_index("ix_alert_events_open_rule_device_tag", table_name="alert_events")
+    op.drop_index("ix_alert_events_open_type_tag", table_name="alert_events")
@@ -0,0 +1,50 @@
+"""add unique partial index for open GATEWAY_OFFLINE alert_events
+
+Revision ID: 20250328120000
+Revises: 20250327120000
+Create Date: 2025-03-28 12:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "20250328120000"
+down_revision = "20250327120000"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Antes do índice único: se algum device tiver mais de uma sessão
+    # GATEWAY_OFFLINE aberta, mantém só a mais recente e fecha as outras
+    # (ended_at = last_seen_at, como o alert_engine faz).
+    op.execute(
+        """
+        UPDATE alert_events AS ae
+           SET is_open = false,
+               ended_at = ae.last_seen_at
+          FROM (
+                SELECT id,
+                       row_number() OVER (
+                           PARTITION BY device_id
+                           ORDER BY started_at DESC, id DESC
+                       ) AS rn
+                  FROM alert_events
+                 WHERE is_open AND event_type = 'GATEWAY_OFFLINE'
+               ) AS dup
+         WHERE ae.id = dup.id
+           AND dup.rn > 1
+        """
+    )
+    op.create_index(
+        "ix_alert_events_open_gateway_offline",
+        "alert_events",
+        ["device_id", "event_type"],
+        unique=True,
+        postgresql_where=sa.text("is_open AND event_type = 'GATEWAY_OFFLINE'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_alert_events_open_gateway_offline", table_name="alert_events")
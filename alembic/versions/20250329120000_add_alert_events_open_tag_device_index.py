@@ -0,0 +1,31 @@
+"""add composite partial index for open alert_events by tag/device
+
+Revision ID: 20250329120000
+Revises: 20250328120000
+Create Date: 2025-03-29 12:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "20250329120000"
+down_revision = "20250328120000"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Cobre a busca das sessões abertas de uma detecção (tag + gateway,
+    # event_type, ordenado por started_at). Parcial em is_open, como os
+    # demais índices de sessão aberta.
+    op.create_index(
+        "ix_alert_events_open_tag_device_type",
+        "alert_events",
+        ["tag_id", "device_id", "event_type", sa.text("started_at DESC")],
+        postgresql_where=sa.text("is_open"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_alert_events_open_tag_device_type", table_name="alert_events")
@@ -0,0 +1,58 @@
+"""add unique partial index for open RTLS alert_events sessions
+
+Revision ID: 20250330120000
+Revises: 20250329120000
+Create Date: 2025-03-30 12:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "20250330120000"
+down_revision = "20250329120000"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Antes do índice único: se houver mais de uma sessão aberta para a mesma
+    # (regra, tag, device, tipo), mantém a que o alert_engine já continuava
+    # (FORBIDDEN_SECTOR: a mais recente; DWELL_TIME: a mais antiga) e fecha
+    # as outras (ended_at = last_seen_at).
+    op.execute(
+        """
+        UPDATE alert_events AS ae
+           SET is_open = false,
+               ended_at = ae.last_seen_at
+          FROM (
+                SELECT id,
+                       row_number() OVER (
+                           PARTITION BY rule_id, tag_id, device_id, event_type
+                           ORDER BY
+                               CASE WHEN event_type = 'DWELL_TIME'
+                                    THEN started_at END ASC,
+                               started_at DESC,
+                               id DESC
+                       ) AS rn
+                  FROM alert_events
+                 WHERE is_open
+                   AND event_type IN ('FORBIDDEN_SECTOR', 'DWELL_TIME')
+               ) AS dup
+         WHERE ae.id = dup.id
+           AND dup.rn > 1
+        """
+    )
+    op.create_index(
+        "ix_alert_events_open_rtls_session",
+        "alert_events",
+        ["rule_id", "tag_id", "device_id", "event_type"],
+        unique=True,
+        postgresql_where=sa.text(
+            "is_open AND event_type IN ('FORBIDDEN_SECTOR', 'DWELL_TIME')"
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_alert_events_open_rtls_session", table_name="alert_events")
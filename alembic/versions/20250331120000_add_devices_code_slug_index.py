@@ -0,0 +1,29 @@
+"""add expression index on devices code slug
+
+Revision ID: 20250331120000
+Revises: 20250330120000
+Create Date: 2025-03-31 12:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "20250331120000"
+down_revision = "20250330120000"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Mesmo slug que o cam-bus usa no tópico (lower, " " -> "_", "/" -> "-"):
+    # o coletor acha a câmera por índice em vez de varrer todas as CAMERA.
+    op.create_index(
+        "ix_devices_code_slug",
+        "devices",
+        [sa.text("lower(replace(replace(btrim(code), ' ', '_'), '/', '-'))")],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_devices_code_slug", table_name="devices")
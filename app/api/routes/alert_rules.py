@@ -11,6 +11,7 @@ from app.schemas.alert_rule import (
     AlertRuleRead,
     AlertRuleUpdate,
 )
+from app.services.alert_engine import invalidate_rules_cache
 
 # 🔔 dispatcher genérico de webhooks
 from app.services.webhook_dispatcher import dispatch_generic_webhook
@@ -55,6 +56,7 @@ async def create_alert_rule(
     db: AsyncSession = Depends(get_db_session),
 ):
     rule = await crud_alert_rule.create(db, rule_in)
+    invalidate_rules_cache()
 
     # 🔔 Webhook: ALERT_RULE_CREATED
     created_at = getattr(rule, "created_at", None)
@@ -100,6 +102,7 @@ async def update_alert_rule(
         raise HTTPException(status_code=404, detail="Alert rule not found")
 
     updated = await crud_alert_rule.update(db, db_obj, rule_in)
+    invalidate_rules_cache()
 
     # 🔔 Webhook: ALERT_RULE_UPDATED
     updated_at = getattr(updated, "updated_at", None)
@@ -131,6 +134,7 @@ async def delete_alert_rule(
     deleted = await crud_alert_rule.remove(db, id=rule_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="Alert rule not found")
+    invalidate_rules_cache()
 
     # 🔔 Webhook: ALERT_RULE_DELETED
     await dispatch_generic_webhook(
@@ -12,6 +12,8 @@ from app.schemas import BuildingCreate, BuildingRead, BuildingUpdate, FloorPlanR
 # 🔔 dispatcher genérico de webhooks (mesmo que usamos em devices/people/tags)
 from app.services.webhook_dispatcher import dispatch_generic_webhook
 from app.services.access_control_projection import publish_projection_for_building
+from app.services.alert_engine import invalidate_location_cache
+from app.services.cambus_publisher import invalidate_building_floor_cache
 
 router = APIRouter()
 
@@ -105,6 +107,8 @@ async def update_building(
         )
 
     updated = await crud_building.update(db, db_building, building_in)
+    invalidate_location_cache()
+    invalidate_building_floor_cache()
 
     # 🔔 Webhook: BUILDING_UPDATED
     updated_at = getattr(updated, "updated_at", None)
@@ -145,6 +149,8 @@ async def delete_building(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Building not found",
         )
+    invalidate_location_cache()
+    invalidate_building_floor_cache()
 
     # 🔔 Webhook: BUILDING_DELETED
     label = (
@@ -22,6 +22,7 @@ from app.schemas import (
     DeviceRead,
 )
 from app.services.access_control_projection import publish_projection_for_floor_plan
+from app.services.alert_engine import invalidate_location_cache
 
 router = APIRouter()
 
@@ -70,6 +71,7 @@ async def update_floor_plan(
     if not db_obj:
         raise HTTPException(status_code=404, detail="Floor plan not found")
     updated = await crud_floor_plan.update(db, db_obj, floor_plan_in)
+    invalidate_location_cache()
     await publish_projection_for_floor_plan(db, updated)
     return updated
 
@@ -82,6 +84,7 @@ async def delete_floor_plan(
     deleted = await crud_floor_plan.remove(db, id=floor_plan_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="Floor plan not found")
+    invalidate_location_cache()
     return None
 
 
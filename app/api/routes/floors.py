@@ -8,6 +8,8 @@ from app.api.deps import get_db_session
 from app.crud import floor as crud_floor
 from app.schemas import FloorCreate, FloorRead, FloorUpdate
 from app.services.access_control_projection import publish_projection_for_floor
+from app.services.alert_engine import invalidate_location_cache
+from app.services.cambus_publisher import invalidate_building_floor_cache
 
 router = APIRouter()
 
@@ -56,6 +58,8 @@ async def update_floor(
     if not db_obj:
         raise HTTPException(status_code=404, detail="Floor not found")
     updated = await crud_floor.update(db, db_obj, floor_in)
+    invalidate_location_cache()
+    invalidate_building_floor_cache()
     await publish_projection_for_floor(db, updated)
     return updated
 
@@ -68,4 +72,6 @@ async def delete_floor(
     deleted = await crud_floor.remove(db, id=floor_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="Floor not found")
+    invalidate_location_cache()
+    invalidate_building_floor_cache()
     return None
@@ -8,7 +8,7 @@ import mimetypes
 import uuid
 from tempfile import SpooledTemporaryFile
 from urllib.request import urlopen
-from app.services.chatwoot_client import ChatwootClient
+from app.services.chatwoot_client import get_chatwoot_client
 from app.api.deps import get_current_user
 from app.db.session import get_db
 from app.models.incident_message import IncidentMessage
@@ -60,7 +60,7 @@ from app.schemas import (
 )
 
 logger = logging.getLogger(__name__)
-chatwoot_client = ChatwootClient()
+chatwoot_client = get_chatwoot_client()
 router = APIRouter()
 
 
@@ -11,6 +11,7 @@ from app.schemas.webhook import (
     WebhookSubscriptionUpdate,
     WebhookEventTypeMeta,
 )
+from app.services.webhook_dispatcher import invalidate_subscriptions_cache
 
 router = APIRouter()
 
@@ -312,7 +313,9 @@ async def create_webhook(
     webhook_in: WebhookSubscriptionCreate,
     db: AsyncSession = Depends(get_db_session),
 ):
-    return await crud_webhook.create(db, webhook_in)
+    webhook = await crud_webhook.create(db, webhook_in)
+    invalidate_subscriptions_cache()
+    return webhook
 
 
 @router.get("/{webhook_id}", response_model=WebhookSubscriptionRead)
@@ -335,7 +338,9 @@ async def update_webhook(
     db_obj = await crud_webhook.get(db, id=webhook_id)
     if not db_obj:
         raise HTTPException(status_code=404, detail="Webhook not found")
-    return await crud_webhook.update(db, db_obj, webhook_in)
+    updated = await crud_webhook.update(db, db_obj, webhook_in)
+    invalidate_subscriptions_cache()
+    return updated
 
 
 @router.delete("/{webhook_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -346,4 +351,5 @@ async def delete_webhook(
     deleted = await crud_webhook.remove(db, id=webhook_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="Webhook not found")
+    invalidate_subscriptions_cache()
     return None
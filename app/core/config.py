@@ -50,6 +50,8 @@ class Settings(BaseSettings):
     CHATWOOT_DEFAULT_CONTACT_IDENTIFIER: str = "security-vision-system"
     CHATWOOT_WEBHOOK_TOKEN: str | None = os.getenv("CHATWOOT_WEBHOOK_TOKEN")
     CHATWOOT_INCIDENT_BASE_URL: AnyHttpUrl | None = None
+    CHATWOOT_HTTP_RETRIES: int = 2
+    CHATWOOT_RETRY_BASE_DELAY_SECONDS: float = 0.6
     POSITION_STALE_THRESHOLD_SECONDS: int = 15
     PRESENCE_SESSION_GAP_SECONDS: int = Field(
         default=15,
@@ -72,6 +74,50 @@ class Settings(BaseSettings):
         default=60,
         description="Intervalo (em minutos) entre execuções do rollup/purge automático.",
     )
+    WEBHOOK_DISPATCH_WORKERS: int = Field(
+        default=4,
+        description=(
+            "Workers em background que enviam os webhooks de AlertEvent. "
+            "0 = envio inline (bloqueia o caminho de detecção)."
+        ),
+    )
+    DB_QUERY_CACHE_SIZE: int = Field(
+        default=1200,
+        description=(
+            "Tamanho do cache de SQL compilado do engine (query_cache_size do "
+            "SQLAlchemy; o padrão é 500)."
+        ),
+    )
+    DB_POOL_SIZE: int = Field(
+        default=32,
+        description=(
+            "Conexões mantidas no pool do engine (Postgres). Ingest MQTT, "
+            "cam-bus e API dividem o mesmo pool."
+        ),
+    )
+    DB_MAX_OVERFLOW: int = Field(
+        default=0,
+        description="Conexões extras além de DB_POOL_SIZE em picos (0 = limite fixo).",
+    )
+    DB_POOL_TIMEOUT_SECONDS: float = Field(
+        default=10.0,
+        description="Espera máxima (s) por uma conexão livre do pool antes de falhar.",
+    )
+    DB_POOL_RECYCLE_SECONDS: int = Field(
+        default=1800,
+        description="Idade máxima (s) de uma conexão do pool antes de ser reaberta.",
+    )
+    DB_STATEMENT_CACHE_SIZE: int = Field(
+        default=2048,
+        description="Cache de prepared statements do asyncpg, por conexão.",
+    )
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = Field(
+        default=512,
+        description=(
+            "Cache de prepared statements do dialeto asyncpg do SQLAlchemy, "
+            "por conexão (o padrão é 100)."
+        ),
+    )
     # ==================================================================
 
     # Config Pydantic v2
@@ -198,6 +244,14 @@ class Settings(BaseSettings):
     # Outros ajustes
     # ------------------------------------------------------------------
     DEVICE_OFFLINE_THRESHOLD_SECONDS: int = 60
+    ALERT_DETECTION_COALESCE_SECONDS: float = Field(
+        default=2.0,
+        description=(
+            "Janela (s) em que detecções repetidas da mesma TAG no mesmo gateway "
+            "só atualizam last_seen_at das sessões abertas, em lote, sem rodar o "
+            "alert_engine completo. 0 desabilita."
+        ),
+    )
 
     # ==================================================================
     # Propriedades derivadas
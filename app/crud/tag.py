@@ -1,7 +1,9 @@
 # app/crud/tag.py
 from sqlalchemy import select
+from sqlalchemy.orm import joinedload
 
 from app.crud.base import CRUDBase
+from app.models.person import Person
 from app.models.tag import Tag
 from app.schemas.tag import TagCreate, TagUpdate
 
@@ -12,6 +14,16 @@ class CRUDTag(CRUDBase[Tag, TagCreate, TagUpdate]):
         result = await db.execute(stmt)
         return result.scalars().first()
 
+    async def get_by_mac_with_person(self, db, mac_address: str) -> Tag | None:
+        # 🔹 já traz pessoa + grupos no mesmo SELECT (usado pelo alert engine na ingestão)
+        stmt = (
+            select(self.model)
+            .options(joinedload(self.model.person).joinedload(Person.groups))
+            .where(self.model.mac_address == mac_address)
+        )
+        result = await db.execute(stmt)
+        return result.unique().scalars().first()
+
     async def get_by_person(self, db, person_id: int) -> list[Tag]:
         stmt = select(self.model).where(self.model.person_id == person_id)
         result = await db.execute(stmt)
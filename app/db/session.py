@@ -15,8 +15,26 @@ from app.db.base import Base  # 🔴 ajuste o import se o seu Base estiver em ou
 engine_kwargs = {
     "future": True,
     "echo": False,  # coloque True se quiser ver o SQL no log
+    # SQL compilado reaproveitado entre execuções (alert_engine roda as mesmas
+    # consultas a cada detecção)
+    "query_cache_size": settings.DB_QUERY_CACHE_SIZE,
 }
 
+if settings.database_url.startswith("postgresql+asyncpg"):
+    # Pool dimensionado para o ingest (MQTT + cam-bus + API em paralelo) e
+    # caches de prepared statement maiores: as consultas quentes são sempre
+    # as mesmas
+    engine_kwargs.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        connect_args={
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE,
+        },
+    )
+
 engine = create_async_engine(
     settings.database_url,
     **engine_kwargs,
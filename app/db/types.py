@@ -0,0 +1,33 @@
+# app/db/types.py
+from sqlalchemy import JSON
+from sqlalchemy.types import TypeDecorator
+
+
+class RawJSON(str):
+    """
+    Texto JSON já serializado (ex.: payload MQTT como chegou), para gravar
+    numa coluna PassthroughJSON sem passar de novo pelo json.dumps.
+    """
+
+
+class PassthroughJSON(TypeDecorator):
+    """
+    JSON que aceita RawJSON no bind e repassa o texto sem reserializar.
+    Demais valores (dict, list, ...) seguem o caminho normal do JSON; a
+    leitura não muda.
+    """
+
+    impl = JSON
+    cache_ok = True
+
+    def bind_processor(self, dialect):
+        json_process = super().bind_processor(dialect)
+
+        def process(value):
+            if isinstance(value, RawJSON):
+                return str(value)
+            if json_process is not None:
+                return json_process(value)
+            return value
+
+        return process
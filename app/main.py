@@ -17,6 +17,9 @@ from app.db.session import AsyncSessionLocal
 from app.services.mqtt_ingestor import MqttIngestor
 from app.services.cambus_event_collector import run_cambus_event_collector  # 👈 NOVO
 from app.services.presence_rollup import run_rollup_loop
+from app.services.webhook_dispatcher import start_webhook_workers, stop_webhook_workers
+from app.services.cambus_publisher import close_cambus_mqtt_client
+from app.services.chatwoot_client import close_chatwoot_cache, close_chatwoot_http
 
 logger = logging.getLogger("rtls.main")
 
@@ -91,6 +94,9 @@ async def on_startup() -> None:
 
     await _bootstrap_superadmin()
 
+    # 👇 Envio de webhooks de alertas fora do caminho de detecção
+    start_webhook_workers(settings.WEBHOOK_DISPATCH_WORKERS)
+
     # 👇 Ingestor de gateways RTLS (já existia)
     if settings.MQTT_ENABLED:
         logger.info("Starting MQTT ingestor task...")
@@ -146,6 +152,16 @@ async def on_shutdown() -> None:
         except asyncio.CancelledError:
             logger.info("Presence rollup task cancelled")
 
+    # Conexão MQTT persistente dos publishes do cam-bus
+    await close_cambus_mqtt_client()
+
+    # Pool HTTP compartilhado e cache Redis do Chatwoot
+    await close_chatwoot_http()
+    await close_chatwoot_cache()
+
+    # Por último: esvazia a fila de webhooks gerados pelas tasks acima
+    await stop_webhook_workers()
+
 
 @app.get("/health", tags=["health"])
 async def healthcheck():
@@ -8,6 +8,7 @@ from sqlalchemy import (
     Boolean,
     DateTime,
     ForeignKey,
+    Index,
     String,
     Text,
     text,
@@ -29,6 +30,66 @@ if TYPE_CHECKING:
 
 class AlertEvent(Base):
     __tablename__ = "alert_events"
+    # Índices parciais das sessões abertas (ver migration 20250327120000)
+    __table_args__ = (
+        Index(
+            "ix_alert_events_open_type_tag",
+            "event_type",
+            "tag_id",
+            "last_seen_at",
+            postgresql_where=text("is_open"),
+        ),
+        Index(
+            "ix_alert_events_open_rule_device_tag",
+            "rule_id",
+            "device_id",
+            "tag_id",
+            postgresql_where=text("is_open"),
+        ),
+        # Lookup quente do alert_engine (_load_open_sessions): tag + gateway,
+        # ordenado por started_at (ver migration 20250329120000)
+        Index(
+            "ix_alert_events_open_tag_device_type",
+            "tag_id",
+            "device_id",
+            "event_type",
+            text("started_at DESC"),
+            postgresql_where=text("is_open"),
+        ),
+        Index(
+            "ix_alert_events_open_rtls_last_seen",
+            "last_seen_at",
+            postgresql_where=text(
+                "is_open AND event_type IN ('FORBIDDEN_SECTOR', 'DWELL_TIME')"
+            ),
+        ),
+        # No máximo uma sessão RTLS aberta por (regra, tag, device, tipo)
+        # (UPSERT do alert_engine; ver migration 20250330120000)
+        Index(
+            "ix_alert_events_open_rtls_session",
+            "rule_id",
+            "tag_id",
+            "device_id",
+            "event_type",
+            unique=True,
+            postgresql_where=text(
+                "is_open AND event_type IN ('FORBIDDEN_SECTOR', 'DWELL_TIME')"
+            ),
+            sqlite_where=text(
+                "is_open AND event_type IN ('FORBIDDEN_SECTOR', 'DWELL_TIME')"
+            ),
+        ),
+        # No máximo uma sessão GATEWAY_OFFLINE aberta por device (UPSERT do
+        # alert_engine; ver migration 20250328120000)
+        Index(
+            "ix_alert_events_open_gateway_offline",
+            "device_id",
+            "event_type",
+            unique=True,
+            postgresql_where=text("is_open AND event_type = 'GATEWAY_OFFLINE'"),
+            sqlite_where=text("is_open AND event_type = 'GATEWAY_OFFLINE'"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
 
@@ -4,7 +4,7 @@ from __future__ import annotations
 from datetime import datetime
 from typing import List, Optional, TYPE_CHECKING
 
-from sqlalchemy import Float, ForeignKey, String, Integer, text, Column, JSON
+from sqlalchemy import Float, ForeignKey, Index, String, Integer, text, Column, JSON
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db.base_class import Base
 
@@ -22,6 +22,15 @@ if TYPE_CHECKING:
 
 class Device(Base):
     __tablename__ = "devices"
+    # Slug do code (mesma regra do _slug do cam-bus) para achar a câmera pelo
+    # segmento do tópico MQTT (ver cambus_event_collector e migration
+    # 20250331120000). A expressão tem que bater com a da consulta.
+    __table_args__ = (
+        Index(
+            "ix_devices_code_slug",
+            text("lower(replace(replace(btrim(code), ' ', '_'), '/', '-'))"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
 
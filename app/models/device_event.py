@@ -4,10 +4,11 @@ from __future__ import annotations
 from datetime import datetime
 from typing import TYPE_CHECKING, Optional
 
-from sqlalchemy import String, ForeignKey, JSON, DateTime, text
+from sqlalchemy import String, ForeignKey, DateTime, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base_class import Base
+from app.db.types import PassthroughJSON
 
 if TYPE_CHECKING:
     from app.models.device import Device
@@ -30,8 +31,9 @@ class DeviceEvent(Base):
     # analyticType / eventType que veio no payload (faceCapture, PeopleCounting, etc.)
     analytic_type: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
 
-    # payload JSON bruto (event + meta)
-    payload: Mapped[dict] = mapped_column(JSON, nullable=False)
+    # payload JSON bruto (event + meta); o cam-bus grava o texto recebido
+    # direto (RawJSON), sem reserializar
+    payload: Mapped[dict] = mapped_column(PassthroughJSON, nullable=False)
 
     # quando o evento ocorreu (Timestamp / dateTime do payload, caindo pra now() se não tiver)
     occurred_at: Mapped[datetime] = mapped_column(
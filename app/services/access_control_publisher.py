@@ -1,12 +1,13 @@
 # app/services/access_control_publisher.py
 from __future__ import annotations
 
-import json
 import logging
 from datetime import datetime, time
-from typing import Any
+from functools import lru_cache
+from typing import Any, Callable, Optional, TypeVar
 
-from asyncio_mqtt import Client as MQTTClient
+import orjson
+from aiomqtt import Client as MQTTClient, ProtocolVersion
 from sqlalchemy import inspect
 
 from app.core.config import settings
@@ -17,6 +18,8 @@ from app.models.person import Person
 
 logger = logging.getLogger(__name__)
 
+_T = TypeVar("_T")
+
 
 def _slug(value: str, default: str) -> str:
     v = (value or "").strip()
@@ -95,130 +98,225 @@ def _access_control_topic(*segments: str) -> str:
     return "/".join([base, tenant, *cleaned])
 
 
+_ENVELOPE_SOURCE = "central-backend"
+
+
 def _build_access_control_envelope(event: str, entity: str, payload: dict[str, Any]) -> dict[str, Any]:
     return {
         "event": event,
         "entity": entity,
-        "source": "central-backend",
+        "source": _ENVELOPE_SOURCE,
         "payload": payload,
     }
 
 
-async def _mqtt_publish_raw(topic: str, payload: str, *, retain: bool = True, qos: int = 1) -> None:
+@lru_cache(maxsize=None)
+def _envelope_prefix(event: str, entity: str) -> bytes:
+    """
+    Parte fixa do envelope já serializada, até a chave "payload".
+
+    Só existem poucas combinações (event, entity), então o prefixo é montado
+    uma vez e, em cada publish, só o payload interno é serializado.
+    """
+    return (
+        b'{"event":' + orjson.dumps(event)
+        + b',"entity":' + orjson.dumps(entity)
+        + b',"source":' + orjson.dumps(_ENVELOPE_SOURCE)
+        + b',"payload":'
+    )
+
+
+def _mqtt_publish_enabled(topic: str) -> bool:
     if not settings.ACCESS_CONTROL_MQTT_ENABLED:
         logger.debug("[access-control] ACCESS_CONTROL_MQTT_ENABLED=false, não publicando em %s", topic)
-        return
+        return False
     if not settings.RTLS_MQTT_ENABLED:
         logger.debug("[access-control] RTLS_MQTT_ENABLED=false, não publicando em %s", topic)
-        return
+        return False
+    return True
+
 
+async def _mqtt_publish_raw(topic: str, payload: str | bytes, *, retain: bool = True, qos: int = 1) -> None:
     host = settings.RTLS_MQTT_HOST
     port = settings.RTLS_MQTT_PORT
     username = settings.RTLS_MQTT_USERNAME or None
     password = settings.RTLS_MQTT_PASSWORD or None
 
-    logger.info("[access-control] MQTT publish topic=%s retain=%s payload=%s", topic, retain, payload)
-
-    async with MQTTClient(hostname=host, port=port, username=username, password=password) as client:
+    logger.info("[access-control] MQTT publish topic=%s retain=%s bytes=%d", topic, retain, len(payload))
+    if logger.isEnabledFor(logging.DEBUG):
+        text = payload.decode("utf-8") if isinstance(payload, bytes) else payload
+        logger.debug("[access-control] MQTT payload topic=%s payload=%s", topic, text)
+
+    # Topic alias (MQTT v5) só vale dentro da mesma conexão; como abrimos uma
+    # conexão por publish, mandamos sempre o tópico completo.
+    async with MQTTClient(
+        hostname=host,
+        port=port,
+        username=username,
+        password=password,
+        protocol=ProtocolVersion.V5,
+    ) as client:
         await client.publish(topic, payload, qos=qos, retain=retain)
 
 
-async def _mqtt_publish_json(topic: str, payload: dict[str, Any], *, retain: bool = True, qos: int = 1) -> None:
-    payload_str = json.dumps(payload, ensure_ascii=False)
-    await _mqtt_publish_raw(topic, payload_str, retain=retain, qos=qos)
+async def _mqtt_publish_envelope(
+    topic: str,
+    event: str,
+    entity: str,
+    build_payload: Callable[[_T], dict[str, Any]],
+    obj: _T,
+    *,
+    retain: bool = True,
+    qos: int = 1,
+) -> Optional[dict[str, Any]]:
+    """
+    Publica o envelope com o payload montado por ``build_payload(obj)`` e
+    devolve o envelope publicado.
+
+    A checagem de MQTT habilitado vem antes do builder: com MQTT desligado
+    (testes/CI) o payload nem é montado e o retorno é ``None`` (nada foi
+    publicado).
+    """
+    if not _mqtt_publish_enabled(topic):
+        return None
+    payload = build_payload(obj)
+    body = _envelope_prefix(event, entity) + orjson.dumps(payload) + b"}"
+    await _mqtt_publish_raw(topic, body, retain=retain, qos=qos)
+    return _build_access_control_envelope(event, entity, payload)
 
 
 async def _mqtt_publish_empty(topic: str, *, retain: bool = True, qos: int = 1) -> None:
+    if not _mqtt_publish_enabled(topic):
+        return
     await _mqtt_publish_raw(topic, "", retain=retain, qos=qos)
 
 
+# Os builders abaixo leem direto de ``obj.__dict__`` para não passar pelo
+# descriptor instrumentado do SQLAlchemy a cada campo. Os objetos chegam aqui
+# já carregados (create/update fazem refresh); atributo ausente vira None.
+
+
 def _location_payload(location: Location) -> dict[str, Any]:
+    d = location.__dict__
     return {
-        "id": location.id,
-        "name": location.name,
-        "description": location.description,
-        "status": _normalize_location_status(location.status),
-        "floor_ids": [floor.id for floor in getattr(location, "floors", [])],
-        "created_at": _serialize_datetime(location.created_at),
-        "updated_at": _serialize_datetime(location.updated_at),
+        "id": d.get("id"),
+        "name": d.get("name"),
+        "description": d.get("description"),
+        "status": _normalize_location_status(d.get("status")),
+        "floor_ids": [floor.id for floor in d.get("floors") or []],
+        "created_at": _serialize_datetime(d.get("created_at")),
+        "updated_at": _serialize_datetime(d.get("updated_at")),
     }
 
 
 def _location_rule_payload(rule: LocationRule) -> dict[str, Any]:
+    d = rule.__dict__
     return {
-        "id": rule.id,
-        "location_id": rule.location_id,
-        "capacity": rule.capacity,
-        "avaliable_days": _parse_avaliable_days(rule.avaliable_days),
-        "start_time": _serialize_time(rule.start_time),
-        "end_time": _serialize_time(rule.end_time),
-        "status": rule.status,
-        "validate": rule.validate,
-        "created_at": _serialize_datetime(rule.created_at),
-        "updated_at": _serialize_datetime(rule.updated_at),
+        "id": d.get("id"),
+        "location_id": d.get("location_id"),
+        "capacity": d.get("capacity"),
+        "avaliable_days": _parse_avaliable_days(d.get("avaliable_days")),
+        "start_time": _serialize_time(d.get("start_time")),
+        "end_time": _serialize_time(d.get("end_time")),
+        "status": d.get("status"),
+        "validate": d.get("validate"),
+        "created_at": _serialize_datetime(d.get("created_at")),
+        "updated_at": _serialize_datetime(d.get("updated_at")),
     }
 
 
 def _user_payload(person: Person) -> dict[str, Any]:
-    document_id = person.document_id
-    phone = person.phone
-    user_type = person.user_type
+    d = person.__dict__
+    person_id = d.get("id")
+    document_id = d.get("document_id")
+    phone = d.get("phone")
+    user_type = d.get("user_type")
     if document_id is None:
-        logger.warning("[access-control] person %s sem document_id definido; usando vazio no payload", person.id)
+        logger.warning("[access-control] person %s sem document_id definido; usando vazio no payload", person_id)
     if phone is None:
-        logger.warning("[access-control] person %s sem phone definido; usando vazio no payload", person.id)
+        logger.warning("[access-control] person %s sem phone definido; usando vazio no payload", person_id)
     if user_type is None:
-        logger.warning("[access-control] person %s sem user_type definido", person.id)
+        logger.warning("[access-control] person %s sem user_type definido", person_id)
 
     return {
-        "id": person.id,
-        "email": person.email,
-        "full_name": person.full_name,
+        "id": person_id,
+        "email": d.get("email"),
+        "full_name": d.get("full_name"),
         "document_id": document_id or "",
         "cpf": document_id or "",
         "phone": phone or "",
         "user_type": user_type if user_type is not None else "UNKNOWN",
-        "is_active": person.active,
-        "created_at": _serialize_datetime(person.created_at),
-        "updated_at": _serialize_datetime(person.updated_at),
+        "is_active": d.get("active"),
+        "created_at": _serialize_datetime(d.get("created_at")),
+        "updated_at": _serialize_datetime(d.get("updated_at")),
     }
 
 
 def _device_payload(device: Device) -> dict[str, Any]:
-    serial_number = device.code or device.mac_address
+    d = device.__dict__
+    code = d.get("code")
+    mac_address = d.get("mac_address")
+    device_type = d.get("type")
     return {
-        "id": device.id,
-        "name": device.name,
-        "type": device.type,
-        "description": device.description,
-        "code": device.code,
-        "mac_address": device.mac_address,
-        "ip_address": device.ip_address,
-        "port": device.port,
-        "username": device.username,
-        "building_id": device.building_id,
-        "floor_id": device.floor_id,
-        "brand": device.manufacturer,
-        "category": device.type,
-        "serialNumber": serial_number,
-        "config": device.analytics or {},
+        "id": d.get("id"),
+        "name": d.get("name"),
+        "type": device_type,
+        "description": d.get("description"),
+        "code": code,
+        "mac_address": mac_address,
+        "ip_address": d.get("ip_address"),
+        "port": d.get("port"),
+        "username": d.get("username"),
+        "building_id": d.get("building_id"),
+        "floor_id": d.get("floor_id"),
+        "brand": d.get("manufacturer"),
+        "category": device_type,
+        "serialNumber": code or mac_address,
+        "config": d.get("analytics") or {},
         "locationId": _resolve_device_location_id(device),
-        "created_at": _serialize_datetime(device.created_at),
-        "updated_at": _serialize_datetime(device.updated_at),
+        "created_at": _serialize_datetime(d.get("created_at")),
+        "updated_at": _serialize_datetime(d.get("updated_at")),
+    }
+
+
+def _device_user_payload(device_user: DeviceUser) -> dict[str, Any]:
+    return {
+        "device_id": device_user.device_id,
+        "person_id": device_user.person_id,
+        "deviceUserId": device_user.device_user_id,
+        "status": device_user.status,
     }
 
 
-async def publish_access_control_location_created(location: Location) -> tuple[str, dict[str, Any]]:
+# publish_*: devolvem (tópico, envelope publicado). Com MQTT desligado o
+# envelope é None; as variantes *_deleted publicam vazio e devolvem {}.
+
+
+async def publish_access_control_location_created(location: Location) -> tuple[str, Optional[dict[str, Any]]]:
     topic = _access_control_topic("locations", "created")
-    payload = _build_access_control_envelope("created", "location", _location_payload(location))
-    await _mqtt_publish_json(topic, payload, retain=True, qos=1)
+    payload = await _mqtt_publish_envelope(
+        topic,
+        "created",
+        "location",
+        _location_payload,
+        location,
+        retain=True,
+        qos=1,
+    )
     return topic, payload
 
 
-async def publish_access_control_location_updated(location: Location) -> tuple[str, dict[str, Any]]:
+async def publish_access_control_location_updated(location: Location) -> tuple[str, Optional[dict[str, Any]]]:
     topic = _access_control_topic("locations", "updated")
-    payload = _build_access_control_envelope("updated", "location", _location_payload(location))
-    await _mqtt_publish_json(topic, payload, retain=True, qos=1)
+    payload = await _mqtt_publish_envelope(
+        topic,
+        "updated",
+        "location",
+        _location_payload,
+        location,
+        retain=True,
+        qos=1,
+    )
     return topic, payload
 
 
@@ -228,17 +326,31 @@ async def publish_access_control_location_deleted() -> tuple[str, dict[str, Any]
     return topic, {}
 
 
-async def publish_access_control_user_created(person: Person) -> tuple[str, dict[str, Any]]:
+async def publish_access_control_user_created(person: Person) -> tuple[str, Optional[dict[str, Any]]]:
     topic = _access_control_topic("users", "created")
-    payload = _build_access_control_envelope("created", "user", _user_payload(person))
-    await _mqtt_publish_json(topic, payload, retain=True, qos=1)
+    payload = await _mqtt_publish_envelope(
+        topic,
+        "created",
+        "user",
+        _user_payload,
+        person,
+        retain=True,
+        qos=1,
+    )
     return topic, payload
 
 
-async def publish_access_control_user_updated(person: Person) -> tuple[str, dict[str, Any]]:
+async def publish_access_control_user_updated(person: Person) -> tuple[str, Optional[dict[str, Any]]]:
     topic = _access_control_topic("users", "updated")
-    payload = _build_access_control_envelope("updated", "user", _user_payload(person))
-    await _mqtt_publish_json(topic, payload, retain=True, qos=1)
+    payload = await _mqtt_publish_envelope(
+        topic,
+        "updated",
+        "user",
+        _user_payload,
+        person,
+        retain=True,
+        qos=1,
+    )
     return topic, payload
 
 
@@ -248,17 +360,31 @@ async def publish_access_control_user_deleted() -> tuple[str, dict[str, Any]]:
     return topic, {}
 
 
-async def publish_access_control_location_rule_created(rule: LocationRule) -> tuple[str, dict[str, Any]]:
+async def publish_access_control_location_rule_created(rule: LocationRule) -> tuple[str, Optional[dict[str, Any]]]:
     topic = _access_control_topic("locations-rules", "created")
-    payload = _build_access_control_envelope("created", "location_rule", _location_rule_payload(rule))
-    await _mqtt_publish_json(topic, payload, retain=True, qos=1)
+    payload = await _mqtt_publish_envelope(
+        topic,
+        "created",
+        "location_rule",
+        _location_rule_payload,
+        rule,
+        retain=True,
+        qos=1,
+    )
     return topic, payload
 
 
-async def publish_access_control_location_rule_updated(rule: LocationRule) -> tuple[str, dict[str, Any]]:
+async def publish_access_control_location_rule_updated(rule: LocationRule) -> tuple[str, Optional[dict[str, Any]]]:
     topic = _access_control_topic("locations-rules", "updated")
-    payload = _build_access_control_envelope("updated", "location_rule", _location_rule_payload(rule))
-    await _mqtt_publish_json(topic, payload, retain=True, qos=1)
+    payload = await _mqtt_publish_envelope(
+        topic,
+        "updated",
+        "location_rule",
+        _location_rule_payload,
+        rule,
+        retain=True,
+        qos=1,
+    )
     return topic, payload
 
 
@@ -270,19 +396,33 @@ async def publish_access_control_location_rule_deleted() -> tuple[str, dict[str,
 
 async def publish_access_control_device_created(
     device: Device,
-) -> tuple[str, dict[str, Any]]:
+) -> tuple[str, Optional[dict[str, Any]]]:
     topic = _access_control_topic("devices", "created")
-    payload = _build_access_control_envelope("created", "device", _device_payload(device))
-    await _mqtt_publish_json(topic, payload, retain=True, qos=1)
+    payload = await _mqtt_publish_envelope(
+        topic,
+        "created",
+        "device",
+        _device_payload,
+        device,
+        retain=True,
+        qos=1,
+    )
     return topic, payload
 
 
 async def publish_access_control_device_updated(
     device: Device,
-) -> tuple[str, dict[str, Any]]:
+) -> tuple[str, Optional[dict[str, Any]]]:
     topic = _access_control_topic("devices", "updated")
-    payload = _build_access_control_envelope("updated", "device", _device_payload(device))
-    await _mqtt_publish_json(topic, payload, retain=True, qos=1)
+    payload = await _mqtt_publish_envelope(
+        topic,
+        "updated",
+        "device",
+        _device_payload,
+        device,
+        retain=True,
+        qos=1,
+    )
     return topic, payload
 
 
@@ -294,37 +434,33 @@ async def publish_access_control_device_deleted() -> tuple[str, dict[str, Any]]:
 
 async def publish_access_control_device_user_created(
     device_user: DeviceUser,
-) -> tuple[str, dict[str, Any]]:
+) -> tuple[str, Optional[dict[str, Any]]]:
     topic = _access_control_topic("device-users", "created")
-    payload = _build_access_control_envelope(
+    payload = await _mqtt_publish_envelope(
+        topic,
         "created",
         "device_user",
-        {
-            "device_id": device_user.device_id,
-            "person_id": device_user.person_id,
-            "deviceUserId": device_user.device_user_id,
-            "status": device_user.status,
-        },
+        _device_user_payload,
+        device_user,
+        retain=True,
+        qos=1,
     )
-    await _mqtt_publish_json(topic, payload, retain=True, qos=1)
     return topic, payload
 
 
 async def publish_access_control_device_user_updated(
     device_user: DeviceUser,
-) -> tuple[str, dict[str, Any]]:
+) -> tuple[str, Optional[dict[str, Any]]]:
     topic = _access_control_topic("device-users", "updated")
-    payload = _build_access_control_envelope(
+    payload = await _mqtt_publish_envelope(
+        topic,
         "updated",
         "device_user",
-        {
-            "device_id": device_user.device_id,
-            "person_id": device_user.person_id,
-            "deviceUserId": device_user.device_user_id,
-            "status": device_user.status,
-        },
+        _device_user_payload,
+        device_user,
+        retain=True,
+        qos=1,
     )
-    await _mqtt_publish_json(topic, payload, retain=True, qos=1)
     return topic, payload
 
 
@@ -2,17 +2,37 @@
 
 from __future__ import annotations
 
-import json
+import asyncio
 import logging
+import time
 from datetime import datetime, timezone, timedelta
-from typing import List, Optional, Tuple, Dict, Any
-
-from sqlalchemy import select, or_
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+import orjson
+from sqlalchemy import (
+    DateTime,
+    Integer,
+    Row,
+    Text,
+    cast,
+    column,
+    extract,
+    func,
+    insert,
+    lambda_stmt,
+    literal,
+    or_,
+    select,
+    text,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.schemas.alert_event import AlertEventCreate
 from app.crud.alert_rule import alert_rule as crud_alert_rule
-from app.crud.alert_event import alert_event as crud_alert_event
 from app.models.alert_rule import AlertRule
 from app.models.alert_event import AlertEvent
 from app.models.device import Device
@@ -22,7 +42,7 @@ from app.models.floor_plan import FloorPlan
 from app.models.floor import Floor
 from app.models.building import Building
 from app.models.person_group import person_group_memberships
-from app.services.webhook_dispatcher import dispatch_webhooks
+from app.services.webhook_dispatcher import dispatch_webhooks, dispatch_webhooks_many
 from app.core.config import settings
 
 logger = logging.getLogger("rtls.alert_engine")
@@ -42,36 +62,35 @@ RTLS_SESSION_EVENT_TYPES = (FORBIDDEN_SECTOR, DWELL_TIME)
 # Utilitários
 # ---------------------------------------------------------------------------
 
+_UTC = timezone.utc
+
+
 def _ensure_utc(dt: datetime | None) -> datetime:
     """
     Garante datetime timezone-aware em UTC.
     """
-    now = datetime.now(timezone.utc)
     if dt is None:
-        return now
-    if dt.tzinfo is None:
-        return dt.replace(tzinfo=timezone.utc)
-    return dt.astimezone(timezone.utc)
+        return datetime.now(_UTC)
+    tz = dt.tzinfo
+    # caso comum: já veio em UTC (datetime.now(timezone.utc) / asyncpg)
+    if tz is _UTC:
+        return dt
+    if tz is None:
+        return dt.replace(tzinfo=_UTC)
+    return dt.astimezone(_UTC)
 
 
 def _dt_iso(dt: datetime | None) -> Optional[str]:
     return _ensure_utc(dt).isoformat() if dt is not None else None
 
 
-def _safe_json_load(s: str | None) -> Dict[str, Any]:
-    if not s:
-        return {}
-    try:
-        obj = json.loads(s)
-        return obj if isinstance(obj, dict) else {}
-    except Exception:
-        return {}
-
-
 def _safe_json_dump(d: Dict[str, Any]) -> str:
-    return json.dumps(d, ensure_ascii=False)
+    # payload é TEXT no banco; orjson já emite UTF-8 sem escapar não-ASCII
+    # e serializa datetime direto (mesmo formato de isoformat())
+    return orjson.dumps(d).decode("utf-8")
 
 
+@lru_cache(maxsize=1)
 def _get_session_ttl_seconds() -> int:
     """
     TTL para encerrar sessões RTLS quando não há novas evidências.
@@ -79,6 +98,9 @@ def _get_session_ttl_seconds() -> int:
     - settings.ALERT_SESSION_TTL_SECONDS (se existir)
     - fallback: settings.POSITION_STALE_THRESHOLD_SECONDS * 2
     - fallback final: 60s
+
+    Settings não mudam em runtime, então o valor é calculado uma vez só
+    (use ``_get_session_ttl_seconds.cache_clear()`` se precisar recalcular).
     """
     ttl = getattr(settings, "ALERT_SESSION_TTL_SECONDS", None)
     if isinstance(ttl, int) and ttl >= 0:
@@ -91,52 +113,172 @@ def _get_session_ttl_seconds() -> int:
     return 60
 
 
-async def _close_event_session(
+# Colunas que dispatch_webhooks lê do AlertEvent; as linhas do RETURNING
+# abaixo servem direto como "evento" para o dispatch.
+_WEBHOOK_COLUMNS = (
+    AlertEvent.id,
+    AlertEvent.event_type,
+    AlertEvent.message,
+    AlertEvent.rule_id,
+    AlertEvent.device_id,
+    AlertEvent.tag_id,
+    AlertEvent.person_id,
+    AlertEvent.building_id,
+    AlertEvent.floor_id,
+    AlertEvent.floor_plan_id,
+    AlertEvent.started_at,
+    AlertEvent.last_seen_at,
+    AlertEvent.ended_at,
+    AlertEvent.is_open,
+    AlertEvent.payload,
+)
+
+
+# Predicado do índice único parcial de GATEWAY_OFFLINE aberto (texto igual
+# ao do índice, para o Postgres inferir o índice no ON CONFLICT).
+_OPEN_GATEWAY_OFFLINE_WHERE = text("is_open AND event_type = 'GATEWAY_OFFLINE'")
+
+# Idem para o índice único de sessão RTLS aberta (ix_alert_events_open_rtls_session)
+_OPEN_RTLS_SESSION_WHERE = text(
+    "is_open AND event_type IN ('FORBIDDEN_SECTOR', 'DWELL_TIME')"
+)
+
+
+def _merge_payload_sql(patch):
+    """
+    ``payload || patch`` calculado no Postgres.
+
+    A coluna continua TEXT: converte para jsonb, faz o merge e volta para
+    texto, sem trazer o JSON para o Python.
+    """
+    current = cast(func.coalesce(func.nullif(AlertEvent.payload, ""), "{}"), JSONB)
+    return cast(current.op("||")(patch), Text)
+
+
+def _iso_utc_sql(ts):
+    """
+    Timestamp como texto ISO 8601 em UTC, no formato do isoformat() usado
+    pelo caminho Python (independe do TimeZone da sessão no Postgres).
+    """
+    return func.to_char(func.timezone("UTC", ts), 'YYYY-MM-DD"T"HH24:MI:SS.US"+00:00"')
+
+
+def _closed_payload_sql(reason: str):
+    """Campos gravados no payload ao fechar uma sessão (ended_at = last_seen_at)."""
+    duration = func.greatest(0, extract("epoch", AlertEvent.last_seen_at - AlertEvent.started_at))
+    last_seen_at = _iso_utc_sql(AlertEvent.last_seen_at)
+    return _merge_payload_sql(
+        func.jsonb_build_object(
+            "is_open", False,
+            "ended_at", last_seen_at,
+            "last_seen_at", last_seen_at,
+            "started_at", _iso_utc_sql(AlertEvent.started_at),
+            "duration_seconds", duration,
+            "close_reason", reason,
+        )
+    )
+
+
+async def _close_sessions(
     db: AsyncSession,
-    *,
-    event: AlertEvent,
+    *criteria,
     reason: str,
-) -> AlertEvent:
+    commit: bool = True,
+) -> List[Row]:
     """
-    Fecha uma sessão de alerta RTLS, usando ended_at = last_seen_at (última evidência real).
-    Atualiza payload com ended_at/is_open/duration e dispara webhook.
-    """
-    if not getattr(event, "is_open", False):
-        return event
-
-    last_seen = _ensure_utc(getattr(event, "last_seen_at", None))
-    started = _ensure_utc(getattr(event, "started_at", None))
-    ended_at = last_seen
-
-    payload = _safe_json_load(getattr(event, "payload", None))
-    payload.update(
-        {
-            "is_open": False,
-            "ended_at": ended_at.isoformat(),
-            "last_seen_at": last_seen.isoformat(),
-            "started_at": started.isoformat(),
-            "duration_seconds": max(0, (ended_at - started).total_seconds()),
-            "close_reason": reason,
-        }
+    Fecha, num único UPDATE ... RETURNING, as sessões abertas que batem com
+    ``criteria`` (ended_at = last_seen_at). Não dispara webhooks: devolve as
+    linhas fechadas para o chamador decidir. Com ``commit=False`` o commit
+    fica com o chamador (mesma transação dos demais writes).
+    """
+    stmt = (
+        update(AlertEvent)
+        .where(AlertEvent.is_open.is_(True), *criteria)
+        .values(
+            is_open=False,
+            ended_at=AlertEvent.last_seen_at,
+            payload=_closed_payload_sql(reason),
+        )
+        .returning(*_WEBHOOK_COLUMNS)
+        .execution_options(synchronize_session=False)
     )
+    res = await db.execute(stmt)
+    rows = res.all()
+    if rows and commit:
+        await db.commit()
+    return rows
 
-    updated = await crud_alert_event.update(
-        db,
-        event,
-        {
-            "is_open": False,
-            "ended_at": ended_at,
-            "payload": _safe_json_dump(payload),
-        },
+
+async def _update_session(
+    db: AsyncSession,
+    event_id: int,
+    *,
+    payload_patch: Dict[str, Any],
+    commit: bool = True,
+    **values: Any,
+) -> Optional[Row]:
+    """
+    Atualiza uma sessão (``values`` nas colunas + ``payload_patch`` mesclado
+    no payload pelo Postgres) e devolve a linha atualizada para o webhook,
+    ou None se a sessão já foi fechada.
+    """
+    stmt = (
+        update(AlertEvent)
+        .where(AlertEvent.id == event_id, AlertEvent.is_open.is_(True))
+        .values(payload=_merge_payload_sql(cast(literal(_safe_json_dump(payload_patch), Text), JSONB)), **values)
+        .returning(*_WEBHOOK_COLUMNS)
+        .execution_options(synchronize_session=False)
     )
+    row = (await db.execute(stmt)).first()
+    if commit:
+        await db.commit()
+    return row
 
-    # Dispara webhook de update/fechamento
-    try:
-        await dispatch_webhooks(db, updated)
-    except Exception:
-        logger.exception("Failed to dispatch webhook on alert close (event_id=%s)", updated.id)
 
-    return updated
+async def _insert_event(db: AsyncSession, event_in: AlertEventCreate) -> Row:
+    """
+    Cria o evento com INSERT ... RETURNING (colunas do webhook), sem passar
+    pelo ORM nem reler a linha. O commit fica com o chamador, uma vez por
+    detecção / transição.
+    """
+    stmt = (
+        insert(AlertEvent)
+        .values(**event_in.model_dump(exclude_unset=True))
+        .returning(*_WEBHOOK_COLUMNS)
+    )
+    return (await db.execute(stmt)).one()
+
+
+async def _upsert_session(
+    db: AsyncSession,
+    event_in: AlertEventCreate,
+    *,
+    payload_patch: Dict[str, Any],
+) -> Row:
+    """
+    Abre a sessão RTLS de ``event_in`` ou, se (regra, tag, device, tipo) já
+    tem uma aberta (índice único ix_alert_events_open_rtls_session), só
+    atualiza last_seen_at / last_collection_log_id e mescla ``payload_patch``.
+    Um único INSERT ... ON CONFLICT DO UPDATE; o commit fica com o chamador.
+    """
+    stmt = pg_insert(AlertEvent).values(**event_in.model_dump(exclude_unset=True))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[
+            AlertEvent.rule_id,
+            AlertEvent.tag_id,
+            AlertEvent.device_id,
+            AlertEvent.event_type,
+        ],
+        index_where=_OPEN_RTLS_SESSION_WHERE,
+        set_={
+            "last_seen_at": stmt.excluded.last_seen_at,
+            "last_collection_log_id": stmt.excluded.last_collection_log_id,
+            "payload": _merge_payload_sql(
+                cast(literal(_safe_json_dump(payload_patch), Text), JSONB)
+            ),
+        },
+    ).returning(*_WEBHOOK_COLUMNS)
+    return (await db.execute(stmt)).one()
 
 
 async def close_stale_rtls_sessions(
@@ -150,10 +292,10 @@ async def close_stale_rtls_sessions(
     """
     ETAPA 2: Fecha sessões RTLS (FORBIDDEN_SECTOR / DWELL_TIME) que ficaram "stale".
 
-    Encerramento:
+    Encerramento (um único UPDATE ... RETURNING para todas as sessões stale):
       - is_open=False
       - ended_at = last_seen_at (última evidência)
-      - payload enriquecido
+      - payload enriquecido (merge jsonb no Postgres)
 
     Pode ser chamado:
       - oportunisticamente em process_detection (para reentradas)
@@ -168,25 +310,25 @@ async def close_stale_rtls_sessions(
 
     cutoff = now - timedelta(seconds=ttl)
 
-    stmt = select(AlertEvent).where(
-        AlertEvent.is_open.is_(True),
+    criteria = [
         AlertEvent.event_type.in_(RTLS_SESSION_EVENT_TYPES),
         AlertEvent.last_seen_at < cutoff,
-    )
+    ]
 
     if tag_id is not None:
-        stmt = stmt.where(AlertEvent.tag_id == tag_id)
+        criteria.append(AlertEvent.tag_id == tag_id)
 
     if device_id is not None:
-        stmt = stmt.where(AlertEvent.device_id == device_id)
+        criteria.append(AlertEvent.device_id == device_id)
 
-    res = await db.execute(stmt)
-    events = list(res.scalars().all())
+    closed_rows = await _close_sessions(db, *criteria, reason=f"stale_ttl_{ttl}s")
+    try:
+        await dispatch_webhooks_many(db, closed_rows)
+    except Exception:
+        logger.exception("Failed to dispatch webhooks on stale close (%s events)", len(closed_rows))
 
-    closed = 0
-    for ev in events:
-        await _close_event_session(db, event=ev, reason=f"stale_ttl_{ttl}s")
-        closed += 1
+    _forget_open_sessions(closed_rows)
+    closed = len(closed_rows)
 
     if closed:
         logger.info("Closed %s stale RTLS sessions (ttl=%ss cutoff=%s)", closed, ttl, cutoff.isoformat())
@@ -194,54 +336,181 @@ async def close_stale_rtls_sessions(
     return closed
 
 
+async def touch_rtls_sessions(
+    db: AsyncSession,
+    touches: Dict[Tuple[int, int], Tuple[datetime, Optional[int]]],
+) -> int:
+    """
+    Atualiza em lote last_seen_at / last_collection_log_id das sessões RTLS
+    abertas, a partir de detecções coalescidas pelo ingestor:
+    (tag_id, device_id) -> (seen_at, collection_log_id).
+
+    Um único UPDATE ... FROM (VALUES ...); nunca volta last_seen_at para trás.
+    O payload é atualizado na próxima detecção processada por completo.
+    """
+    if not touches:
+        return 0
+
+    touched = values(
+        column("tag_id", Integer),
+        column("device_id", Integer),
+        column("seen_at", DateTime(timezone=True)),
+        column("collection_log_id", Integer),
+        name="touched",
+    ).data(
+        [
+            # literal tipado: NULL puro no VALUES vira text no Postgres
+            # (todas as linhas sem collection_log_id quebram o SET)
+            (tag_id, device_id, _ensure_utc(seen_at), literal(collection_log_id, Integer))
+            for (tag_id, device_id), (seen_at, collection_log_id) in touches.items()
+        ]
+    )
+    stmt = (
+        update(AlertEvent)
+        .where(
+            AlertEvent.is_open.is_(True),
+            AlertEvent.event_type.in_(RTLS_SESSION_EVENT_TYPES),
+            AlertEvent.tag_id == touched.c.tag_id,
+            AlertEvent.device_id == touched.c.device_id,
+            AlertEvent.last_seen_at < touched.c.seen_at,
+        )
+        .values(
+            last_seen_at=touched.c.seen_at,
+            last_collection_log_id=touched.c.collection_log_id,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    res = await db.execute(stmt)
+    await db.commit()
+    return res.rowcount or 0
+
+
 # ---------------------------------------------------------------------------
 # Helpers de consulta (SEM lazy loading)
 # ---------------------------------------------------------------------------
 
+class PersonInfo(NamedTuple):
+    """Campos da pessoa usados pelo alert_engine, só leitura."""
+
+    id: int
+    full_name: Optional[str] = None
+
+
 async def _get_person_with_groups(
     db: AsyncSession,
     *,
     tag: Tag,
-) -> Tuple[Optional[Person], List[int]]:
+) -> Tuple[Optional[PersonInfo], List[int]]:
     """
     Carrega a pessoa associada à TAG e os IDs dos grupos dessa pessoa,
-    sem lazy-load.
+    sem lazy-load, numa única consulta (uma linha por grupo; pessoa sem
+    grupo volta com group_id NULL).
+
+    Se a TAG já veio com ``person`` e ``person.groups`` carregados (ex.:
+    crud_tag.get_by_mac_with_person no MQTT ingestor), não consulta o banco.
     """
     person_id = getattr(tag, "person_id", None)
     if not person_id:
         return None, []
 
-    stmt_person = select(Person).where(Person.id == person_id)
-    res_person = await db.execute(stmt_person)
-    person = res_person.scalars().first()
-    if not person:
-        return None, []
+    if "person" in tag.__dict__:
+        loaded = tag.__dict__["person"]
+        if loaded is None:
+            return None, []
+        if "groups" in loaded.__dict__:
+            return (
+                PersonInfo(loaded.id, loaded.full_name),
+                [g.id for g in loaded.groups if g.id is not None],
+            )
 
-    stmt_groups = select(person_group_memberships.c.group_id).where(
-        person_group_memberships.c.person_id == person.id
+    stmt = (
+        select(Person.id, Person.full_name, person_group_memberships.c.group_id)
+        .select_from(Person)
+        .outerjoin(
+            person_group_memberships,
+            person_group_memberships.c.person_id == Person.id,
+        )
+        .where(Person.id == person_id)
     )
-    res_groups = await db.execute(stmt_groups)
-    group_ids = [row[0] for row in res_groups.fetchall() if row[0] is not None]
+    rows = (await db.execute(stmt)).all()
+    if not rows:
+        return None, []
+
+    person = PersonInfo(rows[0].id, rows[0].full_name)
+    group_ids = [row.group_id for row in rows if row.group_id is not None]
 
     return person, group_ids
 
 
+class LocationInfo(NamedTuple):
+    """Localização de um device (planta / andar / prédio), só leitura."""
+
+    floor_plan_id: Optional[int] = None
+    floor_plan_name: Optional[str] = None
+    floor_id: Optional[int] = None
+    floor_name: Optional[str] = None
+    building_id: Optional[int] = None
+    building_name: Optional[str] = None
+
+
+_NO_LOCATION = LocationInfo()
+
+
+# Cache de localização: (floor_plan_id, floor_id, building_id) -> (expira_em, info).
+# Planta/andar/prédio só mudam quando alguém reconfigura pelo admin, então
+# um TTL curto evita repetir o join a cada detecção. Trocar o device de
+# lugar muda a chave; renomear/remover prédio, andar ou planta passa por
+# invalidate_location_cache() nas rotas.
+_LOCATION_CACHE_TTL_SECONDS = 60.0
+_LOCATION_CACHE_MAX_ENTRIES = 4096
+_location_cache: Dict[Tuple[Optional[int], Optional[int], Optional[int]], Tuple[float, LocationInfo]] = {}
+
+
+def invalidate_location_cache() -> None:
+    """
+    Descarta o cache de localização (usar após alterar/remover prédio,
+    andar ou planta). Alterações são raras, então limpa tudo.
+    """
+    _location_cache.clear()
+
+
 async def _get_location_info(
     db: AsyncSession,
     *,
     device: Device,
-) -> dict:
+) -> LocationInfo:
     """
     Retorna informações de localização sem lazy-load.
     Prioridade:
       1) floor_plan_id -> FloorPlan -> Floor -> Building
       2) floor_id -> Floor -> Building
       3) building_id -> Building
+
+    O resultado fica em cache por _LOCATION_CACHE_TTL_SECONDS.
     """
-    floor_plan_id = getattr(device, "floor_plan_id", None)
-    floor_id = getattr(device, "floor_id", None)
-    building_id = getattr(device, "building_id", None)
+    key = (
+        getattr(device, "floor_plan_id", None),
+        getattr(device, "floor_id", None),
+        getattr(device, "building_id", None),
+    )
+    now = time.monotonic()
+    cached = _location_cache.get(key)
+    if cached is not None and cached[0] > now:
+        return cached[1]
 
+    info = await _query_location_info(db, *key)
+    if len(_location_cache) >= _LOCATION_CACHE_MAX_ENTRIES:
+        _location_cache.clear()
+    _location_cache[key] = (now + _LOCATION_CACHE_TTL_SECONDS, info)
+    return info
+
+
+async def _query_location_info(
+    db: AsyncSession,
+    floor_plan_id: Optional[int],
+    floor_id: Optional[int],
+    building_id: Optional[int],
+) -> LocationInfo:
     if floor_plan_id:
         stmt = (
             select(
@@ -261,24 +530,9 @@ async def _get_location_info(
         row = res.first()
 
         if not row:
-            return {
-                "floor_plan_id": floor_plan_id,
-                "floor_plan_name": None,
-                "floor_id": None,
-                "floor_name": None,
-                "building_id": None,
-                "building_name": None,
-            }
-
-        fp_id, fp_name, fl_id, fl_name, bld_id, bld_name = row
-        return {
-            "floor_plan_id": fp_id,
-            "floor_plan_name": fp_name,
-            "floor_id": fl_id,
-            "floor_name": fl_name,
-            "building_id": bld_id,
-            "building_name": bld_name,
-        }
+            return LocationInfo(floor_plan_id=floor_plan_id)
+
+        return LocationInfo(*row)
 
     if floor_id:
         stmt = (
@@ -296,14 +550,12 @@ async def _get_location_info(
         row = res.first()
         if row:
             fl_id, fl_name, bld_id, bld_name = row
-            return {
-                "floor_plan_id": None,
-                "floor_plan_name": None,
-                "floor_id": fl_id,
-                "floor_name": fl_name,
-                "building_id": bld_id,
-                "building_name": bld_name,
-            }
+            return LocationInfo(
+                floor_id=fl_id,
+                floor_name=fl_name,
+                building_id=bld_id,
+                building_name=bld_name,
+            )
 
     if building_id:
         stmt = select(Building.id, Building.name).where(Building.id == building_id)
@@ -311,23 +563,72 @@ async def _get_location_info(
         row = res.first()
         if row:
             bld_id, bld_name = row
-            return {
-                "floor_plan_id": None,
-                "floor_plan_name": None,
-                "floor_id": None,
-                "floor_name": None,
-                "building_id": bld_id,
-                "building_name": bld_name,
-            }
-
-    return {
-        "floor_plan_id": None,
-        "floor_plan_name": None,
-        "floor_id": None,
-        "floor_name": None,
-        "building_id": None,
-        "building_name": None,
-    }
+            return LocationInfo(building_id=bld_id, building_name=bld_name)
+
+    return _NO_LOCATION
+
+
+class RuleInfo(NamedTuple):
+    """Colunas de AlertRule usadas nos disparos, só leitura."""
+
+    id: int
+    rule_type: str
+    name: str
+    group_id: Optional[int]
+    max_dwell_seconds: Optional[int]
+
+
+# Cache de regras: (device_id, group_ids ordenados) -> (expira_em, regras).
+# Regras mudam raramente; o TTL curto limita a defasagem entre workers e
+# invalidate_rules_cache() (chamado pelas rotas de alert_rules) descarta
+# tudo no processo atual na hora.
+_RULES_CACHE_TTL_SECONDS = 5.0
+_RULES_CACHE_MAX_ENTRIES = 4096
+_rules_cache: Dict[Tuple[int, Tuple[int, ...]], Tuple[float, List[RuleInfo]]] = {}
+_rules_cache_epoch = 0
+
+
+# Devices que têm alguma regra RTLS ativa: (expira_em, ids). Detecções em
+# devices fora desse conjunto não fazem nenhuma consulta.
+_DEVICES_WITH_RULES_TTL_SECONDS = 30.0
+_devices_with_rules: Optional[Tuple[float, FrozenSet[int]]] = None
+
+
+def invalidate_rules_cache() -> None:
+    """
+    Descarta as regras em cache (usar após criar/alterar/remover AlertRule).
+    """
+    global _rules_cache_epoch, _devices_with_rules
+    _rules_cache_epoch += 1
+    _rules_cache.clear()
+    _devices_with_rules = None
+
+
+async def _device_has_rules(db: AsyncSession, device_id: int) -> bool:
+    """
+    True se o device tem alguma regra FORBIDDEN_SECTOR/DWELL_TIME ativa.
+    O conjunto de devices é recarregado a cada _DEVICES_WITH_RULES_TTL_SECONDS.
+    """
+    global _devices_with_rules
+    now = time.monotonic()
+    cached = _devices_with_rules
+    if cached is not None and cached[0] > now:
+        return device_id in cached[1]
+
+    epoch = _rules_cache_epoch
+    stmt = (
+        select(AlertRule.device_id)
+        .where(
+            AlertRule.is_active.is_(True),
+            AlertRule.device_id.is_not(None),
+            AlertRule.rule_type.in_([FORBIDDEN_SECTOR, DWELL_TIME]),
+        )
+        .distinct()
+    )
+    device_ids = frozenset((await db.execute(stmt)).scalars().all())
+    if epoch == _rules_cache_epoch:
+        _devices_with_rules = (now + _DEVICES_WITH_RULES_TTL_SECONDS, device_ids)
+    return device_id in device_ids
 
 
 async def _load_applicable_rules(
@@ -335,13 +636,44 @@ async def _load_applicable_rules(
     *,
     device_id: int,
     group_ids: List[int],
-) -> List[AlertRule]:
+) -> List[RuleInfo]:
     """
     Regras ativas para o device, filtradas por:
       - rule_type (FORBIDDEN_SECTOR, DWELL_TIME)
       - group_id IN grupos da pessoa OU group_id IS NULL (regra geral)
+
+    O resultado fica em cache por _RULES_CACHE_TTL_SECONDS; a lista
+    devolvida é compartilhada, não altere.
     """
-    stmt = select(AlertRule).where(
+    key = (device_id, tuple(sorted(group_ids)))
+    now = time.monotonic()
+    cached = _rules_cache.get(key)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+
+    # Se as regras mudarem durante a consulta, o resultado não vai pro cache
+    epoch = _rules_cache_epoch
+    rules = await _query_applicable_rules(db, device_id=device_id, group_ids=group_ids)
+    if epoch == _rules_cache_epoch:
+        if len(_rules_cache) >= _RULES_CACHE_MAX_ENTRIES:
+            _rules_cache.clear()
+        _rules_cache[key] = (now + _RULES_CACHE_TTL_SECONDS, rules)
+    return rules
+
+
+async def _query_applicable_rules(
+    db: AsyncSession,
+    *,
+    device_id: int,
+    group_ids: List[int],
+) -> List[RuleInfo]:
+    stmt = select(
+        AlertRule.id,
+        AlertRule.rule_type,
+        AlertRule.name,
+        AlertRule.group_id,
+        AlertRule.max_dwell_seconds,
+    ).where(
         AlertRule.is_active.is_(True),
         AlertRule.device_id == device_id,
         AlertRule.rule_type.in_([FORBIDDEN_SECTOR, DWELL_TIME]),
@@ -358,7 +690,7 @@ async def _load_applicable_rules(
         stmt = stmt.where(AlertRule.group_id.is_(None))
 
     result = await db.execute(stmt)
-    rules = list(result.scalars().all())
+    rules = [RuleInfo(*row) for row in result]
 
     logger.debug(
         "AlertEngine: found %s rules for device_id=%s group_ids=%s",
@@ -373,83 +705,149 @@ async def _load_applicable_rules(
 # Disparos RTLS (sessões)
 # ---------------------------------------------------------------------------
 
-async def _fire_forbidden_sector(
+async def _close_moved_sessions(
     db: AsyncSession,
     *,
-    rule: AlertRule,
-    device: Device,
+    event_type: str,
     tag: Tag,
-    person: Optional[Person],
-    now: datetime,
-    collection_log_id: int | None = None,
-) -> None:
+    device: Device,
+    rule_ids: List[int],
+) -> List[Row]:
     """
-    FORBIDDEN_SECTOR como sessão:
-
-    - Entrada: cria AlertEvent (is_open=True)
-    - Continua no mesmo gateway: atualiza last_seen_at e last_collection_log_id
-    - Saída (apareceu em outro gateway/regra): fecha eventos abertos dessa TAG
-      com ended_at = last_seen_at (última evidência dentro do setor)
+    Saída (TAG apareceu em outro gateway/regra): fecha as sessões abertas
+    ``event_type`` dessa TAG que não são de (device, uma das regras atuais),
+    com ended_at = last_seen_at (última evidência).
     """
-    now = _ensure_utc(now)
-
-    # 1) Fecha quaisquer sessões FORBIDDEN_SECTOR abertas dessa TAG (em outros devices/regras)
-    stmt_open = select(AlertEvent).where(
-        AlertEvent.event_type == FORBIDDEN_SECTOR,
+    # IS DISTINCT FROM / NOT IN também pegam device/regra NULL
+    return await _close_sessions(
+        db,
+        AlertEvent.event_type == event_type,
         AlertEvent.tag_id == tag.id,
-        AlertEvent.is_open.is_(True),
+        or_(
+            AlertEvent.device_id.is_distinct_from(device.id),
+            AlertEvent.rule_id.is_(None),
+            AlertEvent.rule_id.not_in(rule_ids),
+        ),
+        reason="moved_to_other_device_or_rule",
+        commit=False,
     )
-    res_open = await db.execute(stmt_open)
-    open_events = res_open.scalars().all()
 
-    for ev in open_events:
-        if ev.device_id != device.id or ev.rule_id != rule.id:
-            await _close_event_session(db, event=ev, reason="moved_to_other_device_or_rule")
 
-    # 2) Procura sessão aberta para (regra, tag, device)
-    stmt_existing = (
-        select(AlertEvent)
+class _OpenSession(NamedTuple):
+    """O que os disparos usam de uma sessão aberta existente."""
+
+    id: int
+    started_at: datetime
+
+
+async def _load_open_sessions(
+    db: AsyncSession,
+    *,
+    tag: Tag,
+    device: Device,
+    rule_ids: List[int],
+) -> Dict[Tuple[str, int], _OpenSession]:
+    """
+    Sessões abertas de (tag, device) para todas as regras da detecção, numa
+    consulta só, indexadas por (event_type, rule_id). Traz só as colunas
+    usadas nos updates (id, started_at).
+
+    Roda a cada detecção: lambda_stmt guarda a árvore da consulta pelo
+    código da lambda, então as chamadas seguintes só trocam os parâmetros.
+    """
+    tag_id = tag.id
+    device_id = device.id
+    stmt = lambda_stmt(
+        lambda: select(
+            AlertEvent.id,
+            AlertEvent.event_type,
+            AlertEvent.rule_id,
+            AlertEvent.started_at,
+        )
         .where(
-            AlertEvent.event_type == FORBIDDEN_SECTOR,
-            AlertEvent.rule_id == rule.id,
-            AlertEvent.tag_id == tag.id,
-            AlertEvent.device_id == device.id,
+            AlertEvent.event_type.in_(RTLS_SESSION_EVENT_TYPES),
+            AlertEvent.rule_id.in_(rule_ids),
+            AlertEvent.tag_id == tag_id,
+            AlertEvent.device_id == device_id,
             AlertEvent.is_open.is_(True),
         )
-        .order_by(AlertEvent.started_at.desc())
-        .limit(1)
+        .order_by(AlertEvent.started_at.asc())
     )
-    res_existing = await db.execute(stmt_existing)
-    existing = res_existing.scalar_one_or_none()
+    sessions: Dict[Tuple[str, int], _OpenSession] = {}
+    for row in (await db.execute(stmt)).all():
+        key = (row.event_type, row.rule_id)
+        session = _OpenSession(row.id, row.started_at)
+        if row.event_type == FORBIDDEN_SECTOR:
+            # FORBIDDEN_SECTOR continua a sessão mais recente...
+            sessions[key] = session
+        else:
+            # ...DWELL_TIME a mais antiga (é de onde conta o tempo)
+            sessions.setdefault(key, session)
+    return sessions
+
+
+# Sessões abertas da última detecção de cada TAG:
+# tag_id -> (expira_em, device_id, rule_ids, {(event_type, rule_id): sessão}).
+# Enquanto a TAG segue no mesmo gateway com as mesmas regras, todas com
+# sessão aberta, não há o que fechar em outro device nem o que consultar.
+# O TTL fica abaixo do TTL de sessão (nada expira por stale no meio) e
+# fechamentos feitos neste processo descartam a entrada da TAG.
+_OPEN_SESSIONS_CACHE_TTL_SECONDS = 10.0
+_OPEN_SESSIONS_CACHE_MAX_ENTRIES = 16384
+_open_sessions_cache: Dict[
+    int, Tuple[float, int, FrozenSet[int], Dict[Tuple[str, int], _OpenSession]]
+] = {}
+
+
+def _get_cached_open_sessions(
+    tag_id: int,
+    device_id: int,
+    rule_ids: FrozenSet[int],
+) -> Optional[Dict[Tuple[str, int], _OpenSession]]:
+    cached = _open_sessions_cache.get(tag_id)
+    if cached is None:
+        return None
+    expires_at, cached_device_id, cached_rule_ids, sessions = cached
+    if expires_at <= time.monotonic() or cached_device_id != device_id or cached_rule_ids != rule_ids:
+        return None
+    return sessions
+
+
+def _remember_open_sessions(
+    tag_id: int,
+    device_id: int,
+    rule_ids: FrozenSet[int],
+    sessions: Dict[Tuple[str, int], _OpenSession],
+) -> None:
+    ttl = _OPEN_SESSIONS_CACHE_TTL_SECONDS
+    session_ttl = _get_session_ttl_seconds()
+    if session_ttl > 0:
+        ttl = min(ttl, session_ttl / 2)
+    if len(_open_sessions_cache) >= _OPEN_SESSIONS_CACHE_MAX_ENTRIES:
+        _open_sessions_cache.clear()
+    _open_sessions_cache[tag_id] = (time.monotonic() + ttl, device_id, rule_ids, sessions)
 
-    if existing:
-        # Atualiza "evidência" e last_seen_at
-        payload = _safe_json_load(getattr(existing, "payload", None))
-        payload.update(
-            {
-                "last_seen_at": now.isoformat(),
-                "last_collection_log_id": collection_log_id,
-            }
-        )
-        updated = await crud_alert_event.update(
-            db,
-            existing,
-            {
-                "last_seen_at": now,
-                "last_collection_log_id": collection_log_id,
-                "payload": _safe_json_dump(payload),
-            },
-        )
-        # opcional: webhook a cada atualização (pode ser útil no front)
-        try:
-            await dispatch_webhooks(db, updated)
-        except Exception:
-            logger.exception("Failed to dispatch webhook on forbidden update (event_id=%s)", updated.id)
-        return
 
-    # 3) Não havia sessão -> cria evento (entrada)
-    location = await _get_location_info(db, device=device)
+def _forget_open_sessions(rows) -> None:
+    """Descarta do cache as TAGs das sessões fechadas/perdidas em ``rows``."""
+    for row in rows:
+        _open_sessions_cache.pop(row.tag_id, None)
+
 
+class _DetectionNames(NamedTuple):
+    """Nomes de exibição de uma detecção, derivados uma vez por detecção."""
+
+    person_name: Optional[str]
+    base_name: str  # pessoa, senão código/MAC da TAG
+    device_label: str  # nome do gateway, senão MAC
+    device_name: str  # nome do gateway, senão "Device <id>" (DWELL_TIME)
+
+
+def _detection_names(
+    person: Optional[PersonInfo],
+    tag: Tag,
+    device: Device,
+) -> _DetectionNames:
     person_name = None
     if person is not None:
         person_name = getattr(person, "full_name", None) or getattr(person, "name", None)
@@ -460,14 +858,62 @@ async def _fire_forbidden_sector(
         or getattr(tag, "mac_address", None)
         or f"Tag {tag.id}"
     )
-
-    device_label = (
-        getattr(device, "name", None)
-        or getattr(device, "mac_address", None)
-        or f"Device {device.id}"
+    device_name = getattr(device, "name", None)
+    device_label = device_name or getattr(device, "mac_address", None) or f"Device {device.id}"
+
+    return _DetectionNames(
+        person_name=person_name,
+        base_name=base_name,
+        device_label=device_label,
+        device_name=device_name or f"Device {device.id}",
     )
 
-    message = f"Entrada em setor proibido: {base_name} no gateway '{device_label}'."
+
+async def _fire_forbidden_sector(
+    db: AsyncSession,
+    *,
+    rule: RuleInfo,
+    device: Device,
+    tag: Tag,
+    person: Optional[PersonInfo],
+    names: _DetectionNames,
+    now: datetime,
+    existing: Optional[_OpenSession],
+    collection_log_id: int | None = None,
+):
+    """
+    FORBIDDEN_SECTOR como sessão:
+
+    - Entrada: cria AlertEvent (is_open=True)
+    - Continua no mesmo gateway: atualiza last_seen_at e last_collection_log_id
+    - Saída: ver _close_moved_sessions (feito em process_detection)
+
+    ``existing`` é a sessão aberta de (regra, tag, device), se conhecida;
+    sem ela a entrada é um UPSERT (continua a sessão se já existir).
+    Devolve o evento criado/atualizado para o webhook (ou None).
+    """
+    if existing is not None:
+        # Atualiza "evidência" e last_seen_at
+        # (opcional: webhook a cada atualização, pode ser útil no front)
+        return await _update_session(
+            db,
+            existing.id,
+            commit=False,
+            payload_patch={
+                "last_seen_at": now,
+                "last_collection_log_id": collection_log_id,
+            },
+            last_seen_at=now,
+            last_collection_log_id=collection_log_id,
+        )
+
+    # Não havia sessão -> cria evento (entrada)
+    location = await _get_location_info(db, device=device)
+
+    person_name = names.person_name
+    device_label = names.device_label
+
+    message = f"Entrada em setor proibido: {names.base_name} no gateway '{device_label}'."
 
     payload_dict = {
         "rule_id": rule.id,
@@ -479,14 +925,14 @@ async def _fire_forbidden_sector(
         "person_id": person.id if person else None,
         "person_full_name": person_name,
         "group_id": rule.group_id,
-        "floor_plan_id": location["floor_plan_id"],
-        "floor_plan_name": location["floor_plan_name"],
-        "floor_id": location["floor_id"],
-        "floor_name": location["floor_name"],
-        "building_id": location["building_id"],
-        "building_name": location["building_name"],
-        "started_at": now.isoformat(),
-        "last_seen_at": now.isoformat(),
+        "floor_plan_id": location.floor_plan_id,
+        "floor_plan_name": location.floor_plan_name,
+        "floor_id": location.floor_id,
+        "floor_name": location.floor_name,
+        "building_id": location.building_id,
+        "building_name": location.building_name,
+        "started_at": now,
+        "last_seen_at": now,
         "ended_at": None,
         "is_open": True,
         "message": message,
@@ -500,9 +946,9 @@ async def _fire_forbidden_sector(
         person_id=person.id if person else None,
         tag_id=tag.id,
         device_id=device.id,
-        floor_plan_id=location["floor_plan_id"],
-        floor_id=location["floor_id"],
-        building_id=location["building_id"],
+        floor_plan_id=location.floor_plan_id,
+        floor_id=location.floor_id,
+        building_id=location.building_id,
         group_id=rule.group_id,
         started_at=now,
         last_seen_at=now,
@@ -514,20 +960,28 @@ async def _fire_forbidden_sector(
         last_collection_log_id=collection_log_id,
     )
 
-    new_event = await crud_alert_event.create(db, event_in)
-    await dispatch_webhooks(db, new_event)
+    return await _upsert_session(
+        db,
+        event_in,
+        payload_patch={
+            "last_seen_at": now,
+            "last_collection_log_id": collection_log_id,
+        },
+    )
 
 
 async def _fire_dwell_time(
     db: AsyncSession,
     *,
-    rule: AlertRule,
+    rule: RuleInfo,
     device: Device,
     tag: Tag,
-    person: Optional[Person],
+    person: Optional[PersonInfo],
+    names: _DetectionNames,
     now: datetime,
+    existing: Optional[_OpenSession],
     collection_log_id: int | None = None,
-) -> None:
+):
     """
     DWELL_TIME como sessão:
 
@@ -535,48 +989,17 @@ async def _fire_dwell_time(
     - started_at = primeira evidência no device
     - last_seen_at atualizado por evidência
     - message passa a existir quando dwell_seconds >= max_dwell_seconds (se configurado)
-    - Fecha sessões anteriores (DWELL_TIME) dessa TAG quando ela aparece em outro gateway/regra
-      com ended_at = last_seen_at
-    """
-    now = _ensure_utc(now)
-
-    # Fecha sessões DWELL_TIME abertas dessa TAG em outros devices/regras
-    stmt_open = select(AlertEvent).where(
-        AlertEvent.event_type == DWELL_TIME,
-        AlertEvent.tag_id == tag.id,
-        AlertEvent.is_open.is_(True),
-    )
-    res_open = await db.execute(stmt_open)
-    open_events = res_open.scalars().all()
-
-    for ev in open_events:
-        if ev.device_id != device.id or ev.rule_id != rule.id:
-            await _close_event_session(db, event=ev, reason="moved_to_other_device_or_rule")
-
-    # Sessão atual (regra/tag/device)
-    stmt = (
-        select(AlertEvent)
-        .where(
-            AlertEvent.rule_id == rule.id,
-            AlertEvent.event_type == DWELL_TIME,
-            AlertEvent.tag_id == tag.id,
-            AlertEvent.device_id == device.id,
-            AlertEvent.is_open.is_(True),
-        )
-        .order_by(AlertEvent.started_at.asc())
-        .limit(1)
-    )
-    result = await db.execute(stmt)
-    event = result.scalars().first()
+    - Sessões dessa TAG em outro gateway/regra são fechadas em process_detection
+      (ver _close_moved_sessions), com ended_at = last_seen_at
 
-    if event is None:
+    ``existing`` é a sessão aberta de (regra, tag, device), se houver.
+    Devolve o evento criado/atualizado para o webhook (ou None).
+    """
+    if existing is None:
         location = await _get_location_info(db, device=device)
 
-        person_name = None
-        if person is not None:
-            person_name = getattr(person, "full_name", None) or getattr(person, "name", None)
-
-        device_name = getattr(device, "name", None) or f"Device {device.id}"
+        person_name = names.person_name
+        device_name = names.device_name
 
         payload_dict = {
             "rule_id": rule.id,
@@ -588,14 +1011,14 @@ async def _fire_dwell_time(
             "person_id": person.id if person else None,
             "person_full_name": person_name,
             "max_dwell_seconds": rule.max_dwell_seconds,
-            "floor_plan_id": location["floor_plan_id"],
-            "floor_plan_name": location["floor_plan_name"],
-            "floor_id": location["floor_id"],
-            "floor_name": location["floor_name"],
-            "building_id": location["building_id"],
-            "building_name": location["building_name"],
-            "started_at": now.isoformat(),
-            "last_seen_at": now.isoformat(),
+            "floor_plan_id": location.floor_plan_id,
+            "floor_plan_name": location.floor_plan_name,
+            "floor_id": location.floor_id,
+            "floor_name": location.floor_name,
+            "building_id": location.building_id,
+            "building_name": location.building_name,
+            "started_at": now,
+            "last_seen_at": now,
             "is_open": True,
             "first_collection_log_id": collection_log_id,
             "last_collection_log_id": collection_log_id,
@@ -607,9 +1030,9 @@ async def _fire_dwell_time(
             person_id=person.id if person else None,
             tag_id=tag.id,
             device_id=device.id,
-            floor_plan_id=location["floor_plan_id"],
-            floor_id=location["floor_id"],
-            building_id=location["building_id"],
+            floor_plan_id=location.floor_plan_id,
+            floor_id=location.floor_id,
+            building_id=location.building_id,
             group_id=rule.group_id,
             started_at=now,
             last_seen_at=now,
@@ -621,74 +1044,76 @@ async def _fire_dwell_time(
             last_collection_log_id=collection_log_id,
         )
 
-        created = await crud_alert_event.create(db, event_in)
-        # webhook opcional no create
-        try:
-            await dispatch_webhooks(db, created)
-        except Exception:
-            logger.exception("Failed to dispatch webhook on dwell create (event_id=%s)", created.id)
-        return
+        # webhook opcional no create (UPSERT: se outra detecção abriu a
+        # sessão no meio tempo, só continua)
+        return await _upsert_session(
+            db,
+            event_in,
+            payload_patch={
+                "last_seen_at": now,
+                "last_collection_log_id": collection_log_id,
+            },
+        )
 
-    started_at = _ensure_utc(getattr(event, "started_at", None))
+    started_at = _ensure_utc(existing.started_at)
     dwell_seconds = (now - started_at).total_seconds()
 
-    location = await _get_location_info(db, device=device)
-
-    person_name = None
-    if person is not None:
-        person_name = getattr(person, "full_name", None) or getattr(person, "name", None)
+    if rule.max_dwell_seconds is None or dwell_seconds < rule.max_dwell_seconds:
+        # Abaixo do limite (caso comum): só o "ainda aqui". Os campos fixos
+        # (regra, pessoa, device, localização) já foram gravados na criação.
+        updated_event = await _update_session(
+            db,
+            existing.id,
+            commit=False,
+            payload_patch={
+                "dwell_seconds": dwell_seconds,
+                "last_seen_at": now,
+                "last_collection_log_id": collection_log_id,
+            },
+            last_seen_at=now,
+            last_collection_log_id=collection_log_id,
+        )
+    else:
+        location = await _get_location_info(db, device=device)
 
-    base_name = (
-        person_name
-        or getattr(tag, "code", None)
-        or getattr(tag, "mac_address", None)
-        or f"Tag {tag.id}"
-    )
-    device_name = getattr(device, "name", None) or f"Device {device.id}"
+        person_name = names.person_name
+        device_name = names.device_name
 
-    message: Optional[str] = None
-    if rule.max_dwell_seconds is not None and dwell_seconds >= rule.max_dwell_seconds:
         message = (
-            f"{base_name} está há {int(dwell_seconds)}s no dispositivo "
+            f"{names.base_name} está há {int(dwell_seconds)}s no dispositivo "
             f"{device_name} (limite {rule.max_dwell_seconds}s)."
         )
 
-    payload_dict = _safe_json_load(getattr(event, "payload", None))
-    payload_dict.update(
-        {
-            "rule_id": rule.id,
-            "rule_name": rule.name,
-            "event_type": DWELL_TIME,
-            "device_id": device.id,
-            "device_name": device_name,
-            "tag_id": tag.id,
-            "person_id": person.id if person else None,
-            "person_full_name": person_name,
-            "max_dwell_seconds": rule.max_dwell_seconds,
-            "dwell_seconds": dwell_seconds,
-            "floor_plan_id": location["floor_plan_id"],
-            "floor_plan_name": location["floor_plan_name"],
-            "floor_id": location["floor_id"],
-            "floor_name": location["floor_name"],
-            "building_id": location["building_id"],
-            "building_name": location["building_name"],
-            "started_at": started_at.isoformat(),
-            "last_seen_at": now.isoformat(),
-            "message": message,
-            "last_collection_log_id": collection_log_id,
-        }
-    )
-
-    updated_event = await crud_alert_event.update(
-        db,
-        event,
-        {
-            "last_seen_at": now,
-            "message": message,
-            "payload": _safe_json_dump(payload_dict),
-            "last_collection_log_id": collection_log_id,
-        },
-    )
+        updated_event = await _update_session(
+            db,
+            existing.id,
+            commit=False,
+            payload_patch={
+                "rule_id": rule.id,
+                "rule_name": rule.name,
+                "event_type": DWELL_TIME,
+                "device_id": device.id,
+                "device_name": device_name,
+                "tag_id": tag.id,
+                "person_id": person.id if person else None,
+                "person_full_name": person_name,
+                "max_dwell_seconds": rule.max_dwell_seconds,
+                "dwell_seconds": dwell_seconds,
+                "floor_plan_id": location.floor_plan_id,
+                "floor_plan_name": location.floor_plan_name,
+                "floor_id": location.floor_id,
+                "floor_name": location.floor_name,
+                "building_id": location.building_id,
+                "building_name": location.building_name,
+                "started_at": started_at,
+                "last_seen_at": now,
+                "message": message,
+                "last_collection_log_id": collection_log_id,
+            },
+            last_seen_at=now,
+            message=message,
+            last_collection_log_id=collection_log_id,
+        )
 
     logger.info(
         "AlertEngine: DWELL_TIME update (rule_id=%s person_id=%s device_id=%s dwell=%.1fs)",
@@ -701,16 +1126,31 @@ async def _fire_dwell_time(
     # Você pode trocar a estratégia aqui se quiser:
     # - webhook só quando ultrapassar (se message não era None antes)
     # - ou sempre (como está)
-    try:
-        await dispatch_webhooks(db, updated_event)
-    except Exception:
-        logger.exception("Failed to dispatch webhook on dwell update (event_id=%s)", updated_event.id)
+    return updated_event
 
 
 # ---------------------------------------------------------------------------
 # Função principal - chamada pelo MQTT ingestor / collection_logs
 # ---------------------------------------------------------------------------
 
+async def _close_stale_sessions_for_tag(
+    db: AsyncSession,
+    *,
+    now: datetime,
+    tag_id: int,
+) -> None:
+    """
+    close_stale_rtls_sessions para uma TAG numa AsyncSession separada (mesmo
+    engine de ``db``), para poder rodar junto com consultas em ``db`` — a
+    mesma sessão não aceita operações concorrentes. Erros só são logados.
+    """
+    try:
+        async with AsyncSession(db.bind, expire_on_commit=False) as bg_db:
+            await close_stale_rtls_sessions(bg_db, now=now, tag_id=tag_id)
+    except Exception:
+        logger.exception("Failed to close stale RTLS sessions for tag_id=%s", tag_id)
+
+
 async def process_detection(
     db: AsyncSession,
     device: Device,
@@ -727,51 +1167,121 @@ async def process_detection(
       - seen_at: timestamp do log (recomendado usar created_at do CollectionLog)
 
     Passos:
+      0) Device sem nenhuma regra ativa: retorna sem mais consultas
       1) Fecha sessões stale dessa TAG (Etapa 2, reentrada limpa)
       2) Carrega pessoa + grupos (sem lazy-load)
       3) Carrega regras aplicáveis
-      4) Dispara FORBIDDEN_SECTOR / DWELL_TIME
+      4) Fecha sessões da TAG em outros gateways/regras (um UPDATE por tipo)
+      5) Carrega as sessões abertas de todas as regras (uma consulta)
+         (4 e 5 são pulados se a TAG continua no mesmo gateway e as sessões
+         da detecção anterior estão em cache)
+      6) Dispara FORBIDDEN_SECTOR / DWELL_TIME, commita uma vez e envia os
+         webhooks de uma vez
     """
+    # A maioria dos gateways não tem regra: nada a avaliar. As sessões stale
+    # dessa TAG ficam para o loop periódico do ingestor / próxima detecção.
+    if not await _device_has_rules(db, device.id):
+        return
+
     now = _ensure_utc(seen_at)
 
     # ETAPA 2 (opportunistic): fecha sessões stale para esta TAG
     # Isso garante que, se a TAG "sumiu" e voltou, não reutilizamos sessão antiga.
+    # Roda numa sessão própria, em paralelo com as leituras de pessoa/regras,
+    # e termina antes de qualquer disparo.
+    stale_close = asyncio.create_task(_close_stale_sessions_for_tag(db, now=now, tag_id=tag.id))
     try:
-        await close_stale_rtls_sessions(db, now=now, tag_id=tag.id)
-    except Exception:
-        logger.exception("Failed to close stale RTLS sessions for tag_id=%s", tag.id)
+        person, group_ids = await _get_person_with_groups(db, tag=tag)
 
-    person, group_ids = await _get_person_with_groups(db, tag=tag)
+        rules = await _load_applicable_rules(
+            db,
+            device_id=device.id,
+            group_ids=group_ids,
+        )
+    finally:
+        await stale_close
 
-    rules = await _load_applicable_rules(
-        db,
-        device_id=device.id,
-        group_ids=group_ids,
-    )
     if not rules:
         return
 
-    for rule in rules:
-        if rule.rule_type == FORBIDDEN_SECTOR:
-            await _fire_forbidden_sector(
-                db=db,
-                rule=rule,
-                device=device,
-                tag=tag,
-                person=person,
-                now=now,
-                collection_log_id=collection_log_id,
-            )
-        elif rule.rule_type == DWELL_TIME:
-            await _fire_dwell_time(
+    rule_ids = frozenset(rule.id for rule in rules)
+
+    # Todos os writes da detecção numa transação só (um COMMIT no fim)
+    fired: List[Any] = []
+    sessions: Dict[Tuple[str, int], _OpenSession] = {}
+    try:
+        open_sessions = _get_cached_open_sessions(tag.id, device.id, rule_ids)
+        if open_sessions is None:
+            rule_ids_by_type: Dict[str, List[int]] = {}
+            for rule in rules:
+                rule_ids_by_type.setdefault(rule.rule_type, []).append(rule.id)
+
+            for event_type, type_rule_ids in rule_ids_by_type.items():
+                fired.extend(
+                    await _close_moved_sessions(
+                        db,
+                        event_type=event_type,
+                        tag=tag,
+                        device=device,
+                        rule_ids=type_rule_ids,
+                    )
+                )
+
+            # FORBIDDEN_SECTOR sem sessão conhecida vai direto pro UPSERT;
+            # só DWELL_TIME precisa do started_at da sessão existente
+            if DWELL_TIME in rule_ids_by_type:
+                open_sessions = await _load_open_sessions(
+                    db,
+                    tag=tag,
+                    device=device,
+                    rule_ids=list(rule_ids),
+                )
+            else:
+                open_sessions = {}
+
+        names = _detection_names(person, tag, device)
+        for rule in rules:
+            if rule.rule_type == FORBIDDEN_SECTOR:
+                fire = _fire_forbidden_sector
+            elif rule.rule_type == DWELL_TIME:
+                fire = _fire_dwell_time
+            else:
+                continue
+
+            event = await fire(
                 db=db,
                 rule=rule,
                 device=device,
                 tag=tag,
                 person=person,
+                names=names,
                 now=now,
+                existing=open_sessions.get((rule.rule_type, rule.id)),
                 collection_log_id=collection_log_id,
             )
+            if event is not None:
+                fired.append(event)
+                sessions[(rule.rule_type, rule.id)] = _OpenSession(event.id, event.started_at)
+
+        if fired:
+            await db.commit()
+    except Exception:
+        # não deixa a sessão do ingestor presa numa transação abortada
+        _open_sessions_cache.pop(tag.id, None)
+        await db.rollback()
+        raise
+
+    if len(sessions) == len(rules):
+        _remember_open_sessions(tag.id, device.id, rule_ids, sessions)
+    else:
+        # alguma sessão sumiu no meio (fechada fora daqui): próxima detecção
+        # refaz o caminho completo
+        _open_sessions_cache.pop(tag.id, None)
+
+    try:
+        await dispatch_webhooks_many(db, fired)
+    except Exception:
+        logger.exception("Failed to dispatch webhooks for detection (tag_id=%s device_id=%s)", tag.id, device.id)
 
 
 # ---------------------------------------------------------------------------
@@ -779,6 +1289,14 @@ async def process_detection(
 # (mantém coerência com relatórios: started_at / ended_at / duration)
 # ---------------------------------------------------------------------------
 
+# Gateways sabidamente ONLINE sem sessão OFFLINE aberta: device_id -> expira_em.
+# A listagem de status e o monitor do ingestor chamam a transição a cada
+# passada; no caso comum (continua online) não há o que fechar. O TTL cobre
+# OFFLINE aberto por outro processo (ele é fechado na próxima checagem).
+_GATEWAY_ONLINE_TTL_SECONDS = 60.0
+_gateway_online_until: Dict[int, float] = {}
+
+
 async def handle_gateway_status_transition(
     db: AsyncSession,
     *,
@@ -790,25 +1308,19 @@ async def handle_gateway_status_transition(
 
     - Se offline e não existe evento OFFLINE aberto: cria (is_open=True)
     - Se offline e já existe: atualiza last_seen_at + offline_seconds no payload
+      (os dois casos num único INSERT ... ON CONFLICT DO UPDATE)
     - Se online e existe OFFLINE aberto: fecha (ended_at = last_seen_at da sessão OFFLINE)
       e cria um evento ONLINE pontual (is_open=False, ended_at=now)
+    - Se online e já estava online (ver _gateway_online_until): nada a fazer
     """
-    now = datetime.now(timezone.utc)
-
-    stmt = (
-        select(AlertEvent)
-        .where(
-            AlertEvent.event_type == GATEWAY_OFFLINE,
-            AlertEvent.device_id == device.id,
-            AlertEvent.is_open.is_(True),
-        )
-        .order_by(AlertEvent.started_at.desc())
-        .limit(1)
-    )
-    res = await db.execute(stmt)
-    offline_event = res.scalar_one_or_none()
+    if is_online_now:
+        online_until = _gateway_online_until.get(device.id)
+        if online_until is not None and online_until > time.monotonic():
+            return
+    else:
+        _gateway_online_until.pop(device.id, None)
 
-    location = await _get_location_info(db, device=device)
+    now = datetime.now(timezone.utc)
 
     device_label = (
         getattr(device, "name", None)
@@ -821,66 +1333,76 @@ async def handle_gateway_status_transition(
     offline_seconds_now = (now - last_seen).total_seconds() if last_seen else 0
 
     if not is_online_now:
-        if offline_event is None:
-            message = f"Gateway '{device_label}' ficou OFFLINE."
+        location = await _get_location_info(db, device=device)
+        message = f"Gateway '{device_label}' ficou OFFLINE."
 
-            payload_dict = {
-                "event_type": GATEWAY_OFFLINE,
-                "device_id": device.id,
-                "device_name": device_label,
-                "floor_plan_id": location["floor_plan_id"],
-                "floor_plan_name": location["floor_plan_name"],
-                "floor_id": location["floor_id"],
-                "floor_name": location["floor_name"],
-                "building_id": location["building_id"],
-                "building_name": location["building_name"],
-                "offline_started_at": now.isoformat(),
-                "offline_seconds": offline_seconds_now,
-                "is_open": True,
-            }
-
-            event_in = AlertEventCreate(
-                rule_id=None,
-                event_type=GATEWAY_OFFLINE,
-                person_id=None,
-                tag_id=None,
-                device_id=device.id,
-                floor_plan_id=location["floor_plan_id"],
-                floor_id=location["floor_id"],
-                building_id=location["building_id"],
-                group_id=None,
-                started_at=now,
-                last_seen_at=now,
-                ended_at=None,
-                is_open=True,
-                message=message,
-                payload=_safe_json_dump(payload_dict),
-            )
-            event = await crud_alert_event.create(db, event_in)
-            await dispatch_webhooks(db, event)
-        else:
-            payload_dict = _safe_json_load(getattr(offline_event, "payload", None))
-            payload_dict["offline_seconds"] = offline_seconds_now
-            payload_dict["last_seen_at"] = now.isoformat()
-
-            updated_event = await crud_alert_event.update(
-                db,
-                offline_event,
-                {
-                    "last_seen_at": now,
-                    "payload": _safe_json_dump(payload_dict),
-                },
-            )
-            await dispatch_webhooks(db, updated_event)
+        payload_dict = {
+            "event_type": GATEWAY_OFFLINE,
+            "device_id": device.id,
+            "device_name": device_label,
+            "floor_plan_id": location.floor_plan_id,
+            "floor_plan_name": location.floor_plan_name,
+            "floor_id": location.floor_id,
+            "floor_name": location.floor_name,
+            "building_id": location.building_id,
+            "building_name": location.building_name,
+            "offline_started_at": now,
+            "offline_seconds": offline_seconds_now,
+            "is_open": True,
+        }
+        heartbeat_patch = {
+            "offline_seconds": offline_seconds_now,
+            "last_seen_at": now,
+        }
+
+        # Uma sessão OFFLINE aberta por device (índice único parcial
+        # ix_alert_events_open_gateway_offline): cria ou só atualiza.
+        stmt = pg_insert(AlertEvent).values(
+            rule_id=None,
+            event_type=GATEWAY_OFFLINE,
+            person_id=None,
+            tag_id=None,
+            device_id=device.id,
+            floor_plan_id=location.floor_plan_id,
+            floor_id=location.floor_id,
+            building_id=location.building_id,
+            group_id=None,
+            started_at=now,
+            last_seen_at=now,
+            ended_at=None,
+            is_open=True,
+            message=message,
+            payload=_safe_json_dump(payload_dict),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[AlertEvent.device_id, AlertEvent.event_type],
+            index_where=_OPEN_GATEWAY_OFFLINE_WHERE,
+            set_={
+                "last_seen_at": stmt.excluded.last_seen_at,
+                "payload": _merge_payload_sql(
+                    cast(literal(_safe_json_dump(heartbeat_patch), Text), JSONB)
+                ),
+            },
+        ).returning(*_WEBHOOK_COLUMNS)
 
+        event = (await db.execute(stmt)).one()
+        await db.commit()
+        await dispatch_webhooks(db, event)
         return
 
-    # ONLINE
-    if offline_event is None:
+    # ONLINE: fecha o OFFLINE aberto (se houver) como sessão
+    closed_offline = await _close_sessions(
+        db,
+        AlertEvent.event_type == GATEWAY_OFFLINE,
+        AlertEvent.device_id == device.id,
+        reason="gateway_back_online",
+        commit=False,
+    )
+    if not closed_offline:
+        _gateway_online_until[device.id] = time.monotonic() + _GATEWAY_ONLINE_TTL_SECONDS
         return
 
-    # fecha offline como sessão
-    await _close_event_session(db, event=offline_event, reason="gateway_back_online")
+    location = await _get_location_info(db, device=device)
 
     # cria evento ONLINE pontual
     message = f"Gateway '{device_label}' voltou a ficar ONLINE."
@@ -888,15 +1410,15 @@ async def handle_gateway_status_transition(
         "event_type": GATEWAY_ONLINE,
         "device_id": device.id,
         "device_name": device_label,
-        "floor_plan_id": location["floor_plan_id"],
-        "floor_plan_name": location["floor_plan_name"],
-        "floor_id": location["floor_id"],
-        "floor_name": location["floor_name"],
-        "building_id": location["building_id"],
-        "building_name": location["building_name"],
+        "floor_plan_id": location.floor_plan_id,
+        "floor_plan_name": location.floor_plan_name,
+        "floor_id": location.floor_id,
+        "floor_name": location.floor_name,
+        "building_id": location.building_id,
+        "building_name": location.building_name,
         "offline_seconds": offline_seconds_now,
         "is_open": False,
-        "ended_at": now.isoformat(),
+        "ended_at": now,
     }
 
     online_event_in = AlertEventCreate(
@@ -905,9 +1427,9 @@ async def handle_gateway_status_transition(
         person_id=None,
         tag_id=None,
         device_id=device.id,
-        floor_plan_id=location["floor_plan_id"],
-        floor_id=location["floor_id"],
-        building_id=location["building_id"],
+        floor_plan_id=location.floor_plan_id,
+        floor_id=location.floor_id,
+        building_id=location.building_id,
         group_id=None,
         started_at=now,
         last_seen_at=now,
@@ -916,8 +1438,10 @@ async def handle_gateway_status_transition(
         message=message,
         payload=_safe_json_dump(online_payload),
     )
-    online_event = await crud_alert_event.create(db, online_event_in)
-    await dispatch_webhooks(db, online_event)
+    online_event = await _insert_event(db, online_event_in)
+    await db.commit()
+    _gateway_online_until[device.id] = time.monotonic() + _GATEWAY_ONLINE_TTL_SECONDS
+    await dispatch_webhooks_many(db, [*closed_offline, online_event])
 
 
 # wrappers usados pelo mqtt_ingestor (mantém compatibilidade)
@@ -1,16 +1,36 @@
 # app/services/cambus_event_collector.py
 import asyncio
-import json
 import logging
+import sys
+import time
 from contextlib import asynccontextmanager
 from datetime import datetime, timezone
+from functools import lru_cache
 from importlib import import_module
-from typing import Optional
-from datetime import datetime, timezone
-from asyncio_mqtt import Client, MqttError
-from sqlalchemy import select
-from app.crud.device_event import device_event as crud_device_event
+from itertools import islice
+from types import MappingProxyType
+from typing import Dict, List, Mapping, NamedTuple, Optional, Set, Tuple
+import asyncpg
+import orjson
+from aiomqtt import Client, MqttError
+from sqlalchemy import (
+    DateTime,
+    Integer,
+    bindparam,
+    case,
+    column,
+    func,
+    insert,
+    literal_column,
+    or_,
+    select,
+    text,
+    update,
+    values,
+)
+from sqlalchemy.exc import IntegrityError
 from app.core.config import settings
+from app.db.types import RawJSON
 from app.models.device import Device
 from app.models.device_topic import DeviceTopic
 from app.models.device_event import DeviceEvent
@@ -31,23 +51,13 @@ if hasattr(_session_mod, "async_session"):
     logger.info("[cambus] usando app.db.session.async_session para abrir sessões")
 
 elif hasattr(_session_mod, "AsyncSessionLocal"):
-    _maker = getattr(_session_mod, "AsyncSessionLocal")
-
-    @asynccontextmanager
-    async def _SessionFactory():
-        async with _maker() as session:
-            yield session
-
+    # A factory já devolve AsyncSession, que é context manager async: usada
+    # direto, sem wrapper (um frame a menos por sessão)
+    _SessionFactory = _session_mod.AsyncSessionLocal
     logger.info("[cambus] usando AsyncSessionLocal() de app.db.session")
 
 elif hasattr(_session_mod, "SessionLocal"):
-    _maker = getattr(_session_mod, "SessionLocal")
-
-    @asynccontextmanager
-    async def _SessionFactory():
-        async with _maker() as session:
-            yield session
-
+    _SessionFactory = _session_mod.SessionLocal
     logger.info("[cambus] usando SessionLocal() de app.db.session")
 
 else:
@@ -67,19 +77,35 @@ else:
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
-def _slug(value: str | None, default: str) -> str:
+def _code_slug_sql(code):
     """
-    Mesmo comportamento do _slug do cambus_publisher:
+    Mesmo comportamento do _slug do cambus_publisher, em SQL:
     - lower
     - espaços -> "_"
     - "/" -> "-"
+
+    Igual à expressão do índice ix_devices_code_slug (app/models/device.py),
+    para o Postgres usar o índice. As constantes vão literais no SQL: como
+    parâmetros, o plano genérico do prepared statement não casa com o índice.
+    """
+    return func.lower(
+        func.replace(
+            func.replace(func.btrim(code), literal_column("' '"), literal_column("'_'")),
+            literal_column("'/'"),
+            literal_column("'-'"),
+        )
+    )
+
+
+def _device_id_from_default_slug(device_code: str) -> Optional[int]:
     """
-    v = (value or "").strip()
-    if not v:
-        v = default
-    v = v.lower()
-    v = v.replace(" ", "_").replace("/", "-")
-    return v
+    Câmera sem code publica com o slug padrão "device<id>" (ver
+    cambus_publisher); devolve o id, ou None se não for esse formato.
+    """
+    if device_code.startswith("device") and device_code[6:].isdigit():
+        return int(device_code[6:])
+    return None
+
 
 def _parse_timestamp(payload: dict) -> datetime:
     candidates = [
@@ -90,10 +116,12 @@ def _parse_timestamp(payload: dict) -> datetime:
     for ts in candidates:
         if not ts:
             continue
+        if isinstance(ts, datetime):
+            return ts.astimezone(timezone.utc)
         try:
-            dt = datetime.fromisoformat(str(ts).replace("Z", "+00:00"))
-            return dt.astimezone(timezone.utc)
-        except Exception:
+            # Python 3.11+: fromisoformat já aceita o sufixo "Z"
+            return datetime.fromisoformat(ts).astimezone(timezone.utc)
+        except (TypeError, ValueError):
             continue
 
     return datetime.now(timezone.utc)
@@ -112,7 +140,7 @@ def _extract_analytic_type(payload: dict, kind: str, analytic_segment: Optional[
     )
 
 
-def _parse_cambus_topic(topic: str) -> Optional[dict]:
+def _parse_cambus_topic(topic: str) -> Optional[Mapping[str, Optional[str]]]:
     """
     Entende padrões do cam-bus em GO.
 
@@ -134,73 +162,462 @@ def _parse_cambus_topic(topic: str) -> Optional[dict]:
         "analytic": Optional[str],
       }
     ou None se não reconhecer o padrão.
+
+    As câmeras publicam sempre nos mesmos tópicos: o resultado fica em cache
+    por (tópico, base) e é somente leitura (MappingProxyType).
     """
-    base = settings.CAMBUS_MQTT_BASE_TOPIC.rstrip("/")
-    base_parts = base.split("/")
-    parts = topic.split("/")
+    return _parse_cambus_topic_cached(topic, settings.CAMBUS_MQTT_BASE_TOPIC)
+
+
+@lru_cache(maxsize=4096)
+def _parse_cambus_topic_cached(
+    topic: str,
+    base_topic: str,
+) -> Optional[Mapping[str, Optional[str]]]:
+    info = _parse_cambus_topic_uncached(topic, base_topic)
+    return MappingProxyType(info) if info is not None else None
+
+
+_CAMERA_DEVICE_TYPES = frozenset(("camera",))
+
+_TOPIC_FIELDS = ("tenant", "building", "floor", "device_type", "device_code", "analytic")
 
-    if parts[: len(base_parts)] != base_parts:
+# Formatos de tópico depois do base ("+" = um segmento qualquer, capturado
+# na ordem dos campos). Viram uma trie por base em _topic_trie().
+_TOPIC_PATTERNS = (
+    # base/tenant/building/collector/status
+    ("+/+/collector/status", "collector_status", _TOPIC_FIELDS[:2], {"device_type": "collector"}),
+    # base/tenant/building/floor/camera/code/info
+    ("+/+/+/+/+/info", "cambus_info", _TOPIC_FIELDS[:5], {}),
+    # base/tenant/building/floor/camera/code/status
+    ("+/+/+/+/+/status", "cambus_status", _TOPIC_FIELDS[:5], {}),
+    # base/tenant/building/floor/camera/code/analytic/events
+    ("+/+/+/+/+/+/events", "cambus_event", _TOPIC_FIELDS, {}),
+)
+
+
+class _TopicNode:
+    __slots__ = ("children", "wildcard", "leaf")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, "_TopicNode"] = {}
+        self.wildcard: Optional["_TopicNode"] = None
+        self.leaf: Optional[Tuple[str, Tuple[str, ...], Dict[str, str]]] = None
+
+
+@lru_cache(maxsize=8)
+def _topic_trie(base_topic: str) -> _TopicNode:
+    root = _TopicNode()
+    base_parts = base_topic.rstrip("/").split("/")
+
+    for pattern, kind, fields, fixed in _TOPIC_PATTERNS:
+        node = root
+        for segment in base_parts + pattern.split("/"):
+            if segment == "+":
+                if node.wildcard is None:
+                    node.wildcard = _TopicNode()
+                node = node.wildcard
+            else:
+                node = node.children.setdefault(segment, _TopicNode())
+        node.leaf = (kind, fields, fixed)
+
+    return root
+
+
+def _match_topic(node: _TopicNode, parts: List[str], i: int, captured: List[str]):
+    if i == len(parts):
+        return node.leaf
+
+    # Segmento literal primeiro; se não levar a um formato, tenta o "+"
+    segment = parts[i]
+    child = node.children.get(segment)
+    if child is not None:
+        leaf = _match_topic(child, parts, i + 1, captured)
+        if leaf is not None:
+            return leaf
+
+    if node.wildcard is not None:
+        captured.append(segment)
+        leaf = _match_topic(node.wildcard, parts, i + 1, captured)
+        if leaf is not None:
+            return leaf
+        captured.pop()
+
+    return None
+
+
+def _parse_cambus_topic_uncached(topic: str, base_topic: str) -> Optional[dict]:
+    captured: List[str] = []
+    leaf = _match_topic(_topic_trie(base_topic), topic.split("/"), 0, captured)
+    if leaf is None:
         return None
 
-    offset = len(base_parts)
-    if len(parts) <= offset:
+    kind, fields, fixed = leaf
+    info = dict.fromkeys(_TOPIC_FIELDS)
+    info.update(zip(fields, captured))
+    info.update(fixed)
+    info["kind"] = kind
+    return info
+
+
+# ---------------------------------------------------------------------------
+# Gravação em lote (device_events / device_topics / last_seen_at)
+# ---------------------------------------------------------------------------
+
+# _handle_message só enfileira; o flusher grava até _EVENT_BATCH_MAX eventos
+# por vez (ou o que chegou em _EVENT_BATCH_INTERVAL_SECONDS) numa transação.
+_EVENT_BATCH_MAX = 500
+_EVENT_BATCH_INTERVAL_SECONDS = 0.05
+_EVENT_QUEUE_MAXSIZE = 10000
+
+_event_queue: Optional[asyncio.Queue] = None
+_dropped_events = 0
+_DROP_LOG_EVERY = 1000
+
+# Regras de incidente rodam fora do flusher (Chatwoot, download de imagem):
+# o flusher só grava e entrega os eventos já commitados nesta fila.
+_INCIDENT_WORKERS = 4
+_INCIDENT_QUEUE_MAXSIZE = 10000
+
+_incident_queue: Optional[asyncio.Queue] = None
+_dropped_incident_events = 0
+
+# device_code do tópico -> (expira_em, device_id)
+_CAMERA_CACHE_TTL_SECONDS = 30.0
+_CAMERA_CACHE_MAX_ENTRIES = 4096
+_camera_ids: Dict[str, Tuple[float, int]] = {}
+
+# (device_id, kind, topic) já gravados em device_topics -> expira_em.
+# O upsert é refeito de tempos em tempos para reativar tópicos marcados
+# como inativos (disable_cambus_topics_for_device).
+_KNOWN_TOPIC_TTL_SECONDS = 300.0
+_KNOWN_TOPIC_MAX_ENTRIES = 100_000
+_known_topics: Dict[Tuple[int, str, str], float] = {}
+
+
+def _remember_topics(keys, expires_at: float) -> None:
+    """
+    Marca os tópicos como gravados. O dict fica em ordem de gravação (cada
+    chave é reinserida no fim), então o limite descarta os mais antigos.
+    """
+    for key in keys:
+        _known_topics.pop(key, None)
+        _known_topics[key] = expires_at
+
+    overflow = len(_known_topics) - _KNOWN_TOPIC_MAX_ENTRIES
+    if overflow > 0:
+        for key in list(islice(_known_topics, overflow)):
+            del _known_topics[key]
+
+
+class _PendingEvent(NamedTuple):
+    device_id: int
+    kind: str
+    topic: str
+    topic_description: str
+    analytic_type: str
+    payload: RawJSON  # texto do MQTT, gravado sem reserializar
+    data: dict  # mesmo payload já decodificado (regras de incidente)
+    occurred_at: datetime  # UTC naive
+
+
+# Consultas do lookup de câmera montadas uma vez; só os parâmetros mudam
+# (o SQL compilado sai direto do cache do engine).
+# Device pela code ou pelo "slug" do code (mesma lógica do publisher), numa
+# consulta indexada; code exato tem prioridade
+_STMT_CAMERA_BY_CODE = (
+    select(Device.id)
+    .where(
+        Device.type == "CAMERA",
+        or_(
+            Device.code == bindparam("code"),
+            _code_slug_sql(Device.code) == bindparam("code"),
+        ),
+    )
+    .order_by(case((Device.code == bindparam("code"), 0), else_=1))
+    .limit(1)
+)
+
+# Câmera sem code, publicada como "device<id>"
+_STMT_CAMERA_WITHOUT_CODE = select(Device.id).where(
+    Device.id == bindparam("device_id"),
+    Device.type == "CAMERA",
+    or_(Device.code.is_(None), func.btrim(Device.code) == ""),
+)
+
+
+async def _lookup_camera_id(db, device_code: str) -> Optional[int]:
+    device_id = (await db.execute(_STMT_CAMERA_BY_CODE, {"code": device_code})).scalar()
+    if device_id is not None:
+        return device_id
+
+    default_id = _device_id_from_default_slug(device_code)
+    if default_id is None:
         return None
 
-    # Depois do base: tenant, building, ...
-    # Índices relativos: offset + 0 = tenant, offset + 1 = building, ...
-    tenant = parts[offset] if len(parts) > offset else None
-    building = parts[offset + 1] if len(parts) > offset + 1 else None
-
-    # Padrão collector/status: base/tenant/building/collector/status
-    if len(parts) == offset + 4 and parts[offset + 2] == "collector" and parts[-1] == "status":
-        return {
-            "kind": "collector_status",
-            "tenant": tenant,
-            "building": building,
-            "floor": None,
-            "device_type": "collector",
-            "device_code": None,
-            "analytic": None,
-        }
-
-    tail = parts[-1]
-
-    # Padrão câmera info/status: base/tenant/building/floor/camera/code/(info|status)
-    if tail in ("info", "status") and len(parts) >= offset + 6:
-        floor = parts[offset + 2]
-        device_type = parts[offset + 3]
-        device_code = parts[offset + 4]
-
-        kind = "cambus_info" if tail == "info" else "cambus_status"
-
-        return {
-            "kind": kind,
-            "tenant": tenant,
-            "building": building,
-            "floor": floor,
-            "device_type": device_type,
-            "device_code": device_code,
-            "analytic": None,
-        }
-
-    # Padrão câmera eventos: base/tenant/building/floor/camera/code/analytic/events
-    if tail == "events" and len(parts) >= offset + 7:
-        floor = parts[offset + 2]
-        device_type = parts[offset + 3]
-        device_code = parts[offset + 4]
-        analytic = parts[offset + 5]
-
-        return {
-            "kind": "cambus_event",
-            "tenant": tenant,
-            "building": building,
-            "floor": floor,
-            "device_type": device_type,
-            "device_code": device_code,
-            "analytic": analytic,
-        }
+    return (
+        await db.execute(_STMT_CAMERA_WITHOUT_CODE, {"device_id": default_id})
+    ).scalar()
 
-    return None
+
+async def _resolve_camera_id(device_code: str) -> Optional[int]:
+    now = time.monotonic()
+    cached = _camera_ids.get(device_code)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+
+    async with _SessionFactory() as db:
+        device_id = await _lookup_camera_id(db, device_code)
+
+    if device_id is not None:
+        if len(_camera_ids) >= _CAMERA_CACHE_MAX_ENTRIES:
+            _camera_ids.clear()
+        _camera_ids[device_code] = (now + _CAMERA_CACHE_TTL_SECONDS, device_id)
+    return device_id
+
+
+def _touch_last_seen_stmt(last_seen: Dict[int, datetime]):
+    """
+    Um UPDATE para o last_seen_at de todos os devices do lote; nunca volta
+    last_seen_at para trás.
+    """
+    seen = values(
+        column("device_id", Integer),
+        column("seen_at", DateTime()),
+        name="seen",
+    ).data(list(last_seen.items()))
+    return (
+        update(Device)
+        .where(
+            Device.id == seen.c.device_id,
+            or_(
+                Device.last_seen_at.is_(None),
+                Device.last_seen_at < seen.c.seen_at,
+            ),
+        )
+        .values(last_seen_at=seen.c.seen_at)
+        .execution_options(synchronize_session=False)
+    )
+
+
+# Lotes grandes vão por COPY (binário, sem parse/plan por linha); os ids
+# são reservados antes na sequence, já que COPY não tem RETURNING
+_EVENT_COPY_MIN_ROWS = 50
+_EVENT_COPY_COLUMNS = ("id", "device_id", "topic", "analytic_type", "payload", "occurred_at")
+_STMT_NEXT_EVENT_IDS = text(
+    "SELECT nextval(pg_get_serial_sequence('device_events', 'id')) "
+    "FROM generate_series(1, :n)"
+)
+
+
+async def _copy_events(conn, batch: List[_PendingEvent]) -> List[DeviceEvent]:
+    """
+    Grava o lote com COPY na conexão (e transação) da sessão e devolve os
+    DeviceEvent correspondentes (não anexados à sessão) para as regras de
+    incidente.
+    """
+    ids = (await conn.execute(_STMT_NEXT_EVENT_IDS, {"n": len(batch)})).scalars().all()
+
+    events: List[DeviceEvent] = []
+    records = []
+    for event_id, ev in zip(ids, batch):
+        occurred_at = ev.occurred_at.replace(tzinfo=timezone.utc)
+        records.append(
+            (event_id, ev.device_id, ev.topic, ev.analytic_type, str(ev.payload), occurred_at)
+        )
+        events.append(
+            DeviceEvent(
+                id=event_id,
+                device_id=ev.device_id,
+                topic=ev.topic,
+                analytic_type=ev.analytic_type,
+                payload=ev.data,
+                occurred_at=occurred_at,
+            )
+        )
+
+    raw = await conn.get_raw_connection()
+    try:
+        await raw.driver_connection.copy_records_to_table(
+            DeviceEvent.__tablename__,
+            records=records,
+            columns=_EVENT_COPY_COLUMNS,
+        )
+    except asyncpg.IntegrityConstraintViolationError as exc:
+        # mesmo tratamento do INSERT (fallback linha a linha em _flush_events)
+        raise IntegrityError("COPY device_events", None, exc) from exc
+
+    return events
+
+
+async def _write_events(batch: List[_PendingEvent]) -> List[DeviceEvent]:
+    """Grava o lote numa transação e devolve os DeviceEvent commitados."""
+    now = time.monotonic()
+
+    # device_topics: só tópicos ainda não vistos (ou com o upsert vencido)
+    new_topics: Dict[Tuple[int, str, str], str] = {}
+    last_seen: Dict[int, datetime] = {}
+    for ev in batch:
+        key = (ev.device_id, ev.kind, ev.topic)
+        expires_at = _known_topics.get(key)
+        if expires_at is None or expires_at <= now:
+            new_topics[key] = ev.topic_description
+
+        current = last_seen.get(ev.device_id)
+        if current is None or ev.occurred_at > current:
+            last_seen[ev.device_id] = ev.occurred_at
+
+    async with _SessionFactory() as db:
+        for (device_id, kind, topic), desc in new_topics.items():
+            await crud_device_topic.upsert(
+                db,
+                device_id=device_id,
+                kind=kind,
+                topic=topic,
+                description=desc,
+            )
+
+        conn = await db.connection()
+        if len(batch) >= _EVENT_COPY_MIN_ROWS and conn.dialect.driver == "asyncpg":
+            events = await _copy_events(conn, batch)
+        else:
+            # INSERT ... RETURNING em lote: eventos voltam carregados (id,
+            # created_at) para as regras de incidente
+            events = (
+                await db.scalars(
+                    insert(DeviceEvent).returning(DeviceEvent, sort_by_parameter_order=True),
+                    [
+                        {
+                            "device_id": ev.device_id,
+                            "topic": ev.topic,
+                            "analytic_type": ev.analytic_type,
+                            "payload": ev.payload,
+                            "occurred_at": ev.occurred_at,
+                        }
+                        for ev in batch
+                    ],
+                )
+            ).all()
+
+        await db.execute(_touch_last_seen_stmt(last_seen))
+        await db.commit()
+
+        _remember_topics(new_topics, now + _KNOWN_TOPIC_TTL_SECONDS)
+
+    for ev, db_event in zip(batch, events):
+        logger.info(
+            "[cambus] evento gravado: device_id=%s kind=%s analytic=%s topic=%s event_id=%s",
+            db_event.device_id,
+            ev.kind,
+            db_event.analytic_type,
+            db_event.topic,
+            db_event.id,
+        )
+    return events
+
+
+async def _apply_incident_rules(db_event: DeviceEvent) -> None:
+    """
+    Regras de incidente de um evento, numa sessão própria: uma falha (ex.:
+    IntegrityError ao criar o incidente) não contamina os outros eventos.
+    """
+    from app.services.incident_auto_rules import apply_incident_rules_for_event
+
+    try:
+        async with _SessionFactory() as db:
+            await apply_incident_rules_for_event(db, event=db_event)
+    except Exception:
+        logger.exception(
+            "[cambus] erro ao aplicar regras de incidente para DeviceEvent id=%s",
+            db_event.id,
+        )
+
+
+async def _schedule_incident_rules(events: List[DeviceEvent]) -> None:
+    # Sem o loop principal (scripts/testes) aplica na hora
+    if _incident_queue is None:
+        for db_event in events:
+            await _apply_incident_rules(db_event)
+        return
+
+    global _dropped_incident_events
+    for db_event in events:
+        try:
+            _incident_queue.put_nowait(db_event)
+        except asyncio.QueueFull:
+            _dropped_incident_events += 1
+            if _dropped_incident_events % _DROP_LOG_EVERY == 1:
+                logger.warning(
+                    "[cambus] drop: fila de regras de incidente cheia "
+                    "(%s eventos sem regras aplicadas até agora)",
+                    _dropped_incident_events,
+                )
+
+
+async def _incident_worker(queue: asyncio.Queue) -> None:
+    """Aplica as regras de incidente dos eventos da fila; None encerra."""
+    while True:
+        db_event = await queue.get()
+        if db_event is None:
+            return
+        await _apply_incident_rules(db_event)
+
+
+async def _flush_events(batch: List[_PendingEvent]) -> None:
+    """Grava o lote; erros só são logados (não derrubam o coletor)."""
+    try:
+        events = await _write_events(batch)
+    except IntegrityError as exc:
+        # ex.: câmera removida com eventos ainda na fila. Esquece os ids em
+        # cache e grava um a um, perdendo só os eventos inválidos.
+        _camera_ids.clear()
+        if len(batch) == 1:
+            logger.warning(
+                "[cambus] evento descartado (device_id=%s topic=%s): %s",
+                batch[0].device_id,
+                batch[0].topic,
+                exc,
+            )
+            return
+        for ev in batch:
+            await _flush_events([ev])
+    except RuntimeError as exc:
+        logger.error("[cambus] não foi possível abrir sessão de banco: %s", exc)
+    except Exception as exc:
+        logger.exception("[cambus] erro ao salvar %s eventos no banco: %s", len(batch), exc)
+    else:
+        await _schedule_incident_rules(events)
+
+
+async def _event_flusher(queue: asyncio.Queue) -> None:
+    """
+    Junta os eventos da fila em lotes e grava. Um None na fila encerra o
+    flusher depois de gravar o que veio antes dele.
+    """
+    loop = asyncio.get_running_loop()
+    stopping = False
+
+    while not stopping:
+        first = await queue.get()
+        if first is None:
+            return
+
+        batch = [first]
+        deadline = loop.time() + _EVENT_BATCH_INTERVAL_SECONDS
+        while len(batch) < _EVENT_BATCH_MAX:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                stopping = True
+                break
+            batch.append(item)
+
+        await _flush_events(batch)
 
 
 # ---------------------------------------------------------------------------
@@ -210,9 +627,14 @@ def _parse_cambus_topic(topic: str) -> Optional[dict]:
 async def _handle_message(topic: str, payload: bytes) -> None:
     logger.info("[cambus] mensagem recebida em %s", topic)
 
+    # Tópicos ignorados saem aqui, antes de decodificar o payload ou abrir
+    # sessão; os logs de debug só são montados com DEBUG ligado
+    debug = logger.isEnabledFor(logging.DEBUG)
+
     info = _parse_cambus_topic(topic)
     if not info:
-        logger.debug("[cambus] tópico %s não reconhecido pelo parser, ignorando", topic)
+        if debug:
+            logger.debug("[cambus] tópico %s não reconhecido pelo parser, ignorando", topic)
         return
 
     kind = info["kind"]
@@ -222,123 +644,89 @@ async def _handle_message(topic: str, payload: bytes) -> None:
 
     # Por enquanto, vamos focar em CÂMERAS; collector_status podemos ignorar
     if kind == "collector_status":
-        logger.debug("[cambus] tópico de collector_status %s, ignorando por enquanto", topic)
+        if debug:
+            logger.debug("[cambus] tópico de collector_status %s, ignorando por enquanto", topic)
         return
 
-    if not device_code or device_type != "camera":
-        logger.debug(
-            "[cambus] tópico %s não parece de câmera válida (device_type=%s, device_code=%s); ignorando",
-            topic,
-            device_type,
-            device_code,
-        )
+    if not device_code or device_type not in _CAMERA_DEVICE_TYPES:
+        if debug:
+            logger.debug(
+                "[cambus] tópico %s não parece de câmera válida (device_type=%s, device_code=%s); ignorando",
+                topic,
+                device_type,
+                device_code,
+            )
         return
 
     try:
-        data = json.loads(payload.decode("utf-8"))
+        # orjson lê os bytes direto (valida UTF-8 junto); o dict só é usado
+        # para Timestamp/AnalyticType, o payload vai para o banco como veio
+        data = orjson.loads(payload)
     except Exception as exc:
         logger.warning("[cambus] payload inválido em %s: %s", topic, exc)
         return
 
     try:
-        async with _SessionFactory() as db:
-            # Descobre o Device pela code + type
-            stmt_dev = select(Device).where(
-                Device.code == device_code,
-                Device.type == "CAMERA",
-            )
-            result_dev = await db.execute(stmt_dev)
-            device = result_dev.scalars().first()
-
-            # Fallback: tenta casar pelo "slug" do code (mesma lógica do publisher)
-            if not device:
-                stmt_all = select(Device).where(Device.type == "CAMERA")
-                result_all = await db.execute(stmt_all)
-                cams = result_all.scalars().all()
-
-                for d in cams:
-                    slug_code = _slug(d.code or f"device{d.id}", f"device{d.id}")
-                    if slug_code == device_code:
-                        device = d
-                        break
-
-            if not device:
-                logger.info(
-                    "[cambus] nenhum Device CAMERA com code=%s (nem slug) encontrado para tópico %s",
-                    device_code,
-                    topic,
-                )
-                return
-
-            # 1) Atualiza/cadastra o tópico em device_topics
-            desc_map = {
-                "cambus_info": "Camera /info for cam-bus",
-                "cambus_status": "Camera status for cam-bus",
-                "cambus_event": f"Camera event topic ({analytic_segment})",
-            }
-            desc = desc_map.get(kind, f"Camera topic ({kind})")
-
-            await crud_device_topic.upsert(
-                db,
-                device_id=device.id,
-                kind=kind,
-                topic=topic,
-                description=desc,
-            )
-
-            analytic_type = _extract_analytic_type(data, kind, analytic_segment)
-            occurred_at = _parse_timestamp(data)
+        device_id = await _resolve_camera_id(device_code)
+    except RuntimeError as exc:
+        logger.error("[cambus] não foi possível abrir sessão de banco: %s", exc)
+        return
+    except Exception as exc:
+        logger.exception("[cambus] erro ao buscar câmera %s: %s", device_code, exc)
+        return
 
-            # Normaliza para UTC naive (sem tzinfo) para bater com TIMESTAMP WITHOUT TIME ZONE
-            if occurred_at.tzinfo is not None:
-                occurred_at_naive = occurred_at.astimezone(timezone.utc).replace(tzinfo=None)
-            else:
-                occurred_at_naive = occurred_at
+    if device_id is None:
+        logger.info(
+            "[cambus] nenhum Device CAMERA com code=%s (nem slug) encontrado para tópico %s",
+            device_code,
+            topic,
+        )
+        return
 
-            # 1) Atualiza/cadastra o tópico em device_topics
-            desc_map = {
-                "cambus_info": "Camera /info for cam-bus",
-                "cambus_status": "Camera status for cam-bus",
-                "cambus_event": f"Camera event topic ({analytic_segment})",
-            }
-            desc = desc_map.get(kind, f"Camera topic ({kind})")
+    desc_map = {
+        "cambus_info": "Camera /info for cam-bus",
+        "cambus_status": "Camera status for cam-bus",
+        "cambus_event": f"Camera event topic ({analytic_segment})",
+    }
+    desc = desc_map.get(kind, f"Camera topic ({kind})")
+
+    analytic_type = _extract_analytic_type(data, kind, analytic_segment)
+    occurred_at = _parse_timestamp(data)
+
+    # Normaliza para UTC naive (sem tzinfo) para bater com TIMESTAMP WITHOUT TIME ZONE
+    if occurred_at.tzinfo is not None:
+        occurred_at_naive = occurred_at.astimezone(timezone.utc).replace(tzinfo=None)
+    else:
+        occurred_at_naive = occurred_at
+
+    event = _PendingEvent(
+        device_id=device_id,
+        kind=kind,
+        topic=topic,
+        topic_description=desc,
+        analytic_type=analytic_type,
+        payload=RawJSON(payload.decode("utf-8")),
+        data=data,
+        occurred_at=occurred_at_naive,
+    )
 
-            await crud_device_topic.upsert(
-                db,
-                device_id=device.id,
-                kind=kind,
-                topic=topic,
-                description=desc,
-            )
+    # Sem o loop principal (scripts/testes) grava na hora
+    if _event_queue is None:
+        await _flush_events([event])
+        return
 
-            # 2) Atualiza last_seen_at do device (em UTC naive)
-            current_last_seen = getattr(device, "last_seen_at", None)
-            if current_last_seen is None or occurred_at_naive > current_last_seen:
-                device.last_seen_at = occurred_at_naive
-
-            # 3) Grava evento em device_events usando o mesmo occurred_at_naive
-            event_data = {
-                "device_id": device.id,
-                "topic": topic,
-                "analytic_type": analytic_type,
-                "payload": data,
-                "occurred_at": occurred_at_naive,
-            }
-
-            db_event = await crud_device_event.create(db, obj_in=event_data)
-
-            logger.info(
-                "[cambus] evento gravado: device_id=%s kind=%s analytic=%s topic=%s event_id=%s",
-                device.id,
-                kind,
-                analytic_type,
-                topic,
-                db_event.id,
+    # Fila cheia (banco não acompanha): descarta em vez de travar a leitura
+    # do MQTT, que derrubaria mensagens no broker/cliente de qualquer forma
+    try:
+        _event_queue.put_nowait(event)
+    except asyncio.QueueFull:
+        global _dropped_events
+        _dropped_events += 1
+        if _dropped_events % _DROP_LOG_EVERY == 1:
+            logger.warning(
+                "[cambus] drop: fila de gravação cheia (%s eventos descartados até agora)",
+                _dropped_events,
             )
-    except RuntimeError as exc:
-        logger.error("[cambus] não foi possível abrir sessão de banco: %s", exc)
-    except Exception as exc:
-        logger.exception("[cambus] erro ao salvar evento no banco: %s", exc)
 
 
 # ---------------------------------------------------------------------------
@@ -368,10 +756,77 @@ async def run_cambus_event_collector() -> None:
 
     reconnect_interval = 5
 
+    global _event_queue, _incident_queue
+    incident_queue: asyncio.Queue = asyncio.Queue(maxsize=_INCIDENT_QUEUE_MAXSIZE)
+    incident_workers = [
+        asyncio.create_task(_incident_worker(incident_queue), name=f"cambus_incident_worker_{i}")
+        for i in range(_INCIDENT_WORKERS)
+    ]
+    _incident_queue = incident_queue
+    queue: asyncio.Queue = asyncio.Queue(maxsize=_EVENT_QUEUE_MAXSIZE)
+    flusher = asyncio.create_task(_event_flusher(queue), name="cambus_event_flusher")
+    _event_queue = queue
+    handlers: Set[asyncio.Task] = set()
+
+    try:
+        await _run_mqtt_loop(host, port, topic_filter, reconnect_interval, handlers)
+    finally:
+        # Espera as mensagens em andamento, para de enfileirar e grava o que
+        # ficou na fila antes de sair
+        if handlers:
+            await asyncio.wait(handlers, timeout=10)
+        _event_queue = None
+        await queue.put(None)
+        try:
+            await asyncio.wait_for(flusher, timeout=10)
+        except asyncio.TimeoutError:
+            logger.warning("[cambus] encerrando com %s eventos não gravados", queue.qsize())
+
+        # Regras dos eventos já gravados: os workers terminam a fila
+        _incident_queue = None
+        for _ in incident_workers:
+            await incident_queue.put(None)
+        _, pending = await asyncio.wait(incident_workers, timeout=10)
+        if pending:
+            logger.warning(
+                "[cambus] encerrando com %s eventos sem regras de incidente aplicadas",
+                incident_queue.qsize(),
+            )
+            for task in pending:
+                task.cancel()
+
+
+# Mensagens tratadas em paralelo (a maioria só enfileira; lookup de câmera
+# fora do cache vai ao banco). O loop de leitura espera uma vaga antes de
+# criar a task, então o número de tasks em voo é limitado.
+_HANDLER_CONCURRENCY = 32
+_MQTT_QUEUE_MAXSIZE = 10000
+
+
+async def _run_handler(semaphore: asyncio.Semaphore, topic: str, payload: bytes) -> None:
+    try:
+        await _handle_message(topic, payload)
+    except Exception as exc:
+        logger.exception("[cambus] erro ao processar mensagem de %s: %s", topic, exc)
+    finally:
+        semaphore.release()
+
+
+async def _run_mqtt_loop(
+    host: str,
+    port: int,
+    topic_filter: str,
+    reconnect_interval: int,
+    handlers: Set[asyncio.Task],
+) -> None:
+    semaphore = asyncio.Semaphore(_HANDLER_CONCURRENCY)
+
     while True:
         try:
             async with Client(hostname=host, port=port) as client:
-                async with client.messages() as messages:
+                # Fila do aiomqtt limitada: se o coletor não acompanhar, o
+                # cliente descarta (e loga) em vez de crescer sem limite
+                async with client.messages(queue_maxsize=_MQTT_QUEUE_MAXSIZE) as messages:
                     await client.subscribe(topic_filter)
                     logger.info(
                         "[cambus] conectado ao broker e inscrito em %s",
@@ -379,8 +834,15 @@ async def run_cambus_event_collector() -> None:
                     )
 
                     async for msg in messages:
-                        topic = str(msg.topic)
-                        await _handle_message(topic, msg.payload)
+                        # Topic.value já é a str (sem passar por __str__);
+                        # intern: tópicos se repetem e viram chave de cache
+                        topic = sys.intern(msg.topic.value)
+                        await semaphore.acquire()
+                        task = asyncio.create_task(
+                            _run_handler(semaphore, topic, msg.payload)
+                        )
+                        handlers.add(task)
+                        task.add_done_callback(handlers.discard)
 
         except asyncio.CancelledError:
             logger.info("[cambus] coletor cancelado, saindo...")
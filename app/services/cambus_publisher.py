@@ -1,11 +1,14 @@
 # app/services/cambus_publisher.py
 from __future__ import annotations
 
-import json
+import asyncio
 import logging
-from typing import List
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 
-from asyncio_mqtt import Client as MQTTClient
+import orjson
+from aiomqtt import Client as MQTTClient, MqttError
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -18,13 +21,66 @@ from app.crud.device_topic import device_topic as crud_device_topic
 logger = logging.getLogger(__name__)
 
 
+# Função pura chamada a cada publish (tenant, prédio, andar, câmera) com
+# poucos valores distintos: memoizada
+_SLUG_TABLE = str.maketrans({" ": "_", "/": "-"})
+
+
+@lru_cache(maxsize=4096)
 def _slug(value: str, default: str) -> str:
-    v = (value or "").strip()
-    if not v:
-        v = default
-    v = v.lower()
-    v = v.replace(" ", "_").replace("/", "-")
-    return v
+    v = (value or "").strip() or default
+    # espaços -> "_", "/" -> "-" numa passada só
+    return v.lower().translate(_SLUG_TABLE)
+
+
+# Conexão MQTT persistente para os publishes do cam-bus: abre na primeira
+# publicação e é reaproveitada (sem CONNECT/CONNACK a cada publish).
+# Fechada por close_cambus_mqtt_client() no shutdown do app.
+_mqtt_client: Optional[MQTTClient] = None
+_mqtt_client_lock = asyncio.Lock()
+
+
+async def _get_mqtt_client() -> MQTTClient:
+    global _mqtt_client
+    if _mqtt_client is not None:
+        return _mqtt_client
+
+    async with _mqtt_client_lock:
+        if _mqtt_client is None:
+            client = MQTTClient(
+                hostname=settings.RTLS_MQTT_HOST,
+                port=settings.RTLS_MQTT_PORT,
+                username=settings.RTLS_MQTT_USERNAME or None,
+                password=settings.RTLS_MQTT_PASSWORD or None,
+            )
+            # aiomqtt: connect/disconnect manuais são deprecados; a conexão
+            # longa usa o próprio context manager do client
+            await client.__aenter__()
+            _mqtt_client = client
+        return _mqtt_client
+
+
+async def _drop_mqtt_client(client: MQTTClient) -> None:
+    """Descarta uma conexão que falhou (a próxima publicação reconecta)."""
+    global _mqtt_client
+    if _mqtt_client is client:
+        _mqtt_client = None
+    try:
+        await client.__aexit__(None, None, None)
+    except Exception:  # noqa: BLE001
+        pass
+
+
+async def close_cambus_mqtt_client() -> None:
+    """Fecha a conexão MQTT persistente do cam-bus (shutdown do app)."""
+    global _mqtt_client
+    client, _mqtt_client = _mqtt_client, None
+    if client is None:
+        return
+    try:
+        await client.__aexit__(None, None, None)
+    except MqttError as exc:
+        logger.warning("[cam-bus] erro ao desconectar do MQTT: %s", exc)
 
 
 async def _mqtt_publish_json(topic: str, payload: dict, *, retain: bool = True, qos: int = 1) -> None:
@@ -35,16 +91,38 @@ async def _mqtt_publish_json(topic: str, payload: dict, *, retain: bool = True,
         logger.debug("[cam-bus] RTLS_MQTT_ENABLED=false, não publicando em %s", topic)
         return
 
-    host = settings.RTLS_MQTT_HOST
-    port = settings.RTLS_MQTT_PORT
-    username = settings.RTLS_MQTT_USERNAME or None
-    password = settings.RTLS_MQTT_PASSWORD or None
+    # orjson já gera UTF-8 em bytes, que vão direto para o publish
+    payload_bytes = orjson.dumps(payload)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(
+            "[cam-bus] MQTT publish topic=%s retain=%s payload=%s",
+            topic,
+            retain,
+            payload_bytes.decode("utf-8"),
+        )
+
+    client = await _get_mqtt_client()
+    try:
+        await client.publish(topic, payload_bytes, qos=qos, retain=retain)
+    except MqttError as exc:
+        # conexão caiu desde o último uso: reconecta e tenta uma vez mais
+        logger.warning("[cam-bus] MQTT publish falhou (%s), reconectando", exc)
+        await _drop_mqtt_client(client)
+        client = await _get_mqtt_client()
+        await client.publish(topic, payload_bytes, qos=qos, retain=retain)
+
+
+# (building_id, floor_id) -> (expira_em, (building_slug, floor_slug)).
+# Prédios/andares quase nunca mudam e são compartilhados por muitas câmeras;
+# as rotas de prédio/andar chamam invalidate_building_floor_cache().
+_BUILDING_FLOOR_CACHE_TTL_SECONDS = 60.0
+_BUILDING_FLOOR_CACHE_MAX_ENTRIES = 1024
+_building_floor_cache: Dict[Tuple[Optional[int], Optional[int]], Tuple[float, Tuple[str, str]]] = {}
 
-    payload_str = json.dumps(payload, ensure_ascii=False)
-    logger.info("[cam-bus] MQTT publish topic=%s retain=%s payload=%s", topic, retain, payload_str)
 
-    async with MQTTClient(hostname=host, port=port, username=username, password=password) as client:
-        await client.publish(topic, payload_str, qos=qos, retain=retain)
+def invalidate_building_floor_cache() -> None:
+    """Descarta os slugs de prédio/andar em cache (após alterar/remover)."""
+    _building_floor_cache.clear()
 
 
 async def _resolve_building_floor(
@@ -56,24 +134,36 @@ async def _resolve_building_floor(
     if getattr(device, "type", None) == "CAMERA" and not device.building_id and not device.floor_id:
         return _slug("externo", "externo"), _slug("externo", "externo")
 
-    b_name = "building"
-    f_name = "floor"
+    key = (device.building_id, device.floor_id)
+    now = time.monotonic()
+    cached = _building_floor_cache.get(key)
+    if cached is not None and cached[0] > now:
+        return cached[1]
 
-    if device.building_id:
-        stmt = select(Building).where(Building.id == device.building_id)
-        result = await db.execute(stmt)
-        b = result.scalars().first()
-        if b and getattr(b, "name", None):
-            b_name = b.name
+    slugs = await _query_building_floor(db, *key)
+    if len(_building_floor_cache) >= _BUILDING_FLOOR_CACHE_MAX_ENTRIES:
+        _building_floor_cache.clear()
+    _building_floor_cache[key] = (now + _BUILDING_FLOOR_CACHE_TTL_SECONDS, slugs)
+    return slugs
 
-    if device.floor_id:
-        stmt = select(Floor).where(Floor.id == device.floor_id)
-        result = await db.execute(stmt)
-        f = result.scalars().first()
-        if f and getattr(f, "name", None):
-            f_name = f.name
 
-    return _slug(b_name, "building"), _slug(f_name, "floor")
+async def _query_building_floor(
+    db: AsyncSession,
+    building_id: Optional[int],
+    floor_id: Optional[int],
+) -> Tuple[str, str]:
+    b_name = None
+    f_name = None
+
+    if building_id:
+        stmt = select(Building.name).where(Building.id == building_id)
+        b_name = (await db.execute(stmt)).scalar()
+
+    if floor_id:
+        stmt = select(Floor.name).where(Floor.id == floor_id)
+        f_name = (await db.execute(stmt)).scalar()
+
+    return _slug(b_name or "building", "building"), _slug(f_name or "floor", "floor")
 
 
 def _analytics_for_device(device: Device) -> List[str]:
@@ -244,10 +334,15 @@ async def disable_cambus_topics_for_device(
     if not topics:
         return
 
-    # Publica "enabled=false" apenas nos tópicos de /info (cambus_info)
-    for t in topics:
-        if t.kind == "cambus_info":
-            await _mqtt_publish_json(t.topic, {"enabled": False}, retain=True, qos=1)
+    # Publica "enabled=false" apenas nos tópicos de /info (cambus_info),
+    # em paralelo na mesma conexão (os PUBACKs do QoS 1 se sobrepõem)
+    await asyncio.gather(
+        *(
+            _mqtt_publish_json(t.topic, {"enabled": False}, retain=True, qos=1)
+            for t in topics
+            if t.kind == "cambus_info"
+        )
+    )
 
     # Marca todos como inativos (mantém histórico)
     await crud_device_topic.mark_all_inactive(db, device_id=device_id)
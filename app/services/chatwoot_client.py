@@ -1,14 +1,21 @@
 # app/services/chatwoot_client.py
 from __future__ import annotations
 
-from typing import Optional, Any
+from typing import AsyncIterator, BinaryIO, Optional, Any
 import asyncio
+from functools import lru_cache
 import logging
 import mimetypes
+import os
+import random
+import re
+import time
 from pathlib import Path
-from urllib.parse import urlparse
 
 import httpx
+import orjson
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
 
 from app.core.config import settings
 from app.models.incident import Incident
@@ -16,6 +23,157 @@ from app.models.incident_message import IncidentMessage
 
 logger = logging.getLogger(__name__)
 
+# Client HTTP único do processo para o Chatwoot: pool de conexões keep-alive
+# reaproveitado por todas as chamadas (sem handshake TCP/TLS a cada request)
+# e header de autenticação já embutido. Fechado no shutdown do app
+# (close_chatwoot_http).
+_HTTP_TIMEOUT = httpx.Timeout(20.0, connect=5.0, pool=5.0)
+_HTTP_LIMITS = httpx.Limits(
+    max_connections=100,
+    max_keepalive_connections=20,
+    keepalive_expiry=30.0,
+)
+
+# Falha de conexão (nada chegou a ser enviado) é repetida pelo próprio
+# transport do httpx, inclusive no upload de attachments
+_HTTP_CONNECT_RETRIES = 2
+
+_CLIENT: Optional[httpx.AsyncClient] = None
+
+
+def get_chatwoot_http() -> httpx.AsyncClient:
+    global _CLIENT
+    if _CLIENT is None or _CLIENT.is_closed:
+        _CLIENT = httpx.AsyncClient(
+            timeout=_HTTP_TIMEOUT,
+            transport=httpx.AsyncHTTPTransport(limits=_HTTP_LIMITS, retries=_HTTP_CONNECT_RETRIES),
+            headers={"api_access_token": settings.CHATWOOT_API_ACCESS_TOKEN or ""},
+        )
+    return _CLIENT
+
+
+async def close_chatwoot_http() -> None:
+    """Fecha o client HTTP do Chatwoot (shutdown do app)."""
+    global _CLIENT
+    client, _CLIENT = _CLIENT, None
+    if client is not None:
+        await client.aclose()
+
+
+# Backoff exponencial do _request, pré-calculado, com jitter na hora do
+# sleep: workers que tomaram 429 juntos não voltam todos no mesmo instante.
+_BACKOFF = tuple(settings.CHATWOOT_RETRY_BASE_DELAY_SECONDS * 2**i for i in range(4))
+
+
+_RETRY_STATUS_CODES = frozenset({429, 502, 503, 504})
+
+# Erros depois que o request já saiu; ConnectError/ConnectTimeout ficam com
+# os retries do transport e sobem direto
+_MID_REQUEST_ERRORS = (
+    httpx.ReadError,
+    httpx.WriteError,
+    httpx.RemoteProtocolError,
+    httpx.ReadTimeout,
+)
+
+
+def _retry_delay(attempt: int) -> float:
+    return _BACKOFF[min(attempt, len(_BACKOFF) - 1)] * (0.5 + random.random())
+
+
+# Upload de attachment em streaming: o corpo multipart é montado à mão e o
+# arquivo é lido em blocos numa thread, sem bloquear o loop nem carregar o
+# arquivo inteiro na memória. Content-Length vem do stat (sem chunked).
+_UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def _multipart_head_tail(
+    boundary: str,
+    fields: dict[str, str],
+    file_field: str,
+    filename: str,
+    mime_type: str,
+) -> tuple[bytes, bytes]:
+    parts = [
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+        for name, value in fields.items()
+    ]
+    safe_name = filename.replace('"', "%22").replace("\r", "").replace("\n", "")
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{safe_name}"\r\n'
+        f"Content-Type: {mime_type}\r\n\r\n"
+    )
+    head = "".join(parts).encode("utf-8")
+    tail = f"\r\n--{boundary}--\r\n".encode("ascii")
+    return head, tail
+
+
+# Carrega a base de MIME no import, fora do caminho da primeira request.
+mimetypes.init()
+
+# 422 de source_id duplicado (idempotência); o texto varia por versão.
+# "source" já cobre "source_id"/"source id".
+_DUPLICATE_SOURCE_RE = re.compile(r"already (?:been )?taken|source", re.IGNORECASE)
+
+_CHATWOOT_FILE_TYPES = {"IMAGE": "image", "VIDEO": "video", "AUDIO": "audio"}
+
+
+@lru_cache(maxsize=256)
+def _guess_mime(suffix: str) -> str:
+    # Chave é a extensão: os nomes de arquivo de mídia são únicos por
+    # snapshot, então cachear pelo nome inteiro nunca acertaria.
+    mime_type, _ = mimetypes.guess_type(f"file{suffix}")
+    return mime_type or "application/octet-stream"
+
+
+def _open_for_upload(path: Path) -> tuple[BinaryIO, int]:
+    # O open já é a checagem de existência; o tamanho sai do fstat do fd
+    f = path.open("rb")
+    try:
+        return f, os.fstat(f.fileno()).st_size
+    except BaseException:
+        f.close()
+        raise
+
+
+async def _iter_multipart(head: bytes, f: BinaryIO, tail: bytes) -> AsyncIterator[bytes]:
+    yield head
+    while chunk := await asyncio.to_thread(f.read, _UPLOAD_CHUNK_SIZE):
+        yield chunk
+    yield tail
+
+
+# Cache L2 (Redis) de identifier -> id de inbox/contact, por conta: sobrevive
+# a restart e é compartilhado entre workers. O dict da instância continua
+# como L1. Redis fora do ar só faz cair no request HTTP.
+_LOOKUP_CACHE_TTL_SECONDS = 24 * 3600
+# Inbox inexistente (config errada) também é lembrada, por pouco tempo:
+# evita o GET /inboxes a cada incidente e ainda pega a correção sem restart.
+_INBOX_MISS_TTL_SECONDS = 60.0
+_REDIS_TIMEOUT_SECONDS = 0.5
+
+_redis: Optional[Redis] = None
+
+
+def _get_redis() -> Redis:
+    global _redis
+    if _redis is None:
+        _redis = Redis(
+            host=settings.redis_host,
+            port=settings.redis_port,
+            socket_timeout=_REDIS_TIMEOUT_SECONDS,
+            socket_connect_timeout=_REDIS_TIMEOUT_SECONDS,
+        )
+    return _redis
+
+
+async def close_chatwoot_cache() -> None:
+    """Fecha a conexão Redis do cache do Chatwoot (shutdown do app)."""
+    global _redis
+    client, _redis = _redis, None
+    if client is not None:
+        await client.aclose()
+
 
 class ChatwootHTTPError(RuntimeError):
     """Erro HTTP do Chatwoot com status e corpo para tratamento robusto."""
@@ -58,21 +216,35 @@ class ChatwootClient:
         self.token = settings.CHATWOOT_API_ACCESS_TOKEN
         self.account_id = settings.CHATWOOT_DEFAULT_ACCOUNT_ID
 
+        # Paths da conta montados uma vez (account_id não muda em runtime)
+        account_path = f"/api/v1/accounts/{self.account_id}"
+        self._inboxes_path = f"{account_path}/inboxes"
+        self._contacts_path = f"{account_path}/contacts"
+        self._contact_search_path = f"{account_path}/contacts/search"
+        self._conversations_path = f"{account_path}/conversations"
+        self._conversation_filter_path = f"{account_path}/conversations/filter"
+
         self.default_inbox_identifier = settings.CHATWOOT_DEFAULT_INBOX_IDENTIFIER
         self.default_contact_identifier = settings.CHATWOOT_DEFAULT_CONTACT_IDENTIFIER
 
         raw_incident_base = settings.CHATWOOT_INCIDENT_BASE_URL
         self.incident_base_url = str(raw_incident_base).rstrip("/") if raw_incident_base else None
 
+        media_root = getattr(settings, "MEDIA_ROOT", None)
+        self._media_root = Path(media_root) if media_root else Path("media")
+
         self._inbox_cache: dict[str, int] = {}
         self._contact_cache: dict[str, int] = {}
-
-        self._http: Optional[httpx.AsyncClient] = None
-
-    # ------------------------------ lifecycle / config
-
-    def is_configured(self) -> bool:
-        return bool(
+        self._inbox_misses: dict[str, float] = {}
+        # Parâmetro de /contacts/search que esta instalação atende ("q" ou
+        # "identifier"); descoberto na primeira busca com acerto
+        self._contact_search_param: Optional[str] = None
+        # Criação/busca de conversa em andamento por incidente: chamadas
+        # concorrentes para o mesmo incidente aguardam a mesma task
+        self._conversations_in_flight: dict[int, asyncio.Task[Optional[int]]] = {}
+
+        # Settings não mudam em runtime: calcula uma vez
+        self._configured = bool(
             self.enabled
             and self.base_url
             and self.token
@@ -80,19 +252,17 @@ class ChatwootClient:
             and self.default_inbox_identifier
         )
 
+    # ------------------------------ lifecycle / config
+
+    def is_configured(self) -> bool:
+        return self._configured
+
     def _get_http(self) -> httpx.AsyncClient:
-        if self._http is None:
-            # Mantém um client reaproveitável (evita overhead e melhora performance)
-            self._http = httpx.AsyncClient(timeout=20.0)
-        return self._http
+        return get_chatwoot_http()
 
     async def aclose(self) -> None:
-        if self._http is not None:
-            await self._http.aclose()
-            self._http = None
-
-    def _headers(self) -> dict[str, str]:
-        return {"api_access_token": self.token or ""}
+        # O client HTTP é do processo (close_chatwoot_http no shutdown)
+        return None
 
     def _set_incident_conversation_id(self, incident: Incident, conversation_id: int) -> None:
         """
@@ -116,25 +286,52 @@ class ChatwootClient:
         params: dict[str, Any] | None = None,
         headers: dict[str, str] | None = None,
         files: Any | None = None,
-        retries: int = 2,
+        retries: Optional[int] = None,
     ) -> dict[str, Any]:
         url = f"{self.base_url}{path}"
-        merged_headers = {**self._headers(), **(headers or {})}
+        if retries is None:
+            retries = settings.CHATWOOT_HTTP_RETRIES
 
-        last_exc: Optional[Exception] = None
+        # Corpo serializado uma vez com orjson (reaproveitado nos retries)
+        content: Optional[bytes] = None
+        if json is not None:
+            content = orjson.dumps(json)
+            headers = {"Content-Type": "application/json", **(headers or {})}
 
-        for attempt in range(retries + 1):
+        attempt = 0
+        while True:
             try:
                 resp = await self._get_http().request(
                     method,
                     url,
-                    headers=merged_headers,
-                    json=json,
+                    headers=headers,
+                    content=content,
                     params=params,
                     files=files,
                 )
-
-                if resp.status_code >= 400:
+            except _MID_REQUEST_ERRORS:
+                # timeout/erro de rede no meio do request
+                if attempt >= retries:
+                    raise
+            else:
+                if resp.status_code < 400:
+                    try:
+                        return orjson.loads(resp.content)
+                    except orjson.JSONDecodeError:
+                        return {}
+
+                if resp.status_code in _RETRY_STATUS_CODES and attempt < retries:
+                    # vai repetir: o corpo não é usado, nem decodifica
+                    logger.warning(
+                        "[chatwoot] HTTP %s %s falhou: %s (tentativa %s de %s)",
+                        method,
+                        url,
+                        resp.status_code,
+                        attempt + 1,
+                        retries + 1,
+                    )
+                else:
+                    # Demais 4xx/5xx não melhoram repetindo (ex.: 422 de source_id)
                     body_text = resp.text or ""
                     logger.warning(
                         "[chatwoot] HTTP %s %s falhou: %s %s",
@@ -143,11 +340,6 @@ class ChatwootClient:
                         resp.status_code,
                         body_text[:2000],
                     )
-
-                    if resp.status_code in (429, 502, 503, 504) and attempt < retries:
-                        await asyncio.sleep(0.6 * (2**attempt))
-                        continue
-
                     raise ChatwootHTTPError(
                         status_code=resp.status_code,
                         method=method,
@@ -156,67 +348,50 @@ class ChatwootClient:
                         body_text=body_text,
                     )
 
-                try:
-                    return resp.json()
-                except ValueError:
-                    return {}
-
-            except Exception as e:
-                last_exc = e
-                if attempt < retries:
-                    await asyncio.sleep(0.6 * (2**attempt))
-                    continue
-                raise
-
-        if last_exc:
-            raise last_exc
-        return {}
+            await asyncio.sleep(_retry_delay(attempt))
+            attempt += 1
 
     # ------------------------------ helpers de payload
 
     def _unwrap_payload(self, data: Any) -> Any:
-        if not isinstance(data, dict):
+        # Respostas vêm do orjson.loads: dict puro, sem subclasses
+        if type(data) is not dict:
             return None
-        if "payload" in data:
-            return data.get("payload")
+        payload = data.get("payload")
+        if payload is not None:
+            return payload
         inner = data.get("data")
-        if isinstance(inner, dict) and "payload" in inner:
-            return inner.get("payload")
-        return None
+        return inner.get("payload") if type(inner) is dict else None
 
     # ------------------------------ mídia / paths locais
 
-    def _media_root(self) -> Path:
-        base = getattr(settings, "MEDIA_ROOT", None)
-        return Path(base) if base else Path("media")
-
     def _resolve_local_media_path(self, incident_id: int, media_url: str) -> Optional[Path]:
         if not media_url:
             return None
-        try:
-            parsed = urlparse(media_url)
-            path = parsed.path or media_url
-            parts = path.strip("/").split("/")
-            if "incidents" not in parts:
+
+        # media_url relativa ou absoluta: descarta esquema/host, query e fragmento
+        path = media_url.split("?", 1)[0].split("#", 1)[0]
+        scheme_end = path.find("://")
+        if scheme_end >= 0:
+            host_end = path.find("/", scheme_end + 3)
+            if host_end < 0:
                 return None
-            idx = parts.index("incidents")
-            if len(parts) < idx + 3:
+            path = path[host_end:]
+
+        if path.startswith("incidents/"):
+            start = 0
+        else:
+            start = path.find("/incidents/") + 1
+            if start == 0:
                 return None
-            rel = Path(*parts[idx:])  # incidents/{id}/arquivo.ext
-            return self._media_root() / rel
-        except Exception:
-            logger.exception("[chatwoot] erro ao resolver path local para media_url=%r", media_url)
+
+        rel = path[start:].rstrip("/")  # incidents/{id}/arquivo.ext
+        if rel.count("/") < 2:
             return None
+        return self._media_root / rel
 
     def _chatwoot_file_type(self, media_type: Optional[str]) -> str:
-        mt = (media_type or "").upper()
-        if mt == "IMAGE":
-            return "image"
-        if mt == "VIDEO":
-            return "video"
-        if mt == "AUDIO":
-            return "audio"
-        return "document"
+        return _CHATWOOT_FILE_TYPES.get((media_type or "").upper(), "document")
 
     def _format_author_content(self, author_name: Optional[str], content: str) -> str:
         base = (content or "").strip()
@@ -228,17 +403,81 @@ class ChatwootClient:
         return f"{author}:\n{base}"
 
     def _looks_like_duplicate_source_id(self, status_code: int, body_text: str) -> bool:
-        if status_code != 422:
-            return False
-        bt = (body_text or "").lower()
-        # Mensagens variam por versão/instalação
-        return (
-            "has already been taken" in bt
-            or "already taken" in bt
-            or "source" in bt
-            or "source_id" in bt
-            or "source id" in bt
-        )
+        return status_code == 422 and _DUPLICATE_SOURCE_RE.search(body_text or "") is not None
+
+    # ------------------------------ cache de ids (L1 dict + L2 Redis)
+
+    def _cache_key(self, kind: str, identifier: str) -> str:
+        return f"chatwoot:{kind}:{self.account_id}:{identifier}"
+
+    async def _cache_get(self, kind: str, l1: dict[str, int], identifier: str) -> Optional[int]:
+        cached = l1.get(identifier)
+        if cached is not None:
+            return cached
+
+        try:
+            raw = await _get_redis().get(self._cache_key(kind, identifier))
+        except RedisError as exc:
+            logger.debug("[chatwoot] cache Redis indisponível (%s): %s", kind, exc)
+            return None
+        if raw is None:
+            return None
+
+        try:
+            value = int(raw)
+        except ValueError:
+            # valor corrompido no Redis: trata como miss (o set sobrescreve)
+            logger.warning("[chatwoot] valor inválido no cache (%s) %r, ignorando", kind, raw)
+            return None
+        l1[identifier] = value
+        return value
+
+    async def _cache_set(self, kind: str, l1: dict[str, int], identifier: str, value: int) -> None:
+        l1[identifier] = value
+        try:
+            await _get_redis().set(
+                self._cache_key(kind, identifier),
+                value,
+                ex=_LOOKUP_CACHE_TTL_SECONDS,
+            )
+        except RedisError as exc:
+            logger.debug("[chatwoot] cache Redis indisponível (%s): %s", kind, exc)
+
+    async def _cache_delete(self, kind: str, l1: dict[str, int], identifier: str) -> None:
+        l1.pop(identifier, None)
+        try:
+            await _get_redis().delete(self._cache_key(kind, identifier))
+        except RedisError as exc:
+            logger.debug("[chatwoot] cache Redis indisponível (%s): %s", kind, exc)
+
+    async def _inbox_cache_get(self, identifier: str) -> Optional[int]:
+        return await self._cache_get("inbox", self._inbox_cache, identifier)
+
+    async def _inbox_cache_set(self, identifier: str, inbox_id: int) -> None:
+        await self._cache_set("inbox", self._inbox_cache, identifier, inbox_id)
+
+    async def _contact_cache_get(self, identifier: str) -> Optional[int]:
+        return await self._cache_get("contact", self._contact_cache, identifier)
+
+    async def _contact_cache_set(self, identifier: str, contact_id: int) -> None:
+        await self._cache_set("contact", self._contact_cache, identifier, contact_id)
+
+    async def _refresh_conversation_ids(
+        self,
+        inbox_identifier: str,
+        contact_identifier: str,
+    ) -> Optional[tuple[int, int]]:
+        """
+        Esquece inbox/contact em cache (L1 e Redis) e resolve de novo no
+        Chatwoot. None se algum dos dois não for encontrado.
+        """
+        await self._cache_delete("inbox", self._inbox_cache, inbox_identifier)
+        await self._cache_delete("contact", self._contact_cache, contact_identifier)
+        inbox_id = await self._resolve_inbox_id(inbox_identifier)
+        contact_id = await self._get_or_create_contact(contact_identifier)
+        if not inbox_id or not contact_id:
+            return None
+        return inbox_id, contact_id
 
     # ------------------------------ inbox / contact
 
@@ -246,75 +485,115 @@ class ChatwootClient:
         if not identifier:
             return None
 
-        if identifier in self._inbox_cache:
-            return self._inbox_cache[identifier]
-
         if identifier.isdigit():
-            inbox_id = int(identifier)
-            self._inbox_cache[identifier] = inbox_id
-            return inbox_id
+            return int(identifier)
+
+        cached = await self._inbox_cache_get(identifier)
+        if cached is not None:
+            return cached
 
-        data = await self._request("GET", f"/api/v1/accounts/{self.account_id}/inboxes")
+        miss_expires_at = self._inbox_misses.get(identifier)
+        if miss_expires_at is not None:
+            if time.monotonic() < miss_expires_at:
+                return None
+            del self._inbox_misses[identifier]
+
+        data = await self._request("GET", self._inboxes_path)
         payload = data.get("payload") or []
 
         for inbox in payload:
             if inbox.get("identifier") == identifier or inbox.get("name") == identifier:
                 inbox_id = int(inbox["id"])
-                self._inbox_cache[identifier] = inbox_id
+                await self._inbox_cache_set(identifier, inbox_id)
                 return inbox_id
 
         logger.warning("[chatwoot] inbox com identifier/name '%s' não encontrada.", identifier)
+        self._inbox_misses[identifier] = time.monotonic() + _INBOX_MISS_TTL_SECONDS
+        return None
+
+    async def _search_contact(self, param: str, identifier: str) -> tuple[bool, Optional[int]]:
+        """
+        Busca o contact por uma variante de parâmetro. Retorna (aceita, id):
+        erro HTTP conta como variante não aceita; (True, None) é busca vazia.
+        """
+        try:
+            data = await self._request(
+                "GET",
+                self._contact_search_path,
+                params={param: identifier},
+            )
+        except ChatwootHTTPError:
+            return False, None
+
+        return True, self._contact_id_from_search(data, identifier)
+
+    def _contact_id_from_search(self, data: Any, identifier: str) -> Optional[int]:
+        payload = data.get("payload") if isinstance(data, dict) else None
+
+        if isinstance(payload, list):
+            for c in payload:
+                if isinstance(c, dict) and c.get("identifier") == identifier and c.get("id") is not None:
+                    return int(c["id"])
+            for c in payload:
+                if isinstance(c, dict) and c.get("id") is not None:
+                    return int(c["id"])
+
+        if isinstance(payload, dict):
+            cid = payload.get("id")
+            if cid is not None:
+                return int(cid)
+            contact = payload.get("contact")
+            if isinstance(contact, dict) and contact.get("id") is not None:
+                return int(contact["id"])
+
+        if isinstance(data, dict) and data.get("id") is not None:
+            return int(data["id"])
+
         return None
 
     async def _find_contact_id_by_identifier(self, identifier: str) -> Optional[int]:
         if not identifier:
             return None
 
-        attempts = [{"q": identifier}, {"identifier": identifier}]
-
-        for params in attempts:
-            try:
-                data = await self._request(
-                    "GET",
-                    f"/api/v1/accounts/{self.account_id}/contacts/search",
-                    params=params,
-                )
-            except ChatwootHTTPError:
-                continue
-
-            payload = data.get("payload") if isinstance(data, dict) else None
-
-            if isinstance(payload, list):
-                for c in payload:
-                    if isinstance(c, dict) and c.get("identifier") == identifier and c.get("id") is not None:
-                        return int(c["id"])
-                for c in payload:
-                    if isinstance(c, dict) and c.get("id") is not None:
-                        return int(c["id"])
-
-            if isinstance(payload, dict):
-                cid = payload.get("id")
-                if cid is not None:
-                    return int(cid)
-                contact = payload.get("contact")
-                if isinstance(contact, dict) and contact.get("id") is not None:
-                    return int(contact["id"])
-
-            if isinstance(data, dict) and data.get("id") is not None:
-                return int(data["id"])
-
+        param = self._contact_search_param
+        if param:
+            _, cid = await self._search_contact(param, identifier)
+            if cid is not None:
+                return cid
+            # A variante fixada não achou: tenta a outra antes de concluir que
+            # o contact não existe (e cair na criação / 422)
+            _, cid = await self._search_contact("identifier" if param == "q" else "q", identifier)
+            return cid
+
+        # Ainda não sabemos qual variante a versão do Chatwoot aceita: as duas
+        # em paralelo
+        params = ("q", "identifier")
+        try:
+            async with asyncio.TaskGroup() as tg:
+                tasks = [tg.create_task(self._search_contact(p, identifier)) for p in params]
+        except* Exception as eg:
+            # Quem chama trata httpx/ChatwootError, não ExceptionGroup
+            raise eg.exceptions[0] from None
+        results = [task.result() for task in tasks]
+        for i, (param, (_, cid)) in enumerate(zip(params, results)):
+            if cid is not None:
+                # Só fixa a variante se a outra respondeu sem erro e vazia
+                if results[1 - i] == (True, None):
+                    self._contact_search_param = param
+                return cid
         return None
 
     async def _get_or_create_contact(self, identifier: str) -> Optional[int]:
         if not identifier:
             return None
 
-        if identifier in self._contact_cache:
-            return self._contact_cache[identifier]
+        cached = await self._contact_cache_get(identifier)
+        if cached is not None:
+            return cached
 
         existing = await self._find_contact_id_by_identifier(identifier)
         if existing:
-            self._contact_cache[identifier] = existing
+            await self._contact_cache_set(identifier, existing)
             return existing
 
         body = {"identifier": identifier, "name": "SecurityVision"}
@@ -322,14 +601,14 @@ class ChatwootClient:
         try:
             data = await self._request(
                 "POST",
-                f"/api/v1/accounts/{self.account_id}/contacts",
+                self._contacts_path,
                 json=body,
             )
         except ChatwootHTTPError as e:
             if e.status_code == 422 and "identifier has already been taken" in (e.body_text or "").lower():
                 recovered = await self._find_contact_id_by_identifier(identifier)
                 if recovered:
-                    self._contact_cache[identifier] = recovered
+                    await self._contact_cache_set(identifier, recovered)
                     return recovered
             raise
 
@@ -341,7 +620,7 @@ class ChatwootClient:
             logger.warning("[chatwoot] resposta de criação de contact sem id: %r", data)
             return None
 
-        self._contact_cache[identifier] = cid
+        await self._contact_cache_set(identifier, cid)
         return cid
 
     # ------------------------------ conversas
@@ -382,7 +661,7 @@ class ChatwootClient:
         try:
             data = await self._request(
                 "POST",
-                f"/api/v1/accounts/{self.account_id}/conversations/filter",
+                self._conversation_filter_path,
                 json={"payload": filters},
             )
         except ChatwootHTTPError:
@@ -399,6 +678,22 @@ class ChatwootClient:
         if incident.chatwoot_conversation_id:
             return int(incident.chatwoot_conversation_id)
 
+        incident_id = incident.id
+        task = self._conversations_in_flight.get(incident_id)
+        if task is None:
+            task = asyncio.create_task(self._find_or_create_conversation(incident))
+            self._conversations_in_flight[incident_id] = task
+
+            def _done(t: asyncio.Task[Optional[int]]) -> None:
+                if self._conversations_in_flight.get(incident_id) is t:
+                    del self._conversations_in_flight[incident_id]
+
+            task.add_done_callback(_done)
+
+        # shield: cancelar um chamador não cancela a criação para os demais
+        return await asyncio.shield(task)
+
+    async def _find_or_create_conversation(self, incident: Incident) -> Optional[int]:
         incident_created_at: Optional[str] = None
         if getattr(incident, "created_at", None):
             try:
@@ -408,7 +703,19 @@ class ChatwootClient:
 
         group = getattr(incident, "assigned_group", None)
         inbox_identifier = (getattr(group, "chatwoot_inbox_identifier", None) or self.default_inbox_identifier)
-        inbox_id = await self._resolve_inbox_id(inbox_identifier)
+        contact_identifier = self.default_contact_identifier or "securityvision-system"
+
+        # Inbox e contact são independentes: resolvidos em paralelo (uma
+        # rodada de requests em vez de duas; ambos ficam em cache depois)
+        inbox_result, contact_result = await asyncio.gather(
+            self._resolve_inbox_id(inbox_identifier),
+            self._get_or_create_contact(contact_identifier),
+            return_exceptions=True,
+        )
+        if isinstance(inbox_result, BaseException):
+            raise inbox_result
+
+        inbox_id = inbox_result
         if not inbox_id:
             logger.warning("[chatwoot] não consegui resolver inbox_id para incidente %s", incident.id)
             return None
@@ -421,8 +728,11 @@ class ChatwootClient:
         if existing_conv_id:
             return existing_conv_id
 
-        contact_identifier = self.default_contact_identifier or "securityvision-system"
-        contact_id = await self._get_or_create_contact(contact_identifier)
+        # O contact só é obrigatório para criar a conversa
+        if isinstance(contact_result, BaseException):
+            raise contact_result
+
+        contact_id = contact_result
         if not contact_id:
             logger.warning("[chatwoot] não consegui resolver contact_id para incidente %s", incident.id)
             return None
@@ -449,7 +759,7 @@ class ChatwootClient:
         try:
             data = await self._request(
                 "POST",
-                f"/api/v1/accounts/{self.account_id}/conversations",
+                self._conversations_path,
                 json=body,
             )
         except ChatwootHTTPError as e:
@@ -461,7 +771,20 @@ class ChatwootClient:
                 )
                 if recovered:
                     return recovered
-            raise
+            if e.status_code not in (404, 422):
+                raise
+
+            # inbox/contact vêm do cache (Redis, 24h): o contact pode ter sido
+            # apagado/mesclado ou a inbox recriada. Resolve de novo, uma vez.
+            fresh = await self._refresh_conversation_ids(inbox_identifier, contact_identifier)
+            if fresh is None or fresh == (inbox_id, contact_id):
+                raise
+            body["inbox_id"], body["contact_id"] = fresh
+            data = await self._request(
+                "POST",
+                self._conversations_path,
+                json=body,
+            )
 
         payload = data.get("payload") or data
         conv_id = payload.get("id")
@@ -480,40 +803,68 @@ class ChatwootClient:
             incident_id=message.incident_id,
             media_url=message.media_url,
         )
-        if not local_path or not local_path.exists():
+        opened: Optional[tuple[BinaryIO, int]] = None
+        if local_path:
+            try:
+                opened = await asyncio.to_thread(_open_for_upload, local_path)
+            except OSError:
+                opened = None
+        if opened is None:
             logger.warning(
                 "[chatwoot] não encontrei arquivo local para media_url=%r (incident_id=%s). path=%r media_root=%r",
                 message.media_url,
                 message.incident_id,
                 str(local_path) if local_path else None,
-                str(self._media_root()),
+                str(self._media_root),
             )
             return False
 
+        f, file_size = opened
+        try:
+            return await self._post_attachment(conversation_id, message, local_path, f, file_size)
+        finally:
+            await asyncio.to_thread(f.close)
+
+    async def _post_attachment(
+        self,
+        conversation_id: int,
+        message: IncidentMessage,
+        local_path: Path,
+        f: BinaryIO,
+        file_size: int,
+    ) -> bool:
         file_type = self._chatwoot_file_type(message.media_type)
-        mime_type, _ = mimetypes.guess_type(local_path.name)
-        mime_type = mime_type or "application/octet-stream"
+        mime_type = _guess_mime(local_path.suffix.lower())
 
         content = self._format_author_content(message.author_name, message.content or "")
-        url_path = f"/api/v1/accounts/{self.account_id}/conversations/{conversation_id}/messages"
+        url_path = f"{self._conversations_path}/{conversation_id}/messages"
+
+        boundary = os.urandom(16).hex()
+        head, tail = _multipart_head_tail(
+            boundary,
+            {
+                "content": content,
+                "message_type": "outgoing",
+                "private": "true",
+                "file_type": file_type,
+                "content_attributes[sv_source]": "securityvision",
+                "source_id": f"sv-msg-{message.id}",
+            },
+            "attachments[]",
+            local_path.name,
+            mime_type,
+        )
 
         try:
-            with local_path.open("rb") as f:
-                files = {
-                    "attachments[]": (local_path.name, f, mime_type),
-                    "content": (None, content),
-                    "message_type": (None, "outgoing"),
-                    "private": (None, "true"),
-                    "file_type": (None, file_type),
-                    "content_attributes[sv_source]": (None, "securityvision"),
-                    "source_id": (None, f"sv-msg-{message.id}"),
-                }
-                resp = await self._get_http().post(
-                    f"{self.base_url}{url_path}",
-                    headers=self._headers(),
-                    files=files,
-                    timeout=60.0,  # attachments podem ser mais lentos
-                )
+            resp = await self._get_http().post(
+                f"{self.base_url}{url_path}",
+                content=_iter_multipart(head, f, tail),
+                headers={
+                    "Content-Type": f"multipart/form-data; boundary={boundary}",
+                    "Content-Length": str(len(head) + file_size + len(tail)),
+                },
+                timeout=60.0,  # attachments podem ser mais lentos
+            )
 
             if resp.status_code >= 400:
                 body_text = resp.text or ""
@@ -566,24 +917,24 @@ class ChatwootClient:
         if not incident_url and self.incident_base_url:
             incident_url = f"{self.incident_base_url}/{incident.id}"
 
-        summary_lines = [
-            f"[Incidente #{incident.id}] {incident.title}",
-            f"Status: {incident.status} | Severidade: {incident.severity}",
-            f"Tenant: {incident.tenant or '-'} | Dispositivo: {incident.device_id}",
-        ]
-        if incident.assigned_group:
-            summary_lines.append(
-                f"Grupo: {incident.assigned_group.name} (team_id={incident.assigned_group.chatwoot_team_id or '-'})"
+        group = incident.assigned_group
+        content = "\n".join(
+            filter(
+                None,
+                (
+                    f"[Incidente #{incident.id}] {incident.title}",
+                    f"Status: {incident.status} | Severidade: {incident.severity}",
+                    f"Tenant: {incident.tenant or '-'} | Dispositivo: {incident.device_id}",
+                    group and f"Grupo: {group.name} (team_id={group.chatwoot_team_id or '-'})",
+                    incident_url and f"Acesse: {incident_url}",
+                ),
             )
-        if incident_url:
-            summary_lines.append(f"Acesse: {incident_url}")
-
-        content = "\n".join(summary_lines)
+        )
 
         try:
             await self._request(
                 "POST",
-                f"/api/v1/accounts/{self.account_id}/conversations/{int(conversation_id)}/messages",
+                f"{self._conversations_path}/{int(conversation_id)}/messages",
                 json={
                     "content": content,
                     "message_type": "outgoing",
@@ -637,7 +988,7 @@ class ChatwootClient:
         try:
             await self._request(
                 "POST",
-                f"/api/v1/accounts/{self.account_id}/conversations/{int(conversation_id)}/messages",
+                f"{self._conversations_path}/{int(conversation_id)}/messages",
                 json={
                     "content": content,
                     "message_type": "outgoing",
@@ -651,3 +1002,45 @@ class ChatwootClient:
                 logger.exception("[chatwoot] erro ao enviar msg=%s incidente=%s", message.id, incident.id)
         except Exception:
             logger.exception("[chatwoot] erro ao enviar msg=%s incidente=%s", message.id, incident.id)
+
+
+    async def send_incident_timeline_messages(
+        self,
+        incident: Incident,
+        messages: list[IncidentMessage],
+        incident_url: Optional[str] = None,
+    ) -> None:
+        """
+        Envia um lote de mensagens da timeline: garante a conversa uma vez e
+        envia as mensagens uma a uma, na ordem recebida (o Chatwoot não tem
+        endpoint de lote e ordena a timeline pela chegada).
+        """
+        if not messages:
+            return
+
+        if not self.is_configured():
+            logger.info("[chatwoot] integração desabilitada. incidente=%s msgs=%s", incident.id, len(messages))
+            return
+
+        conversation_id = incident.chatwoot_conversation_id
+        if not conversation_id:
+            conversation_id = await self.send_incident_notification(incident, incident_url=incident_url)
+            if not conversation_id:
+                return
+
+        self._set_incident_conversation_id(incident, int(conversation_id))
+
+        for message in messages:
+            try:
+                await self.send_incident_timeline_message(incident, message, incident_url=incident_url)
+            except Exception:
+                logger.exception("[chatwoot] erro ao enviar msg=%s incidente=%s", message.id, incident.id)
+
+
+@lru_cache(maxsize=1)
+def get_chatwoot_client() -> ChatwootClient:
+    """
+    Client único do processo: compartilha conexões HTTP e os caches de
+    inbox/contact entre rotas e serviços.
+    """
+    return ChatwootClient()
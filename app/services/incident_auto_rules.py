@@ -3,7 +3,7 @@ from __future__ import annotations
 import logging
 from datetime import datetime, timezone
 from typing import Any, Dict, List, TYPE_CHECKING
-from app.services.chatwoot_client import ChatwootClient
+from app.services.chatwoot_client import get_chatwoot_client
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import settings
 
@@ -27,7 +27,7 @@ if TYPE_CHECKING:
 
 
 
-chatwoot_client = ChatwootClient()
+chatwoot_client = get_chatwoot_client()
 logger = logging.getLogger(__name__)
 
 async def apply_incident_rules_for_event(
@@ -237,14 +237,11 @@ async def apply_incident_rules_for_event(
             },
         )
 
-        if chatwoot_client.is_configured():
-            try:
-                await chatwoot_client.send_incident_timeline_message(incident, system_msg)
-            except Exception:
-                logger.exception("[chatwoot] erro ao enviar SYSTEM incidente=%s msg=%s", incident.id, system_msg.id)
+        # SYSTEM + MEDIA vão para o Chatwoot num lote só, no fim
+        timeline_msgs = [system_msg]
 
         # ------------------------
-        # MEDIA (snapshot, face etc.) + envia pro Chatwoot
+        # MEDIA (snapshot, face etc.)
         # ------------------------
         media_descriptors = extract_media_from_event(event)
 
@@ -281,15 +278,16 @@ async def apply_incident_rules_for_event(
                 },
             )
 
-            if chatwoot_client.is_configured():
-                try:
-                    await chatwoot_client.send_incident_timeline_message(incident, media_msg)
-                except Exception:
-                    logger.exception(
-                        "[chatwoot] erro ao enviar MEDIA incidente=%s msg=%s url=%r",
-                        incident.id,
-                        media_msg.id,
-                        media_url,
-                    )
+            timeline_msgs.append(media_msg)
+
+        if chatwoot_client.is_configured():
+            try:
+                await chatwoot_client.send_incident_timeline_messages(incident, timeline_msgs)
+            except Exception:
+                logger.exception(
+                    "[chatwoot] erro ao enviar timeline incidente=%s msgs=%s",
+                    incident.id,
+                    [m.id for m in timeline_msgs],
+                )
 
     return incidents
\ No newline at end of file
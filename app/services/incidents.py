@@ -1,7 +1,7 @@
 # app/services/incidents.py
 from __future__ import annotations
 import logging
-from app.services.chatwoot_client import ChatwootClient
+from app.services.chatwoot_client import get_chatwoot_client
 from app.services.webhook_dispatcher import dispatch_generic_webhook
 from datetime import datetime, timezone, timedelta
 from typing import Any, Dict, List, Optional
@@ -194,7 +194,7 @@ async def apply_incident_update(
 
         # 🔹 envia também pro Chatwoot
         try:
-            client = ChatwootClient()
+            client = get_chatwoot_client()
             await client.send_incident_timeline_message(
                 updated,
                 db_msg,
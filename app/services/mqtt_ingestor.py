@@ -1,11 +1,13 @@
 import asyncio
-import json
 import logging
 import re
+import time
 import unicodedata
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Any, Dict, Iterable, Optional, Tuple
+
+import orjson
 from app.crud import device as crud_device
 from asyncio_mqtt import Client, MqttError
 from sqlalchemy import select
@@ -20,6 +22,7 @@ from app.services.alert_engine import (
     fire_gateway_online_event,
     process_detection,
     close_stale_rtls_sessions,
+    touch_rtls_sessions,
 )
 from app.utils.mac import normalize_mac
 
@@ -33,17 +36,21 @@ def _decode_payload(payload: bytes) -> Optional[Any]:
     - dict (single record)
     - list (batch records)  ✅ (your gateway sends this)
     """
+    # orjson lê os bytes direto (valida UTF-8 junto); o decode só roda
+    # para montar a mensagem de log quando o payload é inválido
+    try:
+        return orjson.loads(payload)
+    except orjson.JSONDecodeError:
+        pass
+
     try:
         text = payload.decode("utf-8")
     except Exception:
         logger.warning("Failed to decode MQTT payload as UTF-8")
         return None
 
-    try:
-        return json.loads(text)
-    except json.JSONDecodeError:
-        logger.warning("Received non-JSON MQTT payload: %s", text)
-        return None
+    logger.warning("Received non-JSON MQTT payload: %s", text)
+    return None
 
 
 def _slug(s: str) -> str:
@@ -103,6 +110,17 @@ class MqttIngestor:
         # device_id -> is_online
         self._gateway_status_cache: Dict[int, bool] = {}
 
+        # Coalescência de detecções repetidas (ver _should_coalesce_detection)
+        self.detection_coalesce_seconds = float(
+            getattr(self.settings, "ALERT_DETECTION_COALESCE_SECONDS", 0) or 0
+        )
+        # (tag_id, device_id) -> monotonic do último process_detection
+        self._last_detection_at: Dict[Tuple[int, int], float] = {}
+        # tag_id -> device_id do último process_detection dessa TAG
+        self._last_device_by_tag: Dict[int, int] = {}
+        # (tag_id, device_id) -> (seen_at, collection_log_id) aguardando flush
+        self._pending_touches: Dict[Tuple[int, int], Tuple[datetime, Optional[int]]] = {}
+
     # ------------------------------------------------------------------
     # Topic parsing
     # ------------------------------------------------------------------
@@ -307,6 +325,80 @@ class MqttIngestor:
 
         return gw, []
 
+    # ------------------------------------------------------------------
+    # Detection coalescing
+    # ------------------------------------------------------------------
+
+    def _should_coalesce_detection(
+        self,
+        tag_id: int,
+        device_id: int,
+        seen_at: datetime,
+        collection_log_id: Optional[int],
+    ) -> bool:
+        """True if this detection only needs a last_seen_at touch.
+
+        A (tag, device) pair already run through process_detection less than
+        detection_coalesce_seconds ago is buffered for the batched flush
+        instead, as long as that device is still the last one the tag was
+        processed on. A tag moving to another gateway (including back to a
+        previous one, A -> B -> A) is always processed right away, since the
+        move closes the sessions on the old gateway.
+        """
+        window = self.detection_coalesce_seconds
+        if window <= 0:
+            return False
+
+        key = (tag_id, device_id)
+        mono = time.monotonic()
+        last = self._last_detection_at.get(key)
+        if (
+            last is not None
+            and mono - last < window
+            and self._last_device_by_tag.get(tag_id) == device_id
+        ):
+            self._pending_touches[key] = (seen_at, collection_log_id)
+            return True
+
+        self._last_detection_at[key] = mono
+        self._last_device_by_tag[tag_id] = device_id
+        # the full run supersedes any buffered touch for this pair
+        self._pending_touches.pop(key, None)
+        return False
+
+    async def _flush_coalesced_detections(self) -> None:
+        touches, self._pending_touches = self._pending_touches, {}
+
+        # forget pairs idle for longer than the window (bounded memory)
+        cutoff = time.monotonic() - self.detection_coalesce_seconds
+        for key in [k for k, t in self._last_detection_at.items() if t < cutoff]:
+            del self._last_detection_at[key]
+            tag_id, device_id = key
+            if self._last_device_by_tag.get(tag_id) == device_id:
+                del self._last_device_by_tag[tag_id]
+
+        if not touches:
+            return
+
+        async with self.session_factory() as db:
+            touched = await touch_rtls_sessions(db, touches)
+        logger.debug(
+            "Coalesced detections flushed: pairs=%s sessions=%s",
+            len(touches),
+            touched,
+        )
+
+    async def _coalesce_flush_loop(self) -> None:
+        interval = self.detection_coalesce_seconds
+        logger.info("Starting detection coalescing: window=%ss", interval)
+
+        while not self._stopped:
+            await asyncio.sleep(interval)
+            try:
+                await self._flush_coalesced_detections()
+            except Exception as e:
+                logger.exception("Error flushing coalesced detections: %s", e)
+
     # ------------------------------------------------------------------
     # Main message handler
     # ------------------------------------------------------------------
@@ -375,12 +467,12 @@ class MqttIngestor:
             from app.crud import tag as crud_tag
 
             for tag_mac, rssi, rec in detections:
-                db_tag = await crud_tag.get_by_mac(db, mac_address=tag_mac)
+                db_tag = await crud_tag.get_by_mac_with_person(db, mac_address=tag_mac)
                 if not db_tag:
                     logger.debug("Ignoring detection for unknown tag MAC: %s", tag_mac)
                     continue
 
-                raw_payload = json.dumps(
+                raw_payload = orjson.dumps(
                     {
                         "topic": topic,
                         "tenant": ctx.tenant,
@@ -389,8 +481,7 @@ class MqttIngestor:
                         "gateway_mac": gw_mac,
                         "record": rec,
                     },
-                    ensure_ascii=False,
-                )
+                ).decode("utf-8")
 
                 log_in = CollectionLogCreate(
                     device_id=db_device.id,
@@ -399,6 +490,17 @@ class MqttIngestor:
                     raw_payload=raw_payload,
                 )
                 created_log = await crud_collection_log.create(db, log_in)
+                created_log_id = getattr(created_log, "id", None)
+
+                # Repetição da mesma TAG no mesmo gateway dentro da janela:
+                # só entra no flush em lote de last_seen_at
+                if self._should_coalesce_detection(
+                    db_tag.id,
+                    db_device.id,
+                    now.replace(tzinfo=timezone.utc),
+                    created_log_id,
+                ):
+                    continue
 
                 # Alert engine (não pode quebrar a coleta)
                 try:
@@ -406,7 +508,7 @@ class MqttIngestor:
                         db,
                         db_device,
                         db_tag,
-                        collection_log_id=getattr(created_log, "id", None),
+                        collection_log_id=created_log_id,
                     )
                 except Exception:
                     logger.exception(
@@ -588,12 +690,25 @@ class MqttIngestor:
                     )
                 )
 
+            if self.detection_coalesce_seconds > 0:
+                tasks.append(
+                    asyncio.create_task(
+                        self._coalesce_flush_loop(),
+                        name="detection_coalesce_flush",
+                    )
+                )
+
             await asyncio.gather(*tasks)
         except asyncio.CancelledError:
             self._stopped = True
             for t in tasks:
                 t.cancel()
             await asyncio.gather(*tasks, return_exceptions=True)
+            # não perde os últimos last_seen_at coalescidos
+            try:
+                await self._flush_coalesced_detections()
+            except Exception:
+                logger.exception("Error flushing coalesced detections on shutdown")
             raise
         finally:
             self._stopped = True
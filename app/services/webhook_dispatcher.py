@@ -2,14 +2,16 @@
 
 from __future__ import annotations
 
+import asyncio
 import hashlib
 import hmac
-import json
 import logging
+import time
 from datetime import datetime, timezone
-from typing import Iterable, List, Dict, Any
+from typing import Iterable, List, Dict, Any, NamedTuple, Optional, Tuple
 
 import httpx
+import orjson
 from sqlalchemy import select, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -30,6 +32,23 @@ def _build_envelope(event_type: str, payload: Dict[str, Any]) -> Dict[str, Any]:
   }
 
 
+# event_type -> até quando (monotonic) sabemos que não há assinatura ativa.
+# Na maioria das instalações não há webhooks: evita uma consulta por evento.
+# As rotas de webhooks chamam invalidate_subscriptions_cache() ao alterar.
+_NO_SUBSCRIBERS_TTL_SECONDS = 30.0
+_no_subscribers_until: Dict[str, float] = {}
+_subscriptions_epoch = 0
+
+
+def invalidate_subscriptions_cache() -> None:
+  """
+  Descarta o cache de "sem assinantes" (usar após alterar WebhookSubscription).
+  """
+  global _subscriptions_epoch
+  _subscriptions_epoch += 1
+  _no_subscribers_until.clear()
+
+
 async def _load_subscriptions(
   db: AsyncSession,
   event_type: str,
@@ -38,7 +57,15 @@ async def _load_subscriptions(
   Busca os webhooks ativos cujo event_type_filter é:
     - NULL  -> recebe todos os eventos
     - IGUAL -> recebe apenas esse tipo de evento
+
+  Se o tipo não tinha nenhuma assinatura há menos de
+  _NO_SUBSCRIBERS_TTL_SECONDS, devolve [] sem consultar o banco.
   """
+  until = _no_subscribers_until.get(event_type)
+  if until is not None and until > time.monotonic():
+    return []
+
+  epoch = _subscriptions_epoch
   stmt = (
     select(WebhookSubscription)
     .where(WebhookSubscription.is_active.is_(True))
@@ -51,57 +78,189 @@ async def _load_subscriptions(
   )
 
   res = await db.execute(stmt)
-  subs = list(res.scalars().all())
+  subs = res.scalars().all()
+  if not subs and epoch == _subscriptions_epoch:
+    _no_subscribers_until[event_type] = time.monotonic() + _NO_SUBSCRIBERS_TTL_SECONDS
   return subs
 
 
+async def _post_to_subscriber(
+  client: httpx.AsyncClient,
+  sub: WebhookSubscription,
+  event_type: str,
+  body: bytes,
+) -> None:
+  headers = {
+    "Content-Type": "application/json",
+    "X-SV-Webhook-Id": str(sub.id),
+    "X-SV-Event-Type": event_type,
+  }
+
+  # Assinatura opcional com secret_token
+  if sub.secret_token:
+    signature = hmac.new(
+      sub.secret_token.encode("utf-8"),
+      body,
+      hashlib.sha256,
+    ).hexdigest()
+    headers["X-SV-Signature"] = f"sha256={signature}"
+
+  try:
+    resp = await client.post(sub.url, content=body, headers=headers)
+    if resp.status_code >= 400:
+      logger.warning(
+        "Webhook %s (%s) respondeu status %s",
+        sub.id,
+        sub.url,
+        resp.status_code,
+      )
+  except Exception as exc:  # noqa: BLE001
+    logger.exception(
+      "Falha ao enviar webhook %s (%s): %s",
+      sub.id,
+      sub.url,
+      exc,
+    )
+
+
 async def _send_to_subscribers(
   subs: Iterable[WebhookSubscription],
   envelope: Dict[str, Any],
+  client: Optional[httpx.AsyncClient] = None,
 ) -> None:
   """
-  Envia o envelope JSON para cada assinatura.
+  Envia o envelope JSON para cada assinatura (POSTs em paralelo).
   Erros de rede NÃO derrubam a requisição da API – apenas logam.
+
+  ``client`` é o cliente compartilhado dos workers (reaproveita conexões);
+  sem ele, abre um cliente só para este envio.
   """
   subs = list(subs)
   if not subs:
     return
 
-  body = json.dumps(envelope, ensure_ascii=False).encode("utf-8")
-
-  async with httpx.AsyncClient(timeout=10) as client:
-    for sub in subs:
-      headers = {
-        "Content-Type": "application/json",
-        "X-SV-Webhook-Id": str(sub.id),
-        "X-SV-Event-Type": envelope["event_type"],
-      }
-
-      # Assinatura opcional com secret_token
-      if sub.secret_token:
-        signature = hmac.new(
-          sub.secret_token.encode("utf-8"),
-          body,
-          hashlib.sha256,
-        ).hexdigest()
-        headers["X-SV-Signature"] = f"sha256={signature}"
+  # OPT_NON_STR_KEYS: payloads de CRUD podem ter chaves int (json.dumps aceitava)
+  body = orjson.dumps(envelope, option=orjson.OPT_NON_STR_KEYS)
+  event_type = envelope["event_type"]
+
+  if client is None:
+    async with httpx.AsyncClient(timeout=10) as own_client:
+      await asyncio.gather(
+        *(_post_to_subscriber(own_client, sub, event_type, body) for sub in subs)
+      )
+    return
+
+  await asyncio.gather(
+    *(_post_to_subscriber(client, sub, event_type, body) for sub in subs)
+  )
+
+
+# ---------------------------------------------------------------------------
+# Fila de envio em background (webhooks de AlertEvent)
+# ---------------------------------------------------------------------------
+
+class _WebhookTarget(NamedTuple):
+  """
+  Cópia dos campos da assinatura usados no envio, para a fila não segurar
+  instâncias ORM de uma sessão que já pode ter sido fechada.
+  """
+  id: int
+  url: str
+  secret_token: Optional[str]
+
+
+# Uma fila por worker, escolhida pelo id do alert_event: os webhooks do
+# mesmo evento (aberto/atualizado/fechado) saem sempre do mesmo worker, na
+# ordem em que foram gerados. Sem workers (scripts, testes) _send_or_enqueue
+# envia inline, como antes.
+_send_queues: List[asyncio.Queue[Tuple[List[_WebhookTarget], Dict[str, Any]]]] = []
+_send_workers: List[asyncio.Task] = []
+# Cliente HTTP dos workers: keep-alive/TLS reaproveitados entre envios
+_send_client: Optional[httpx.AsyncClient] = None
+
+
+async def _send_worker(queue: asyncio.Queue, client: httpx.AsyncClient) -> None:
+  while True:
+    targets, envelope = await queue.get()
+    try:
+      await _send_to_subscribers(targets, envelope, client)
+    except Exception:  # noqa: BLE001
+      logger.exception("Falha no worker de webhooks (%s)", envelope.get("event_type"))
+    finally:
+      queue.task_done()
+
+
+def start_webhook_workers(workers: int, *, maxsize: int = 10000) -> None:
+  """
+  Inicia os workers que fazem os POSTs de webhook fora do caminho de
+  detecção (chamado no startup do app), cada um com a sua fila de até
+  ``maxsize`` envios. Fila cheia faz o produtor esperar.
+  """
+  global _send_client
+  if _send_queues or workers <= 0:
+    return
+
+  _send_client = httpx.AsyncClient(timeout=10)
+  for i in range(workers):
+    queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+    _send_queues.append(queue)
+    _send_workers.append(
+      asyncio.create_task(
+        _send_worker(queue, _send_client),
+        name=f"webhook_worker_{i}",
+      )
+    )
+
+
+async def stop_webhook_workers(*, drain_timeout: float = 10.0) -> None:
+  """
+  Para os workers (shutdown). Tenta esvaziar a fila por até
+  ``drain_timeout`` segundos; novos envios voltam a ser inline.
+  """
+  global _send_client
+  queues = list(_send_queues)
+  if not queues:
+    return
+  _send_queues.clear()
+
+  try:
+    await asyncio.wait_for(
+      asyncio.gather(*(q.join() for q in queues)),
+      timeout=drain_timeout,
+    )
+  except asyncio.TimeoutError:
+    logger.warning(
+      "Encerrando com %s webhooks pendentes na fila",
+      sum(q.qsize() for q in queues),
+    )
+
+  for task in _send_workers:
+    task.cancel()
+  await asyncio.gather(*_send_workers, return_exceptions=True)
+  _send_workers.clear()
+
+  client, _send_client = _send_client, None
+  if client is not None:
+    await client.aclose()
 
-      try:
-        resp = await client.post(sub.url, content=body, headers=headers)
-        if resp.status_code >= 400:
-          logger.warning(
-            "Webhook %s (%s) respondeu status %s",
-            sub.id,
-            sub.url,
-            resp.status_code,
-          )
-      except Exception as exc:  # noqa: BLE001
-        logger.exception(
-          "Falha ao enviar webhook %s (%s): %s",
-          sub.id,
-          sub.url,
-          exc,
-        )
+
+async def _send_or_enqueue(
+  subs: Iterable[WebhookSubscription],
+  envelope: Dict[str, Any],
+  key: Any,
+) -> None:
+  """
+  Com workers ativos, só enfileira o envio na fila do worker de ``key``
+  (id do alert_event); senão envia inline.
+  """
+  if not _send_queues:
+    await _send_to_subscribers(subs, envelope)
+    return
+
+  targets = [_WebhookTarget(s.id, s.url, s.secret_token) for s in subs]
+  if targets:
+    queue = _send_queues[hash(key) % len(_send_queues)]
+    await queue.put((targets, envelope))
 
 
 # ---------------------------------------------------------------------------
@@ -122,8 +281,10 @@ async def dispatch_generic_webhook(
   event_type_filter da assinatura deve bater com event_type,
   ou estar NULL para receber tudo.
   """
-  envelope = _build_envelope(event_type, payload)
   subs = await _load_subscriptions(db, event_type)
+  if not subs:
+    return
+  envelope = _build_envelope(event_type, payload)
   await _send_to_subscribers(subs, envelope)
 
 
@@ -131,24 +292,19 @@ async def dispatch_generic_webhook(
 # 2) Uso específico do AlertEngine (AlertEvent)
 # ---------------------------------------------------------------------------
 
-async def dispatch_webhooks(
-  db: AsyncSession,
-  alert_event: AlertEvent,
-) -> None:
+def _alert_event_payload(alert_event: AlertEvent) -> Dict[str, Any]:
   """
-  Compatível com AlertEngine: recebe um AlertEvent e dispara webhooks
-  baseados em alert_event.event_type (FORBIDDEN_SECTOR, DWELL_TIME,
-  GATEWAY_OFFLINE, GATEWAY_ONLINE, etc.).
+  Payload do webhook de um AlertEvent: o JSON salvo no banco + colunas.
   """
   # Tenta aproveitar o payload JSON já salvo no banco
   base_payload: Dict[str, Any] = {}
   if alert_event.payload:
     try:
-      base_payload = json.loads(alert_event.payload)
-    except json.JSONDecodeError:
+      base_payload = orjson.loads(alert_event.payload)
+    except orjson.JSONDecodeError:
       base_payload = {"raw_payload": alert_event.payload}
 
-  payload: Dict[str, Any] = {
+  return {
     **base_payload,
     "alert_event_id": alert_event.id,
     "event_type": alert_event.event_type,
@@ -172,6 +328,80 @@ async def dispatch_webhooks(
     "is_open": alert_event.is_open,
   }
 
-  envelope = _build_envelope(alert_event.event_type, payload)
+
+async def dispatch_webhooks(
+  db: AsyncSession,
+  alert_event: AlertEvent,
+) -> None:
+  """
+  Compatível com AlertEngine: recebe um AlertEvent e dispara webhooks
+  baseados em alert_event.event_type (FORBIDDEN_SECTOR, DWELL_TIME,
+  GATEWAY_OFFLINE, GATEWAY_ONLINE, etc.).
+  """
   subs = await _load_subscriptions(db, alert_event.event_type)
-  await _send_to_subscribers(subs, envelope)
+  if not subs:
+    return
+  payload = _alert_event_payload(alert_event)
+  envelope = _build_envelope(alert_event.event_type, payload)
+  await _send_or_enqueue(subs, envelope, alert_event.id)
+
+
+async def dispatch_webhooks_many(
+  db: AsyncSession,
+  alert_events: Iterable[AlertEvent],
+) -> None:
+  """
+  Dispara webhooks de vários AlertEvents de uma vez.
+
+  As assinaturas são carregadas uma vez por event_type, em sequência (a
+  AsyncSession não aceita consultas concorrentes). Com workers, os envios
+  são enfileirados na ordem dos eventos; sem workers, os POSTs rodam em
+  paralelo via asyncio.gather. Falha de um envio não afeta os outros.
+  """
+  events = list(alert_events)
+  if not events:
+    return
+
+  subs_by_type: Dict[str, List[WebhookSubscription]] = {}
+  for ev in events:
+    if ev.event_type not in subs_by_type:
+      subs_by_type[ev.event_type] = await _load_subscriptions(db, ev.event_type)
+
+  pending = [ev for ev in events if subs_by_type[ev.event_type]]
+  if not pending:
+    return
+
+  if _send_queues:
+    # Enfileira em sequência para preservar a ordem dos eventos
+    for ev in pending:
+      try:
+        await _send_or_enqueue(
+          subs_by_type[ev.event_type],
+          _build_envelope(ev.event_type, _alert_event_payload(ev)),
+          ev.id,
+        )
+      except Exception as exc:  # noqa: BLE001
+        logger.error(
+          "Falha ao disparar webhooks do alert_event %s: %s",
+          ev.id,
+          exc,
+        )
+    return
+
+  results = await asyncio.gather(
+    *(
+      _send_to_subscribers(
+        subs_by_type[ev.event_type],
+        _build_envelope(ev.event_type, _alert_event_payload(ev)),
+      )
+      for ev in pending
+    ),
+    return_exceptions=True,
+  )
+  for ev, result in zip(pending, results):
+    if isinstance(result, Exception):
+      logger.error(
+        "Falha ao disparar webhooks do alert_event %s: %s",
+        ev.id,
+        result,
+      )
@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.db.session import engine, init_db
+
+
+@pytest.fixture
+async def database():
+    """Banco de teste (Postgres) com as tabelas criadas."""
+    # conexões do asyncpg ficam presas ao loop do teste que as abriu: o
+    # teste começa com pool novo e descarta o seu no fim
+    await engine.dispose(close=False)
+    await init_db()
+    yield
+    await engine.dispose()
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.rowcount = len(self.rows)
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+    def one(self):
+        return self.rows[0]
+
+
+class FakeSession:
+    """
+    AsyncSession falsa: guarda os statements executados e devolve ``rows``
+    em qualquer consulta. Serve também de factory (``lambda: session``) e de
+    conexão (``await session.connection()``).
+    """
+
+    def __init__(self):
+        self.dialect = SimpleNamespace(driver="fake")
+        self.rows = []
+        self.statements = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def connection(self):
+        return self
+
+    async def execute(self, stmt, params=None):
+        self.statements.append(stmt)
+        return FakeResult(self.rows)
+
+    async def scalars(self, stmt, params=None):
+        self.statements.append(stmt)
+        return FakeResult(self.rows)
+
+    async def commit(self):
+        self.commits += 1
+
+    async def rollback(self):
+        self.rollbacks += 1
+
+
+@pytest.fixture
+def fake_session():
+    return FakeSession()
+
+
+@pytest.fixture
+def fake_session_factory():
+    """Factory de FakeSession: cada chamada abre uma nova, guardada em ``.sessions``."""
+
+    def factory():
+        session = FakeSession()
+        factory.sessions.append(session)
+        return session
+
+    factory.sessions = []
+    return factory
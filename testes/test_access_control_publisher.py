@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import orjson
+import pytest
+
+from app.core.config import settings
+from app.services import access_control_publisher as publisher
+
+
+def _device_user():
+    return SimpleNamespace(device_id=1, person_id=2, device_user_id="42", status="ACTIVE")
+
+
+@pytest.mark.asyncio
+async def test_publish_returns_none_when_mqtt_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "ACCESS_CONTROL_MQTT_ENABLED", False)
+    raw = AsyncMock()
+    monkeypatch.setattr(publisher, "_mqtt_publish_raw", raw)
+
+    topic, envelope = await publisher.publish_access_control_device_user_created(_device_user())
+
+    assert topic.endswith("created")
+    assert envelope is None
+    raw.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_publish_returns_published_envelope(monkeypatch):
+    monkeypatch.setattr(settings, "ACCESS_CONTROL_MQTT_ENABLED", True)
+    monkeypatch.setattr(settings, "rtls_mqtt_enabled", True)
+    raw = AsyncMock()
+    monkeypatch.setattr(publisher, "_mqtt_publish_raw", raw)
+
+    topic, envelope = await publisher.publish_access_control_device_user_created(_device_user())
+
+    raw.assert_awaited_once()
+    sent_topic, body = raw.await_args.args
+    assert sent_topic == topic
+    assert envelope["payload"] == {
+        "device_id": 1,
+        "person_id": 2,
+        "deviceUserId": "42",
+        "status": "ACTIVE",
+    }
+    # o que foi publicado é o mesmo envelope devolvido
+    assert orjson.loads(body) == envelope
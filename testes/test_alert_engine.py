@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock
+
+import orjson
+import pytest
+from sqlalchemy import delete, text
+
+from app.db.session import AsyncSessionLocal
+from app.models.alert_event import AlertEvent
+from app.models.tag import Tag
+from app.services import alert_engine
+
+_TAG_MAC = "AA:BB:CC:01:23:09"
+
+
+@pytest.mark.asyncio
+async def test_stale_close_writes_utc_isoformat_timestamps(database, monkeypatch):
+    monkeypatch.setattr(alert_engine, "dispatch_webhooks_many", AsyncMock())
+    started_at = datetime(2025, 3, 1, 12, 0, 0, 123456, tzinfo=timezone.utc)
+    last_seen_at = started_at + timedelta(seconds=90.5)
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Tag).where(Tag.mac_address == _TAG_MAC))
+        tag = Tag(mac_address=_TAG_MAC)
+        db.add(tag)
+        await db.flush()
+        event = AlertEvent(
+            event_type=alert_engine.FORBIDDEN_SECTOR,
+            tag_id=tag.id,
+            started_at=started_at,
+            last_seen_at=last_seen_at,
+            is_open=True,
+            payload=orjson.dumps({"rule_name": "Cofre"}).decode(),
+        )
+        db.add(event)
+        await db.commit()
+        tag_id, event_id = tag.id, event.id
+
+    try:
+        async with AsyncSessionLocal() as db:
+            # fuso da sessão diferente de UTC: o payload não pode depender dele
+            await db.execute(text("SET LOCAL TIME ZONE 'America/Sao_Paulo'"))
+            closed = await alert_engine.close_stale_rtls_sessions(
+                db,
+                now=last_seen_at + timedelta(hours=1),
+                ttl_seconds=60,
+                tag_id=tag_id,
+            )
+            assert closed == 1
+
+            event = await db.get(AlertEvent, event_id)
+            payload = orjson.loads(event.payload)
+
+        # mesmo formato do isoformat() do Python nos fechamentos pela aplicação
+        assert payload["started_at"] == started_at.isoformat()
+        assert payload["ended_at"] == last_seen_at.isoformat()
+        assert payload["last_seen_at"] == last_seen_at.isoformat()
+        assert payload["duration_seconds"] == 90.5
+        assert payload["is_open"] is False
+        assert payload["close_reason"] == "stale_ttl_60s"
+        assert payload["rule_name"] == "Cofre"
+    finally:
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(AlertEvent).where(AlertEvent.id == event_id))
+            await db.execute(delete(Tag).where(Tag.id == tag_id))
+            await db.commit()
@@ -0,0 +1,238 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import delete, select
+
+from app.db.session import AsyncSessionLocal
+from app.main import app
+from app.models.alert_event import AlertEvent
+from app.models.device import Device
+from app.models.tag import Tag
+from app.services import alert_engine
+
+GW_A = SimpleNamespace(id=1, name="GW A")
+GW_B = SimpleNamespace(id=2, name="GW B")
+TAG = SimpleNamespace(id=7, code="TAG7", mac_address=None, person_id=None)
+RULE = alert_engine.RuleInfo(
+    id=11,
+    rule_type=alert_engine.FORBIDDEN_SECTOR,
+    name="Cofre",
+    group_id=None,
+    max_dwell_seconds=None,
+)
+
+
+@pytest.fixture(autouse=True)
+def _fresh_caches(monkeypatch):
+    monkeypatch.setattr(alert_engine, "_rules_cache", {})
+    monkeypatch.setattr(alert_engine, "_rules_cache_epoch", 0)
+    monkeypatch.setattr(alert_engine, "_devices_with_rules", None)
+    monkeypatch.setattr(alert_engine, "_open_sessions_cache", {})
+
+
+def _patch_detection_steps(monkeypatch, *, rules):
+    steps = SimpleNamespace(
+        close_stale=AsyncMock(),
+        person=AsyncMock(return_value=(None, [])),
+        rules=AsyncMock(return_value=rules),
+        close_moved=AsyncMock(return_value=[]),
+        open_sessions=AsyncMock(return_value={}),
+        fire=AsyncMock(
+            return_value=SimpleNamespace(id=100, started_at=datetime.now(timezone.utc))
+        ),
+        dispatch=AsyncMock(),
+    )
+    monkeypatch.setattr(alert_engine, "_close_stale_sessions_for_tag", steps.close_stale)
+    monkeypatch.setattr(alert_engine, "_get_person_with_groups", steps.person)
+    monkeypatch.setattr(alert_engine, "_load_applicable_rules", steps.rules)
+    monkeypatch.setattr(alert_engine, "_close_moved_sessions", steps.close_moved)
+    monkeypatch.setattr(alert_engine, "_load_open_sessions", steps.open_sessions)
+    monkeypatch.setattr(alert_engine, "_fire_forbidden_sector", steps.fire)
+    monkeypatch.setattr(alert_engine, "dispatch_webhooks_many", steps.dispatch)
+    return steps
+
+
+# ---------------------------------------------------------------------------
+# Atalhos sem regra
+# ---------------------------------------------------------------------------
+
+@pytest.mark.asyncio
+async def test_device_without_rules_skips_session_work(monkeypatch, fake_session):
+    steps = _patch_detection_steps(monkeypatch, rules=[RULE])
+    db = fake_session
+    # única consulta que chega ao banco: devices com regra
+    db.rows = [GW_B.id]
+
+    await alert_engine.process_detection(db, GW_A, TAG)
+    await alert_engine.process_detection(db, GW_A, TAG)
+
+    # conjunto de devices com regra consultado uma vez e depois em cache
+    assert len(db.statements) == 1
+    for step in ("close_stale", "person", "rules", "close_moved", "open_sessions", "fire", "dispatch"):
+        getattr(steps, step).assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_no_applicable_rules_skips_session_work(monkeypatch, fake_session):
+    steps = _patch_detection_steps(monkeypatch, rules=[])
+    db = fake_session
+    db.rows = [GW_A.id]
+
+    await alert_engine.process_detection(db, GW_A, TAG)
+
+    steps.rules.assert_awaited_once()
+    steps.close_moved.assert_not_awaited()
+    steps.open_sessions.assert_not_awaited()
+    steps.fire.assert_not_awaited()
+    steps.dispatch.assert_not_awaited()
+    assert db.commits == 0
+    assert alert_engine._open_sessions_cache == {}
+
+
+# ---------------------------------------------------------------------------
+# Cache de sessões abertas
+# ---------------------------------------------------------------------------
+
+@pytest.mark.asyncio
+async def test_open_sessions_cache_skips_reload_while_tag_stays_on_gateway(monkeypatch, fake_session):
+    steps = _patch_detection_steps(monkeypatch, rules=[RULE])
+    db = fake_session
+    db.rows = [GW_A.id, GW_B.id]
+
+    await alert_engine.process_detection(db, GW_A, TAG)
+    steps.close_moved.assert_awaited_once()
+    assert steps.fire.await_args.kwargs["existing"] is None
+
+    # mesmo gateway, mesmas regras: nada a fechar nem a consultar
+    await alert_engine.process_detection(db, GW_A, TAG)
+    steps.close_moved.assert_awaited_once()
+    assert steps.fire.await_args.kwargs["existing"].id == 100
+
+    # trocou de gateway: caminho completo de novo
+    await alert_engine.process_detection(db, GW_B, TAG)
+    assert steps.close_moved.await_count == 2
+    assert steps.fire.await_args.kwargs["existing"] is None
+
+
+# ---------------------------------------------------------------------------
+# invalidate_rules_cache
+# ---------------------------------------------------------------------------
+
+@pytest.mark.asyncio
+async def test_invalidate_rules_cache_reloads_rules_and_devices(monkeypatch, fake_session):
+    query = AsyncMock(return_value=[RULE])
+    monkeypatch.setattr(alert_engine, "_query_applicable_rules", query)
+    db = fake_session
+    db.rows = [GW_A.id]
+
+    for _ in range(2):
+        assert await alert_engine._load_applicable_rules(db, device_id=GW_A.id, group_ids=[]) == [RULE]
+        assert await alert_engine._device_has_rules(db, GW_A.id) is True
+    assert query.await_count == 1
+    assert len(db.statements) == 1
+
+    alert_engine.invalidate_rules_cache()
+    query.return_value = []
+    db.rows = []
+
+    assert await alert_engine._load_applicable_rules(db, device_id=GW_A.id, group_ids=[]) == []
+    assert await alert_engine._device_has_rules(db, GW_A.id) is False
+    assert query.await_count == 2
+    assert len(db.statements) == 2
+
+
+@pytest.mark.asyncio
+async def test_rules_changed_during_query_are_not_cached(monkeypatch):
+    async def query(db, *, device_id, group_ids):
+        # regra alterada pela rota enquanto a consulta estava em andamento
+        alert_engine.invalidate_rules_cache()
+        return [RULE]
+
+    monkeypatch.setattr(alert_engine, "_query_applicable_rules", query)
+
+    assert await alert_engine._load_applicable_rules(None, device_id=GW_A.id, group_ids=[]) == [RULE]
+    assert alert_engine._rules_cache == {}
+
+
+# ---------------------------------------------------------------------------
+# Banco real: regra criada/removida pela rota vale na hora no processo
+# ---------------------------------------------------------------------------
+
+_GW_MAC = "AA:BB:CC:00:24:15"
+_TAG_MAC = "AA:BB:CC:01:24:15"
+
+
+async def _open_events(device_id: int):
+    async with AsyncSessionLocal() as db:
+        return (
+            await db.execute(
+                select(AlertEvent).where(
+                    AlertEvent.device_id == device_id,
+                    AlertEvent.event_type == alert_engine.FORBIDDEN_SECTOR,
+                    AlertEvent.is_open.is_(True),
+                )
+            )
+        ).scalars().all()
+
+
+async def _detect(device_id: int, tag_id: int) -> None:
+    async with AsyncSessionLocal() as db:
+        device = await db.get(Device, device_id)
+        tag = await db.get(Tag, tag_id)
+        await alert_engine.process_detection(db, device, tag)
+
+
+@pytest.mark.asyncio
+async def test_rule_created_and_deleted_by_route_applies_immediately(database, monkeypatch):
+    monkeypatch.setattr(alert_engine, "dispatch_webhooks_many", AsyncMock())
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Device).where(Device.mac_address == _GW_MAC))
+        await db.execute(delete(Tag).where(Tag.mac_address == _TAG_MAC))
+        device = Device(name="GW cache teste", type="BLE_GATEWAY", mac_address=_GW_MAC)
+        tag = Tag(mac_address=_TAG_MAC, label="TAG cache teste")
+        db.add_all([device, tag])
+        await db.commit()
+        device_id, tag_id = device.id, tag.id
+
+    try:
+        # aquece os caches com "device sem regra" (TTL de 30s)
+        await _detect(device_id, tag_id)
+        assert alert_engine._devices_with_rules is not None
+        assert await _open_events(device_id) == []
+
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            rr = await ac.post(
+                "/api/v1/alert-rules/",
+                json={
+                    "name": "Setor proibido cache",
+                    "rule_type": alert_engine.FORBIDDEN_SECTOR,
+                    "device_id": device_id,
+                    "is_active": True,
+                },
+            )
+            assert rr.status_code == 201, rr.text
+            rule_id = rr.json()["id"]
+
+            # sem esperar TTL: a próxima detecção já dispara
+            await _detect(device_id, tag_id)
+            (event,) = await _open_events(device_id)
+            assert event.rule_id == rule_id
+            assert alert_engine._rules_cache
+
+            rdel = await ac.delete(f"/api/v1/alert-rules/{rule_id}")
+            assert rdel.status_code == 204
+
+        assert alert_engine._rules_cache == {}
+        async with AsyncSessionLocal() as db:
+            assert await alert_engine._device_has_rules(db, device_id) is False
+            assert await alert_engine._load_applicable_rules(db, device_id=device_id, group_ids=[]) == []
+    finally:
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(AlertEvent).where(AlertEvent.device_id == device_id))
+            await db.execute(delete(Device).where(Device.id == device_id))
+            await db.execute(delete(Tag).where(Tag.id == tag_id))
+            await db.commit()
@@ -0,0 +1,233 @@
+import importlib.util
+import re
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import orjson
+import pytest
+from sqlalchemy import delete, select, text
+from sqlalchemy.dialects import postgresql
+
+from app.db.session import AsyncSessionLocal
+from app.models.alert_event import AlertEvent
+from app.models.device import Device
+from app.schemas.alert_event import AlertEventCreate
+from app.services import alert_engine
+
+_VERSIONS = Path(__file__).resolve().parents[1] / "alembic" / "versions"
+
+
+def _norm(sql: str) -> str:
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+def _index_where(name: str) -> str:
+    index = next(ix for ix in AlertEvent.__table__.indexes if ix.name == name)
+    return _norm(str(index.dialect_options["postgresql"]["where"]))
+
+
+class _RecordingOp:
+    def __init__(self):
+        self.calls = []
+
+    def execute(self, sql):
+        self.calls.append(("execute", _norm(str(sql))))
+
+    def create_index(self, name, table, columns, **kw):
+        self.calls.append(("create_index", name, kw))
+
+
+def _run_upgrade(filename: str) -> list:
+    spec = importlib.util.spec_from_file_location(filename, _VERSIONS / filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    op = _RecordingOp()
+    module.op = op
+    module.upgrade()
+    return op.calls
+
+
+# ---------------------------------------------------------------------------
+# Migrations: dedupe antes do índice único
+# ---------------------------------------------------------------------------
+
+@pytest.mark.parametrize(
+    "filename, index_name",
+    [
+        ("20250328120000_add_alert_events_open_gateway_offline_uq.py", "ix_alert_events_open_gateway_offline"),
+        ("20250330120000_add_alert_events_open_rtls_session_uq.py", "ix_alert_events_open_rtls_session"),
+    ],
+)
+def test_migration_dedupes_open_sessions_before_unique_index(filename, index_name):
+    calls = _run_upgrade(filename)
+
+    assert [c[0] for c in calls] == ["execute", "create_index"]
+    dedupe_sql = calls[0][1]
+    _, created, kw = calls[1]
+    assert created == index_name
+    assert kw["unique"] is True
+
+    # o UPDATE fecha as duplicadas do mesmo conjunto que o índice cobre
+    predicate = _norm(str(kw["postgresql_where"]))
+    assert predicate == _index_where(index_name)
+    assert dedupe_sql.startswith("UPDATE alert_events AS ae SET is_open = false, ended_at = ae.last_seen_at")
+    assert "dup.rn > 1" in dedupe_sql
+
+
+# ---------------------------------------------------------------------------
+# ON CONFLICT: alvo tem de bater com o índice parcial
+# ---------------------------------------------------------------------------
+
+def _compiled(db) -> str:
+    (stmt,) = db.statements
+    return _norm(str(stmt.compile(dialect=postgresql.asyncpg.dialect())))
+
+
+@pytest.mark.asyncio
+async def test_gateway_offline_upsert_targets_partial_unique_index(monkeypatch, fake_session):
+    monkeypatch.setattr(alert_engine, "_get_location_info", AsyncMock(return_value=alert_engine.LocationInfo()))
+    monkeypatch.setattr(alert_engine, "dispatch_webhooks", AsyncMock())
+    fake_session.rows = [SimpleNamespace(id=1, event_type=alert_engine.GATEWAY_OFFLINE)]
+    device = SimpleNamespace(id=99, name="GW", mac_address=None, last_seen_at=None)
+
+    await alert_engine.handle_gateway_status_transition(fake_session, device=device, is_online_now=False)
+
+    predicate = _index_where("ix_alert_events_open_gateway_offline")
+    assert f"ON CONFLICT (device_id, event_type) WHERE {predicate} DO UPDATE" in _compiled(fake_session)
+
+
+@pytest.mark.asyncio
+async def test_rtls_session_upsert_targets_partial_unique_index(fake_session):
+    fake_session.rows = [SimpleNamespace(id=1)]
+    event_in = AlertEventCreate(
+        rule_id=1,
+        event_type=alert_engine.FORBIDDEN_SECTOR,
+        tag_id=2,
+        device_id=3,
+        payload="{}",
+    )
+
+    await alert_engine._upsert_session(fake_session, event_in, payload_patch={"x": 1})
+
+    predicate = _index_where("ix_alert_events_open_rtls_session")
+    assert (
+        f"ON CONFLICT (rule_id, tag_id, device_id, event_type) WHERE {predicate} DO UPDATE"
+        in _compiled(fake_session)
+    )
+
+
+# ---------------------------------------------------------------------------
+# Banco real (Postgres)
+# ---------------------------------------------------------------------------
+
+_GW_MAC = "AA:BB:CC:00:24:16"
+
+
+async def _create_gateway(db) -> Device:
+    await db.execute(delete(Device).where(Device.mac_address == _GW_MAC))
+    device = Device(name="GW upsert teste", type="BLE_GATEWAY", mac_address=_GW_MAC)
+    db.add(device)
+    await db.commit()
+    await db.refresh(device)
+    return device
+
+
+async def _cleanup(db, device_id: int) -> None:
+    await db.rollback()
+    await db.execute(delete(AlertEvent).where(AlertEvent.device_id == device_id))
+    await db.execute(delete(Device).where(Device.id == device_id))
+    await db.commit()
+
+
+@pytest.mark.asyncio
+async def test_second_offline_updates_the_open_session(database, monkeypatch):
+    monkeypatch.setattr(alert_engine, "dispatch_webhooks", AsyncMock())
+
+    async with AsyncSessionLocal() as db:
+        device = await _create_gateway(db)
+        device_id = device.id
+        device.last_seen_at = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(minutes=5)
+        try:
+            await alert_engine.handle_gateway_status_transition(db, device=device, is_online_now=False)
+            first = (
+                await db.execute(
+                    select(AlertEvent).where(
+                        AlertEvent.device_id == device_id,
+                        AlertEvent.event_type == alert_engine.GATEWAY_OFFLINE,
+                    )
+                )
+            ).scalars().all()
+            assert len(first) == 1
+            first_id = first[0].id
+            first_seen = first[0].last_seen_at
+
+            # segundo OFFLINE com a sessão aberta: cai no ON CONFLICT DO UPDATE
+            await db.refresh(device)
+            await alert_engine.handle_gateway_status_transition(db, device=device, is_online_now=False)
+            db.expire_all()
+            rows = (
+                await db.execute(
+                    select(AlertEvent).where(
+                        AlertEvent.device_id == device_id,
+                        AlertEvent.event_type == alert_engine.GATEWAY_OFFLINE,
+                    )
+                )
+            ).scalars().all()
+            assert [r.id for r in rows] == [first_id]
+            assert rows[0].is_open is True
+            assert rows[0].last_seen_at >= first_seen
+            payload = orjson.loads(rows[0].payload)
+            assert payload["offline_seconds"] >= 300
+            assert payload["event_type"] == alert_engine.GATEWAY_OFFLINE
+
+            # ONLINE fecha a sessão e abre o evento pontual
+            await db.refresh(device)
+            await alert_engine.handle_gateway_status_transition(db, device=device, is_online_now=True)
+            db.expire_all()
+            closed = await db.get(AlertEvent, first_id)
+            assert closed.is_open is False
+            assert closed.ended_at is not None
+        finally:
+            alert_engine._gateway_online_until.pop(device_id, None)
+            await _cleanup(db, device_id)
+
+
+@pytest.mark.asyncio
+async def test_offline_migration_dedupe_keeps_latest_open_session(database):
+    dedupe_sql = _run_upgrade("20250328120000_add_alert_events_open_gateway_offline_uq.py")[0][1]
+    now = datetime.now(timezone.utc)
+
+    async with AsyncSessionLocal() as db:
+        device = await _create_gateway(db)
+        device_id = device.id
+        try:
+            # duplicadas só existem sem o índice (bases antigas); DDL é
+            # transacional no Postgres, o rollback do _cleanup o devolve
+            await db.execute(text("DROP INDEX IF EXISTS ix_alert_events_open_gateway_offline"))
+            for minutes in (30, 20, 10):
+                db.add(
+                    AlertEvent(
+                        event_type=alert_engine.GATEWAY_OFFLINE,
+                        device_id=device_id,
+                        started_at=now - timedelta(minutes=minutes),
+                        last_seen_at=now - timedelta(minutes=minutes - 1),
+                        is_open=True,
+                    )
+                )
+            await db.flush()
+
+            await db.execute(text(dedupe_sql))
+            rows = (
+                await db.execute(
+                    select(AlertEvent)
+                    .where(AlertEvent.device_id == device_id)
+                    .order_by(AlertEvent.started_at)
+                    .execution_options(populate_existing=True)
+                )
+            ).scalars().all()
+            assert [r.is_open for r in rows] == [False, False, True]
+            assert all(r.ended_at == r.last_seen_at for r in rows[:2])
+        finally:
+            await _cleanup(db, device_id)
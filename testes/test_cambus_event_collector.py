@@ -0,0 +1,228 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import orjson
+import pytest
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql.dml import Insert
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.db.types import RawJSON
+from app.models.device import Device
+from app.models.device_event import DeviceEvent
+from app.services import cambus_event_collector as collector
+from app.services import incident_auto_rules
+
+
+def _event_topic() -> str:
+    base = settings.CAMBUS_MQTT_BASE_TOPIC.rstrip("/")
+    return f"{base}/tenant/predio/andar/camera/cam_1/faceCapture/events"
+
+
+@pytest.mark.asyncio
+async def test_handle_message_upserts_device_topic_once(monkeypatch, fake_session):
+    upsert = AsyncMock()
+    monkeypatch.setattr(collector.crud_device_topic, "upsert", upsert)
+    monkeypatch.setattr(collector, "_resolve_camera_id", AsyncMock(return_value=1))
+    monkeypatch.setattr(collector, "_SessionFactory", lambda: fake_session)
+    monkeypatch.setattr(collector, "_event_queue", None)
+    monkeypatch.setattr(collector, "_known_topics", {})
+
+    await collector._handle_message(_event_topic(), b'{"eventType": "faceCapture"}')
+    assert upsert.call_count == 1
+
+    # mesmo tópico de novo: já conhecido, não repete o upsert
+    await collector._handle_message(_event_topic(), b'{"eventType": "faceCapture"}')
+    assert upsert.call_count == 1
+
+
+def _pending(device_id: int, n: int, *, topic: str = "cambus/teste/cam/faceCapture/events"):
+    data = {"eventType": "faceCapture", "seq": n}
+    return collector._PendingEvent(
+        device_id=device_id,
+        kind="faceCapture",
+        topic=topic,
+        topic_description="faceCapture",
+        analytic_type="faceCapture",
+        payload=RawJSON(orjson.dumps(data).decode()),
+        data=data,
+        occurred_at=datetime(2025, 1, 1, 12, 0, n % 60),
+    )
+
+
+def _copy_session(session):
+    """Conexão asyncpg falsa: COPY gravado num AsyncMock."""
+    session.dialect = SimpleNamespace(driver="asyncpg")
+    copy = AsyncMock()
+    session.get_raw_connection = AsyncMock(
+        return_value=SimpleNamespace(driver_connection=SimpleNamespace(copy_records_to_table=copy))
+    )
+    return copy
+
+
+def _inserted(session) -> bool:
+    return any(isinstance(stmt, Insert) for stmt in session.statements)
+
+
+@pytest.mark.asyncio
+async def test_large_batch_is_written_with_copy(monkeypatch, fake_session):
+    copy = _copy_session(fake_session)
+    # ids reservados na sequence (nextval)
+    fake_session.rows = list(range(1000, 1000 + collector._EVENT_COPY_MIN_ROWS))
+    monkeypatch.setattr(collector, "_SessionFactory", lambda: fake_session)
+    monkeypatch.setattr(collector.crud_device_topic, "upsert", AsyncMock())
+    monkeypatch.setattr(collector, "_known_topics", {})
+
+    batch = [_pending(1, n) for n in range(collector._EVENT_COPY_MIN_ROWS)]
+    events = await collector._write_events(batch)
+
+    assert not _inserted(fake_session)
+    copy.assert_awaited_once()
+    (table,) = copy.await_args.args
+    records = copy.await_args.kwargs["records"]
+    assert table == "device_events"
+    assert copy.await_args.kwargs["columns"] == collector._EVENT_COPY_COLUMNS
+    assert [r[0] for r in records] == list(range(1000, 1000 + len(batch)))
+    # payload vai como o texto recebido; occurred_at com fuso (timestamptz)
+    assert records[0][4] == batch[0].payload
+    assert records[0][5].tzinfo is timezone.utc
+
+    # eventos devolvidos (para as regras de incidente) com os ids reservados
+    assert [e.id for e in events] == [r[0] for r in records]
+    assert events[0].payload == batch[0].data
+
+
+@pytest.mark.asyncio
+async def test_small_batch_is_written_with_insert(monkeypatch, fake_session):
+    copy = _copy_session(fake_session)
+    monkeypatch.setattr(collector, "_SessionFactory", lambda: fake_session)
+    monkeypatch.setattr(collector.crud_device_topic, "upsert", AsyncMock())
+    monkeypatch.setattr(collector, "_known_topics", {})
+
+    await collector._write_events([_pending(1, n) for n in range(collector._EVENT_COPY_MIN_ROWS - 1)])
+
+    assert _inserted(fake_session)
+    copy.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_flush_falls_back_to_row_by_row_on_integrity_error(monkeypatch):
+    bad_device_id = 666
+    calls = []
+
+    async def write(batch):
+        calls.append([ev.device_id for ev in batch])
+        if any(ev.device_id == bad_device_id for ev in batch):
+            raise IntegrityError("INSERT device_events", None, Exception("fk"))
+        return []
+
+    monkeypatch.setattr(collector, "_write_events", write)
+    monkeypatch.setattr(collector, "_camera_ids", {"cam_1": (float("inf"), bad_device_id)})
+
+    await collector._flush_events([_pending(1, 0), _pending(bad_device_id, 1), _pending(2, 2)])
+
+    # lote inteiro falha, depois um a um: só o evento inválido se perde
+    assert calls == [[1, bad_device_id, 2], [1], [bad_device_id], [2]]
+    assert collector._camera_ids == {}
+
+
+# ---------------------------------------------------------------------------
+# Regras de incidente fora do flusher
+# ---------------------------------------------------------------------------
+
+def _device_event(event_id: int) -> DeviceEvent:
+    return DeviceEvent(id=event_id, device_id=1, topic="t", analytic_type="faceCapture", payload={})
+
+
+@pytest.mark.asyncio
+async def test_flush_hands_written_events_to_incident_queue(monkeypatch):
+    events = [_device_event(1), _device_event(2)]
+    rules = AsyncMock()
+    queue: asyncio.Queue = asyncio.Queue()
+    monkeypatch.setattr(collector, "_write_events", AsyncMock(return_value=events))
+    monkeypatch.setattr(incident_auto_rules, "apply_incident_rules_for_event", rules)
+    monkeypatch.setattr(collector, "_incident_queue", queue)
+
+    await collector._flush_events([_pending(1, 0), _pending(1, 1)])
+
+    # o flusher só grava: as regras ficam para os workers
+    rules.assert_not_awaited()
+    assert [queue.get_nowait(), queue.get_nowait()] == events
+
+
+@pytest.mark.asyncio
+async def test_incident_rule_failure_is_isolated_per_event(monkeypatch, fake_session_factory):
+    rules = AsyncMock(side_effect=[IntegrityError("INSERT incidents", None, Exception("dup")), [], []])
+    monkeypatch.setattr(collector, "_SessionFactory", fake_session_factory)
+    monkeypatch.setattr(incident_auto_rules, "apply_incident_rules_for_event", rules)
+    monkeypatch.setattr(collector, "_incident_queue", None)
+
+    await collector._schedule_incident_rules([_device_event(1), _device_event(2), _device_event(3)])
+
+    # falha no primeiro não impede os demais; cada um na sua sessão
+    assert [c.kwargs["event"].id for c in rules.await_args_list] == [1, 2, 3]
+    assert [c.args[0] for c in rules.await_args_list] == fake_session_factory.sessions
+    assert len(set(map(id, fake_session_factory.sessions))) == 3
+
+
+@pytest.mark.asyncio
+async def test_incident_worker_applies_rules_until_stopped(monkeypatch, fake_session_factory):
+    rules = AsyncMock()
+    monkeypatch.setattr(collector, "_SessionFactory", fake_session_factory)
+    monkeypatch.setattr(incident_auto_rules, "apply_incident_rules_for_event", rules)
+    queue: asyncio.Queue = asyncio.Queue()
+    for event_id in (1, 2):
+        queue.put_nowait(_device_event(event_id))
+    queue.put_nowait(None)
+
+    await asyncio.wait_for(collector._incident_worker(queue), timeout=1)
+
+    assert [c.kwargs["event"].id for c in rules.await_args_list] == [1, 2]
+
+
+# ---------------------------------------------------------------------------
+# Banco real (Postgres): COPY e fallback linha a linha
+# ---------------------------------------------------------------------------
+
+_CAM_CODE = "cam_copy_teste"
+_TOPIC = "cambus/teste/cam_copy_teste/faceCapture/events"
+
+
+@pytest.mark.asyncio
+async def test_copy_batch_and_bad_row_fallback_against_database(database, monkeypatch):
+    monkeypatch.setattr(incident_auto_rules, "apply_incident_rules_for_event", AsyncMock())
+    monkeypatch.setattr(collector, "_known_topics", {})
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Device).where(Device.code == _CAM_CODE))
+        camera = Device(name="Cam COPY teste", code=_CAM_CODE, type="CAMERA")
+        db.add(camera)
+        await db.commit()
+        camera_id = camera.id
+
+    try:
+        size = collector._EVENT_COPY_MIN_ROWS + 10
+        await collector._flush_events([_pending(camera_id, n, topic=_TOPIC) for n in range(size)])
+
+        # câmera inexistente no meio do lote grande: COPY falha inteiro e
+        # o fallback grava os demais
+        bad = [_pending(camera_id, n, topic=_TOPIC) for n in range(size)]
+        bad[size // 2] = _pending(camera_id + 1_000_000, 0, topic=_TOPIC)
+        await collector._flush_events(bad)
+
+        async with AsyncSessionLocal() as db:
+            rows = (
+                await db.execute(select(DeviceEvent).where(DeviceEvent.device_id == camera_id))
+            ).scalars().all()
+        assert len(rows) == 2 * size - 1
+        assert len({r.id for r in rows}) == len(rows)
+        assert sorted(r.payload["seq"] for r in rows)[:3] == [0, 0, 1]
+        assert all(r.topic == _TOPIC and r.occurred_at.tzinfo is not None for r in rows)
+    finally:
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(Device).where(Device.id == camera_id))
+            await db.commit()
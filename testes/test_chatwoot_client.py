@@ -0,0 +1,240 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import orjson
+import pytest
+
+from app.core.config import settings
+from app.services import chatwoot_client
+from app.services.chatwoot_client import ChatwootClient, ChatwootHTTPError
+
+_ACCOUNT = "/api/v1/accounts/1"
+
+
+class FakeRedis:
+    """Redis em memória com o pedaço da API que o client usa (bytes na leitura)."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = str(value).encode()
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(chatwoot_client, "_redis", fake)
+    return fake
+
+
+@pytest.fixture
+def client(monkeypatch, redis):
+    monkeypatch.setattr(settings, "CHATWOOT_ENABLED", True)
+    monkeypatch.setattr(settings, "CHATWOOT_BASE_URL", "http://chatwoot.test")
+    monkeypatch.setattr(settings, "CHATWOOT_API_ACCESS_TOKEN", "token")
+    monkeypatch.setattr(settings, "CHATWOOT_DEFAULT_ACCOUNT_ID", "1")
+    monkeypatch.setattr(settings, "CHATWOOT_DEFAULT_INBOX_IDENTIFIER", "sv-inbox")
+    monkeypatch.setattr(settings, "CHATWOOT_DEFAULT_CONTACT_IDENTIFIER", "sv-system")
+    monkeypatch.setattr(settings, "CHATWOOT_HTTP_RETRIES", 0)
+    return ChatwootClient()
+
+
+def _serve(monkeypatch, handler) -> list[httpx.Request]:
+    """Responde os requests do client com ``handler``; devolve a lista de requests feitos."""
+    requests: list[httpx.Request] = []
+
+    def record(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return handler(request)
+
+    monkeypatch.setattr(
+        chatwoot_client,
+        "_CLIENT",
+        httpx.AsyncClient(transport=httpx.MockTransport(record)),
+    )
+    return requests
+
+
+def _incident(incident_id: int = 5) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=incident_id,
+        chatwoot_conversation_id=None,
+        created_at=None,
+        assigned_group=None,
+        severity="HIGH",
+        status="OPEN",
+        tenant=None,
+        device_id=None,
+    )
+
+
+def _posts(requests, path):
+    return [r for r in requests if r.method == "POST" and r.url.path == path]
+
+
+# ---------------------------------------------------------------------------
+# Cache de inbox/contact
+# ---------------------------------------------------------------------------
+
+@pytest.mark.asyncio
+async def test_corrupted_cache_value_is_a_miss(monkeypatch, client, redis):
+    redis.data["chatwoot:inbox:1:sv-inbox"] = b"lixo"
+
+    def handler(request):
+        assert request.url.path == f"{_ACCOUNT}/inboxes"
+        return httpx.Response(200, json={"payload": [{"id": 3, "identifier": "sv-inbox"}]})
+
+    requests = _serve(monkeypatch, handler)
+
+    assert await client._resolve_inbox_id("sv-inbox") == 3
+    assert len(requests) == 1
+    assert redis.data["chatwoot:inbox:1:sv-inbox"] == b"3"
+
+
+@pytest.mark.asyncio
+async def test_stale_cached_contact_is_invalidated_and_conversation_retried(monkeypatch, client, redis):
+    # contact 40 foi apagado no Chatwoot, mas segue no cache
+    redis.data["chatwoot:inbox:1:sv-inbox"] = b"3"
+    redis.data["chatwoot:contact:1:sv-system"] = b"40"
+
+    def handler(request):
+        path = request.url.path
+        if path == f"{_ACCOUNT}/conversations/filter":
+            return httpx.Response(200, json={"payload": []})
+        if path == f"{_ACCOUNT}/inboxes":
+            return httpx.Response(200, json={"payload": [{"id": 3, "identifier": "sv-inbox"}]})
+        if path == f"{_ACCOUNT}/contacts/search":
+            return httpx.Response(200, json={"payload": [{"id": 41, "identifier": "sv-system"}]})
+        if path == f"{_ACCOUNT}/conversations":
+            if orjson.loads(request.content)["contact_id"] == 40:
+                return httpx.Response(404, json={"error": "Resource could not be found"})
+            return httpx.Response(200, json={"id": 900})
+        raise AssertionError(f"request inesperado: {request.method} {path}")
+
+    requests = _serve(monkeypatch, handler)
+
+    assert await client._find_or_create_conversation(_incident()) == 900
+    assert len(_posts(requests, f"{_ACCOUNT}/conversations")) == 2
+    assert client._contact_cache["sv-system"] == 41
+    assert redis.data["chatwoot:contact:1:sv-system"] == b"41"
+
+
+@pytest.mark.asyncio
+async def test_conversation_error_with_same_ids_after_refresh_is_not_retried(monkeypatch, client, redis):
+    redis.data["chatwoot:inbox:1:sv-inbox"] = b"3"
+    redis.data["chatwoot:contact:1:sv-system"] = b"41"
+
+    def handler(request):
+        path = request.url.path
+        if path == f"{_ACCOUNT}/conversations/filter":
+            return httpx.Response(200, json={"payload": []})
+        if path == f"{_ACCOUNT}/inboxes":
+            return httpx.Response(200, json={"payload": [{"id": 3, "identifier": "sv-inbox"}]})
+        if path == f"{_ACCOUNT}/contacts/search":
+            return httpx.Response(200, json={"payload": [{"id": 41, "identifier": "sv-system"}]})
+        if path == f"{_ACCOUNT}/conversations":
+            return httpx.Response(422, json={"message": "Inbox is not valid"})
+        raise AssertionError(f"request inesperado: {request.method} {path}")
+
+    requests = _serve(monkeypatch, handler)
+
+    with pytest.raises(ChatwootHTTPError) as exc_info:
+        await client._find_or_create_conversation(_incident())
+    assert exc_info.value.status_code == 422
+    assert len(_posts(requests, f"{_ACCOUNT}/conversations")) == 1
+
+
+# ---------------------------------------------------------------------------
+# Busca de contact: variante "q" x "identifier"
+# ---------------------------------------------------------------------------
+
+def _search_handler(**responses):
+    """Responde /contacts/search por variante: status HTTP ou lista de contacts."""
+
+    def handler(request):
+        assert request.url.path == f"{_ACCOUNT}/contacts/search"
+        (param,) = request.url.params.keys()
+        response = responses[param]
+        if isinstance(response, int):
+            return httpx.Response(response, json={"error": "invalid search"})
+        return httpx.Response(200, json={"payload": response})
+
+    return handler
+
+
+def _searched_params(requests):
+    return [next(iter(r.url.params.keys())) for r in requests]
+
+
+@pytest.mark.asyncio
+async def test_contact_search_both_variants_empty(monkeypatch, client):
+    _serve(monkeypatch, _search_handler(q=[], identifier=[]))
+
+    assert await client._find_contact_id_by_identifier("sv-system") is None
+    assert client._contact_search_param is None
+
+
+@pytest.mark.asyncio
+async def test_contact_search_hit_with_other_variant_erroring_does_not_pin(monkeypatch, client):
+    _serve(monkeypatch, _search_handler(q=[{"id": 41, "identifier": "sv-system"}], identifier=400))
+
+    assert await client._find_contact_id_by_identifier("sv-system") == 41
+    # o erro da outra variante pode ser transitório: nada a concluir
+    assert client._contact_search_param is None
+
+
+@pytest.mark.asyncio
+async def test_contact_search_hit_with_other_variant_empty_pins(monkeypatch, client):
+    requests = _serve(monkeypatch, _search_handler(q=[], identifier=[{"id": 41, "identifier": "sv-system"}]))
+
+    assert await client._find_contact_id_by_identifier("sv-system") == 41
+    assert client._contact_search_param == "identifier"
+
+    # com a variante fixada, a próxima busca faz um request só
+    requests.clear()
+    assert await client._find_contact_id_by_identifier("sv-system") == 41
+    assert _searched_params(requests) == ["identifier"]
+
+
+@pytest.mark.asyncio
+async def test_contact_search_pinned_variant_miss_falls_back_to_other(monkeypatch, client):
+    client._contact_search_param = "identifier"
+    requests = _serve(monkeypatch, _search_handler(q=[{"id": 41, "identifier": "sv-system"}], identifier=[]))
+
+    assert await client._find_contact_id_by_identifier("sv-system") == 41
+    assert _searched_params(requests) == ["identifier", "q"]
+
+
+# ---------------------------------------------------------------------------
+# Conversa em andamento compartilhada por incidente
+# ---------------------------------------------------------------------------
+
+@pytest.mark.asyncio
+async def test_concurrent_ensure_conversation_creates_one_conversation(monkeypatch, client, redis):
+    redis.data["chatwoot:inbox:1:sv-inbox"] = b"3"
+    redis.data["chatwoot:contact:1:sv-system"] = b"41"
+
+    def handler(request):
+        path = request.url.path
+        if path == f"{_ACCOUNT}/conversations/filter":
+            return httpx.Response(200, json={"payload": []})
+        if path == f"{_ACCOUNT}/conversations":
+            return httpx.Response(200, json={"id": 900})
+        raise AssertionError(f"request inesperado: {request.method} {path}")
+
+    requests = _serve(monkeypatch, handler)
+    incident = _incident()
+
+    results = await asyncio.gather(*(client._ensure_conversation(incident) for _ in range(5)))
+
+    assert results == [900] * 5
+    assert len(_posts(requests, f"{_ACCOUNT}/conversations")) == 1
+    assert client._conversations_in_flight == {}
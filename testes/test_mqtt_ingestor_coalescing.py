@@ -0,0 +1,172 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import delete, select
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.alert_event import AlertEvent
+from app.models.device import Device
+from app.models.tag import Tag
+from app.services import alert_engine
+from app.services import mqtt_ingestor
+from app.services.mqtt_ingestor import MqttIngestor
+
+TAG = 7
+GW_A = 1
+GW_B = 2
+
+
+def _ingestor(window: float = 60.0, session=None) -> MqttIngestor:
+    ingestor = MqttIngestor(settings, lambda: session)
+    ingestor.detection_coalesce_seconds = window
+    return ingestor
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def test_repeated_detection_on_same_gateway_is_coalesced():
+    ingestor = _ingestor()
+
+    assert ingestor._should_coalesce_detection(TAG, GW_A, _now(), 10) is False
+    assert ingestor._should_coalesce_detection(TAG, GW_A, _now(), 11) is True
+    assert ingestor._pending_touches[(TAG, GW_A)][1] == 11
+
+
+def test_move_back_to_previous_gateway_is_processed():
+    ingestor = _ingestor()
+
+    assert ingestor._should_coalesce_detection(TAG, GW_A, _now(), 1) is False
+    assert ingestor._should_coalesce_detection(TAG, GW_B, _now(), 2) is False
+    # A -> B -> A dentro da janela: B fechou a sessão de A, precisa reabrir
+    assert ingestor._should_coalesce_detection(TAG, GW_A, _now(), 3) is False
+    assert ingestor._should_coalesce_detection(TAG, GW_A, _now(), 4) is True
+
+
+def test_coalescing_disabled_with_zero_window():
+    ingestor = _ingestor(window=0)
+
+    assert ingestor._should_coalesce_detection(TAG, GW_A, _now(), 1) is False
+    assert ingestor._should_coalesce_detection(TAG, GW_A, _now(), 2) is False
+    assert ingestor._pending_touches == {}
+
+
+@pytest.mark.asyncio
+async def test_flush_sends_pending_touches_and_forgets_idle_pairs(monkeypatch, fake_session):
+    touch = AsyncMock(return_value=1)
+    monkeypatch.setattr(mqtt_ingestor, "touch_rtls_sessions", touch)
+    ingestor = _ingestor(session=fake_session)
+
+    ingestor._should_coalesce_detection(TAG, GW_A, _now(), 1)
+    ingestor._should_coalesce_detection(TAG, GW_A, _now(), 2)
+    pending = dict(ingestor._pending_touches)
+
+    # par ocioso há mais que a janela: sai do controle de memória
+    ingestor._last_detection_at[(TAG, GW_A)] -= 120
+
+    await ingestor._flush_coalesced_detections()
+
+    touch.assert_awaited_once()
+    assert touch.await_args.args == (fake_session, pending)
+    assert ingestor._pending_touches == {}
+    assert (TAG, GW_A) not in ingestor._last_detection_at
+    assert TAG not in ingestor._last_device_by_tag
+
+    # nada pendente: não abre sessão nem chama o UPDATE
+    await ingestor._flush_coalesced_detections()
+    touch.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_flush_loop_flushes_periodically(monkeypatch, fake_session):
+    flushed = asyncio.Event()
+
+    async def touch(db, touches):
+        flushed.set()
+        return len(touches)
+
+    monkeypatch.setattr(mqtt_ingestor, "touch_rtls_sessions", touch)
+    ingestor = _ingestor(window=0.01, session=fake_session)
+    ingestor._pending_touches[(TAG, GW_A)] = (_now(), 1)
+
+    task = asyncio.create_task(ingestor._coalesce_flush_loop())
+    try:
+        await asyncio.wait_for(flushed.wait(), timeout=1)
+    finally:
+        ingestor._stopped = True
+        await asyncio.wait_for(task, timeout=1)
+
+    assert ingestor._pending_touches == {}
+
+
+_GW_MACS = ("AA:BB:CC:00:24:09", "AA:BB:CC:00:24:19")
+_TAG_MACS = ("AA:BB:CC:01:24:09", "AA:BB:CC:01:24:19")
+
+
+@pytest.mark.asyncio
+async def test_touch_rtls_sessions_without_collection_log_ids(database):
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Device).where(Device.mac_address.in_(_GW_MACS)))
+        await db.execute(delete(Tag).where(Tag.mac_address.in_(_TAG_MACS)))
+        devices = [Device(name="GW touch teste", type="BLE_GATEWAY", mac_address=m) for m in _GW_MACS]
+        tags = [Tag(mac_address=m) for m in _TAG_MACS]
+        db.add_all(devices + tags)
+        await db.flush()
+
+        started = _now() - timedelta(minutes=5)
+        events = [
+            AlertEvent(
+                event_type=alert_engine.FORBIDDEN_SECTOR,
+                tag_id=tag.id,
+                device_id=device.id,
+                started_at=started,
+                last_seen_at=started,
+                is_open=True,
+            )
+            for tag, device in zip(tags, devices)
+        ]
+        db.add_all(events)
+        await db.commit()
+        device_ids = [d.id for d in devices]
+        tag_ids = [t.id for t in tags]
+        event_ids = [e.id for e in events]
+
+    try:
+        seen_at = _now()
+        # nenhuma linha com collection_log_id: NULL sem tipo no VALUES
+        # viraria text e o SET em last_collection_log_id falharia
+        touches = {
+            (tag_ids[0], device_ids[0]): (seen_at, None),
+            (tag_ids[1], device_ids[1]): (seen_at, None),
+        }
+        async with AsyncSessionLocal() as db:
+            assert await alert_engine.touch_rtls_sessions(db, touches) == 2
+
+            # evidência mais antiga não volta last_seen_at para trás
+            older = {(tag_ids[0], device_ids[0]): (started, None)}
+            assert await alert_engine.touch_rtls_sessions(db, older) == 0
+
+            rows = (
+                await db.execute(
+                    select(AlertEvent.last_seen_at, AlertEvent.last_collection_log_id)
+                    .where(AlertEvent.id.in_(event_ids))
+                )
+            ).all()
+        assert [(r.last_seen_at, r.last_collection_log_id) for r in rows] == [(seen_at, None)] * 2
+    finally:
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(AlertEvent).where(AlertEvent.id.in_(event_ids)))
+            await db.execute(delete(Device).where(Device.id.in_(device_ids)))
+            await db.execute(delete(Tag).where(Tag.id.in_(tag_ids)))
+            await db.commit()
+
+
+@pytest.mark.asyncio
+async def test_touch_rtls_sessions_without_touches_skips_query(fake_session):
+    assert await alert_engine.touch_rtls_sessions(fake_session, {}) == 0
+    assert fake_session.statements == []
+    assert fake_session.commits == 0
@@ -0,0 +1,62 @@
+import asyncio
+import random
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import orjson
+import pytest
+
+from app.services import webhook_dispatcher as dispatcher
+
+
+def _alert_event(event_id: int, step: str) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=event_id,
+        event_type="FORBIDDEN_SECTOR",
+        payload=orjson.dumps({"step": step}).decode(),
+        message=None,
+        rule_id=None,
+        device_id=None,
+        tag_id=None,
+        person_id=None,
+        building_id=None,
+        floor_id=None,
+        floor_plan_id=None,
+        started_at=None,
+        last_seen_at=None,
+        ended_at=None,
+        is_open=step != "closed",
+    )
+
+
+@pytest.mark.asyncio
+async def test_workers_preserve_order_per_alert_event(monkeypatch):
+    sub = SimpleNamespace(id=1, url="http://subscriber.test/hook", secret_token=None)
+    monkeypatch.setattr(dispatcher, "_load_subscriptions", AsyncMock(return_value=[sub]))
+
+    delivered: dict[int, list[str]] = {}
+
+    async def fake_post(client, target, event_type, body):
+        # atrasos aleatórios: com fila compartilhada, a ordem se perderia
+        await asyncio.sleep(random.uniform(0, 0.005))
+        payload = orjson.loads(body)["payload"]
+        delivered.setdefault(payload["alert_event_id"], []).append(payload["step"])
+
+    monkeypatch.setattr(dispatcher, "_post_to_subscriber", fake_post)
+
+    dispatcher.start_webhook_workers(4)
+    try:
+        # passos do mesmo evento colados na fila: workers diferentes os
+        # pegariam ao mesmo tempo se a fila fosse compartilhada
+        for event_id in range(1, 21):
+            for step in ("opened", "updated", "closed"):
+                await dispatcher.dispatch_webhooks(None, _alert_event(event_id, step))
+        await dispatcher.dispatch_webhooks_many(
+            None, [_alert_event(event_id, "reopened") for event_id in range(1, 21)]
+        )
+    finally:
+        await dispatcher.stop_webhook_workers()
+
+    assert delivered == {
+        event_id: ["opened", "updated", "closed", "reopened"] for event_id in range(1, 21)
+    }